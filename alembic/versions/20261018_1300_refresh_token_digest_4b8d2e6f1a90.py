@@ -0,0 +1,112 @@
+"""refresh_token_digest
+
+Revision ID: 4b8d2e6f1a90
+Revises: 9c1e4f2a7b3d
+Create Date: 2026-10-18 13:00:12.004518
+
+Replace plaintext refresh_token String(512) column with 32 bytes SHA-256
+digest. Existing rows are backfilled in chunks of primary key order, each in
+its own transaction, so the table is not locked for the whole backfill. Rows
+locked by concurrent requests are waited for, not skipped. Rows inserted
+meanwhile are backfilled with the table locked in migration transaction, which
+then checks no NULL digest is left before the column is made NOT NULL.
+
+Downgrade cannot restore plaintext tokens, it deletes all refresh tokens.
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4b8d2e6f1a90"
+down_revision = "9c1e4f2a7b3d"
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK_SIZE = 10_000
+
+DIGEST = "sha256(convert_to(refresh_token, 'UTF8'))"
+
+
+def backfill() -> None:
+    last = 0
+    while True:
+        result = op.get_bind().execute(
+            sa.text(
+                f"""
+                WITH chunk AS (
+                    SELECT id FROM auth_refresh_token
+                    WHERE id > :last
+                    ORDER BY id
+                    LIMIT :chunk_size
+                ), updated AS (
+                    UPDATE auth_refresh_token SET refresh_token_digest = {DIGEST}
+                    WHERE id IN (SELECT id FROM chunk)
+                    AND refresh_token_digest IS NULL
+                )
+                SELECT max(id) FROM chunk
+                """
+            ),
+            {"last": last, "chunk_size": BACKFILL_CHUNK_SIZE},
+        )
+        last = result.scalar()
+        if last is None:
+            break
+
+
+def upgrade():
+    op.add_column(
+        "auth_refresh_token",
+        sa.Column("refresh_token_digest", sa.LargeBinary(length=32), nullable=True),
+    )
+
+    with op.get_context().autocommit_block():
+        backfill()
+
+    # rows inserted during backfill, few of them, no more rows until commit
+    op.execute("LOCK TABLE auth_refresh_token IN SHARE ROW EXCLUSIVE MODE")
+    op.execute(
+        f"UPDATE auth_refresh_token SET refresh_token_digest = {DIGEST} "
+        "WHERE refresh_token_digest IS NULL"
+    )
+    missing = op.get_bind().exec_driver_sql(
+        "SELECT count(*) FROM auth_refresh_token WHERE refresh_token_digest IS NULL"
+    )
+    missing_digests = missing.scalar()
+    if missing_digests:
+        raise RuntimeError(
+            f"{missing_digests} refresh tokens without digest after backfill"
+        )
+
+    op.alter_column("auth_refresh_token", "refresh_token_digest", nullable=False)
+    op.create_index(
+        op.f("ix_auth_refresh_token_refresh_token_digest"),
+        "auth_refresh_token",
+        ["refresh_token_digest"],
+        unique=True,
+    )
+    op.drop_index(
+        op.f("ix_auth_refresh_token_refresh_token"), table_name="auth_refresh_token"
+    )
+    op.drop_column("auth_refresh_token", "refresh_token")
+
+
+def downgrade():
+    op.execute("DELETE FROM auth_refresh_token")
+    op.add_column(
+        "auth_refresh_token",
+        sa.Column("refresh_token", sa.String(length=512), nullable=False),
+    )
+    op.create_index(
+        op.f("ix_auth_refresh_token_refresh_token"),
+        "auth_refresh_token",
+        ["refresh_token"],
+        unique=True,
+    )
+    op.drop_index(
+        op.f("ix_auth_refresh_token_refresh_token_digest"),
+        table_name="auth_refresh_token",
+    )
+    op.drop_column("auth_refresh_token", "refresh_token_digest")
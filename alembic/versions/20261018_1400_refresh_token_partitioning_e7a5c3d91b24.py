@@ -0,0 +1,103 @@
+"""refresh_token_partitioning
+
+Revision ID: e7a5c3d91b24
+Revises: 4b8d2e6f1a90
+Create Date: 2026-10-18 14:00:27.318904
+
+Partitions auth_refresh_token by exp range when run with
+alembic -x refresh_token_partitioning=true upgrade head, otherwise does nothing,
+see app/auth/partitions.py. Table is copied under ACCESS EXCLUSIVE lock, plan
+downtime for big tables.
+
+Range partitions of PARTITION_SECS cover not expired tokens and tokens issued
+in next AHEAD_SECS, expired ones are not copied. There is no DEFAULT partition,
+maintenance creates next partitions before these run out (app does not start
+when they do not cover refresh token lifetime).
+
+Downgrade converts partitioned table back to regular one.
+
+"""
+
+import time
+
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision = "e7a5c3d91b24"
+down_revision = "4b8d2e6f1a90"
+branch_labels = None
+depends_on = None
+
+TABLE = "auth_refresh_token"
+# initial partitions, maintenance continues with its refresh_token_partition_secs
+PARTITION_SECS = 7 * 24 * 3600
+# default refresh token lifetime plus partitions ahead, with margin
+AHEAD_SECS = 12 * PARTITION_SECS
+
+
+def is_partitioned() -> bool:
+    partitioned = op.get_bind().exec_driver_sql(
+        "SELECT EXISTS (SELECT FROM pg_partitioned_table "
+        f"WHERE partrelid = to_regclass('{TABLE}'))"
+    )
+    return bool(partitioned.scalar())
+
+
+def upgrade():
+    partitioning = context.get_x_argument(as_dictionary=True).get(
+        "refresh_token_partitioning", "false"
+    )
+    if partitioning.lower() != "true" or is_partitioned():
+        return
+
+    now = int(time.time())
+    first_start = now - now % PARTITION_SECS
+    max_exp = op.get_bind().exec_driver_sql(f"SELECT max(exp) FROM {TABLE}").scalar()
+
+    op.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned")
+    op.execute(
+        f"CREATE TABLE {TABLE} (LIKE {TABLE}_unpartitioned INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (exp)"
+    )
+    last_exp = max(max_exp or 0, now + AHEAD_SECS)
+    start = first_start
+    while start <= last_exp:
+        op.execute(
+            f"CREATE TABLE {TABLE}_p{start} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ({start}) TO ({start + PARTITION_SECS})"
+        )
+        start += PARTITION_SECS
+    op.execute(
+        f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_unpartitioned "
+        f"WHERE exp >= {first_start}"
+    )
+    op.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    op.execute(f"DROP TABLE {TABLE}_unpartitioned")
+    op.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, exp)")
+    op.execute(
+        f"CREATE UNIQUE INDEX ix_{TABLE}_refresh_token_digest "
+        f"ON {TABLE} (refresh_token_digest, exp)"
+    )
+    op.execute(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES auth_user (user_id) ON DELETE CASCADE"
+    )
+
+
+def downgrade():
+    if not is_partitioned():
+        return
+    op.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned")
+    op.execute(f"CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned INCLUDING DEFAULTS)")
+    op.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_partitioned")
+    op.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    op.execute(f"DROP TABLE {TABLE}_partitioned")
+    op.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)")
+    op.execute(
+        f"CREATE UNIQUE INDEX ix_{TABLE}_refresh_token_digest "
+        f"ON {TABLE} (refresh_token_digest)"
+    )
+    op.execute(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES auth_user (user_id) ON DELETE CASCADE"
+    )
@@ -0,0 +1,120 @@
+"""user_deletion_indexes
+
+Revision ID: 5d2f8b6c0e17
+Revises: e7a5c3d91b24
+Create Date: 2026-10-18 15:00:08.771263
+
+Adds index on auth_refresh_token.user_id, without it ON DELETE CASCADE from
+auth_user scans whole refresh token table, and auth_user.deleted_at for
+asynchronous user deletion, see app/auth/user_deletion.py.
+
+Indexes are built CONCURRENTLY outside of migration transaction, so writes to
+tables are not blocked. Failed concurrent build leaves invalid index behind,
+it is dropped and built again when migration is retried.
+
+CONCURRENTLY is not supported on partitioned tables (see app/auth/partitions.py),
+then index is created on parent table only and built concurrently on every
+partition one by one.
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5d2f8b6c0e17"
+down_revision = "e7a5c3d91b24"
+branch_labels = None
+depends_on = None
+
+
+def drop_invalid_index(index_name: str) -> None:
+    invalid = op.get_bind().exec_driver_sql(
+        "SELECT NOT indisvalid FROM pg_index "
+        f"WHERE indexrelid = to_regclass('{index_name}')"
+    )
+    if invalid.scalar():
+        op.execute(f"DROP INDEX CONCURRENTLY {index_name}")
+
+
+def get_partitions(table_name: str) -> list[str] | None:
+    # None when table is not partitioned
+    bind = op.get_bind()
+    partitioned = bind.exec_driver_sql(
+        "SELECT EXISTS (SELECT FROM pg_partitioned_table "
+        f"WHERE partrelid = to_regclass('{table_name}'))"
+    )
+    if not partitioned.scalar():
+        return None
+    partitions = bind.exec_driver_sql(
+        "SELECT inhrelid::regclass::text FROM pg_inherits "
+        f"WHERE inhparent = to_regclass('{table_name}') ORDER BY 1"
+    )
+    return list(partitions.scalars())
+
+
+def upgrade():
+    op.add_column(
+        "auth_user",
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+    with op.get_context().autocommit_block():
+        drop_invalid_index("ix_auth_user_deleted_at")
+        op.create_index(
+            "ix_auth_user_deleted_at",
+            "auth_user",
+            ["deleted_at"],
+            unique=False,
+            postgresql_where=sa.text("deleted_at IS NOT NULL"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+        partitions = get_partitions("auth_refresh_token")
+        if partitions is None:
+            drop_invalid_index("ix_auth_refresh_token_user_id")
+            op.create_index(
+                op.f("ix_auth_refresh_token_user_id"),
+                "auth_refresh_token",
+                ["user_id"],
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+            return
+
+        # parent index stays invalid until index of every partition is attached
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_auth_refresh_token_user_id "
+            "ON ONLY auth_refresh_token (user_id)"
+        )
+        for partition in partitions:
+            drop_invalid_index(f"{partition}_user_id_idx")
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_user_id_idx "
+                f"ON {partition} (user_id)"
+            )
+            op.execute(
+                "ALTER INDEX ix_auth_refresh_token_user_id "
+                f"ATTACH PARTITION {partition}_user_id_idx"
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f("ix_auth_refresh_token_user_id"),
+            table_name="auth_refresh_token",
+            postgresql_concurrently=get_partitions("auth_refresh_token") is None,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_auth_user_deleted_at",
+            table_name="auth_user",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+    op.drop_column("auth_user", "deleted_at")
@@ -0,0 +1,217 @@
+"""user_id_uuid_expand
+
+Revision ID: a3c81f5e9d42
+Revises: 5d2f8b6c0e17
+Create Date: 2026-10-18 16:00:41.502718
+
+First, online part of user_id migration from String(36) to native UUID in
+auth_user, auth_refresh_token and auth_user_revocation, the second one is
+user_id_uuid_contract.
+
+Adds user_uuid column next to user_id in every table. Trigger keeps both
+columns in sync on every insert and update (dual write): it fills user_uuid
+when code that knows only user_id writes the row and user_id when code that
+writes user_uuid does. Existing rows are backfilled in chunks of primary key
+order, each in its own transaction.
+
+Then everything contract needs is built without blocking writes: unique indexes
+on auth_user.user_uuid and auth_user_revocation.user_uuid, index and foreign key
+on auth_refresh_token.user_uuid and NOT NULL check constraints, added NOT VALID
+and validated afterwards.
+
+Rollout: run this migration, deploy app version that reads and writes user_uuid
+columns (User.user_id and others are mapped to them), old and new app processes
+work side by side thanks to the trigger. When no old process is left, run
+user_id_uuid_contract, it only drops old columns.
+
+Foreign key cannot be added NOT VALID on partitioned table (see
+app/auth/partitions.py), then it is added and validated on every partition one
+by one first, Postgres attaches them when it is added on parent table.
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a3c81f5e9d42"
+down_revision = "5d2f8b6c0e17"
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK_SIZE = 10_000
+# table: (primary key, value lower than any primary key)
+TABLES = {
+    "auth_user": ("user_id", ""),
+    "auth_refresh_token": ("id", 0),
+    "auth_user_revocation": ("user_id", ""),
+}
+# unique indexes contract turns into primary keys
+UNIQUE_INDEXES = {
+    "auth_user": "ix_auth_user_user_uuid",
+    "auth_user_revocation": "ix_auth_user_revocation_user_uuid",
+}
+
+
+def drop_invalid_index(index_name: str) -> None:
+    invalid = op.get_bind().exec_driver_sql(
+        "SELECT NOT indisvalid FROM pg_index "
+        f"WHERE indexrelid = to_regclass('{index_name}')"
+    )
+    if invalid.scalar():
+        op.execute(f"DROP INDEX CONCURRENTLY {index_name}")
+
+
+def get_partitions(table_name: str) -> list[str] | None:
+    # None when table is not partitioned
+    bind = op.get_bind()
+    partitioned = bind.exec_driver_sql(
+        "SELECT EXISTS (SELECT FROM pg_partitioned_table "
+        f"WHERE partrelid = to_regclass('{table_name}'))"
+    )
+    if not partitioned.scalar():
+        return None
+    partitions = bind.exec_driver_sql(
+        "SELECT inhrelid::regclass::text FROM pg_inherits "
+        f"WHERE inhparent = to_regclass('{table_name}') ORDER BY 1"
+    )
+    return list(partitions.scalars())
+
+
+def backfill(table_name: str, primary_key: str, start: str | int) -> None:
+    last = start
+    while True:
+        result = op.get_bind().execute(
+            sa.text(
+                f"""
+                WITH chunk AS (
+                    SELECT {primary_key} FROM {table_name}
+                    WHERE {primary_key} > :last
+                    ORDER BY {primary_key}
+                    LIMIT :chunk_size
+                ), updated AS (
+                    UPDATE {table_name} SET user_uuid = user_id::uuid
+                    WHERE {primary_key} IN (SELECT {primary_key} FROM chunk)
+                    AND user_uuid IS NULL
+                )
+                SELECT max({primary_key}) FROM chunk
+                """
+            ),
+            {"last": last, "chunk_size": BACKFILL_CHUNK_SIZE},
+        )
+        last = result.scalar()
+        if last is None:
+            break
+
+
+def add_not_null_check(table_name: str) -> None:
+    constraint = f"{table_name}_user_uuid_not_null"
+    op.execute(f"ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {constraint}")
+    op.execute(
+        f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint} "
+        "CHECK (user_uuid IS NOT NULL) NOT VALID"
+    )
+    op.execute(f"ALTER TABLE {table_name} VALIDATE CONSTRAINT {constraint}")
+
+
+def add_user_uuid_foreign_key(table_name: str) -> None:
+    op.execute(
+        f"ALTER TABLE {table_name} "
+        "DROP CONSTRAINT IF EXISTS auth_refresh_token_user_uuid_fkey"
+    )
+    op.execute(
+        f"ALTER TABLE {table_name} ADD CONSTRAINT auth_refresh_token_user_uuid_fkey "
+        "FOREIGN KEY (user_uuid) REFERENCES auth_user (user_uuid) "
+        "ON DELETE CASCADE NOT VALID"
+    )
+    op.execute(
+        f"ALTER TABLE {table_name} "
+        "VALIDATE CONSTRAINT auth_refresh_token_user_uuid_fkey"
+    )
+
+
+def upgrade():
+    for table_name in TABLES:
+        op.add_column(table_name, sa.Column("user_uuid", sa.Uuid(), nullable=True))
+
+    op.execute(
+        """
+        CREATE FUNCTION auth_user_uuid_dual_write() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.user_uuid IS NULL OR (
+                TG_OP = 'UPDATE' AND NEW.user_id IS DISTINCT FROM OLD.user_id
+            ) THEN
+                NEW.user_uuid := NEW.user_id::uuid;
+            ELSE
+                NEW.user_id := NEW.user_uuid::text;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table_name in TABLES:
+        op.execute(
+            f"CREATE TRIGGER {table_name}_user_uuid_dual_write "
+            f"BEFORE INSERT OR UPDATE OF user_id, user_uuid ON {table_name} "
+            "FOR EACH ROW EXECUTE FUNCTION auth_user_uuid_dual_write()"
+        )
+
+    with op.get_context().autocommit_block():
+        for table_name, (primary_key, start) in TABLES.items():
+            backfill(table_name, primary_key, start)
+            add_not_null_check(table_name)
+
+        for table_name, index_name in UNIQUE_INDEXES.items():
+            drop_invalid_index(index_name)
+            op.execute(
+                f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                f"ON {table_name} (user_uuid)"
+            )
+
+        partitions = get_partitions("auth_refresh_token")
+        if partitions is None:
+            drop_invalid_index("ix_auth_refresh_token_user_uuid")
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+                "ix_auth_refresh_token_user_uuid ON auth_refresh_token (user_uuid)"
+            )
+            add_user_uuid_foreign_key("auth_refresh_token")
+            return
+
+        # parent index stays invalid until index of every partition is attached
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_auth_refresh_token_user_uuid "
+            "ON ONLY auth_refresh_token (user_uuid)"
+        )
+        for partition in partitions:
+            drop_invalid_index(f"{partition}_user_uuid_idx")
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_user_uuid_idx "
+                f"ON {partition} (user_uuid)"
+            )
+            op.execute(
+                "ALTER INDEX ix_auth_refresh_token_user_uuid "
+                f"ATTACH PARTITION {partition}_user_uuid_idx"
+            )
+            add_user_uuid_foreign_key(partition)
+        # finds validated foreign keys of partitions and attaches them, no scan
+        op.execute(
+            "ALTER TABLE auth_refresh_token "
+            "ADD CONSTRAINT auth_refresh_token_user_uuid_fkey "
+            "FOREIGN KEY (user_uuid) REFERENCES auth_user (user_uuid) "
+            "ON DELETE CASCADE"
+        )
+
+
+def downgrade():
+    for table_name in TABLES:
+        op.execute(
+            f"DROP TRIGGER IF EXISTS {table_name}_user_uuid_dual_write ON {table_name}"
+        )
+    op.execute("DROP FUNCTION IF EXISTS auth_user_uuid_dual_write()")
+    # drops indexes and constraints of the columns too
+    op.drop_column("auth_user_revocation", "user_uuid")
+    op.drop_column("auth_refresh_token", "user_uuid")
+    op.drop_column("auth_user", "user_uuid")
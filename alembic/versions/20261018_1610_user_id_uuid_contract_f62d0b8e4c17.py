@@ -0,0 +1,112 @@
+"""user_id_uuid_contract
+
+Revision ID: f62d0b8e4c17
+Revises: a3c81f5e9d42
+Create Date: 2026-10-18 16:10:05.338291
+
+Second part of user_id migration to native UUID, see user_id_uuid_expand. Run
+it only when every app process reads and writes user_uuid columns, it drops the
+dual write trigger and old user_id columns, app code does not use them anymore.
+user_uuid columns keep their name, renaming them would break running app.
+
+Everything is already backfilled, indexed and validated, so statements only
+change catalog, but they need ACCESS EXCLUSIVE lock on the tables, migration
+gives up after LOCK_TIMEOUT instead of queueing requests.
+
+Downgrade goes back to user_id_uuid_expand state. It rewrites the tables under
+lock and validates constraints with full scans, plan downtime for it.
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f62d0b8e4c17"
+down_revision = "a3c81f5e9d42"
+branch_labels = None
+depends_on = None
+
+LOCK_TIMEOUT = "5s"
+TABLES = ("auth_user", "auth_refresh_token", "auth_user_revocation")
+# table: unique index built by expand that becomes primary key
+PRIMARY_KEYS = {
+    "auth_user": "ix_auth_user_user_uuid",
+    "auth_user_revocation": "ix_auth_user_revocation_user_uuid",
+}
+
+
+def upgrade():
+    op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+
+    for table_name in TABLES:
+        op.execute(f"DROP TRIGGER {table_name}_user_uuid_dual_write ON {table_name}")
+        # validated check constraint proves there are no NULLs, no scan
+        op.execute(f"ALTER TABLE {table_name} ALTER COLUMN user_uuid SET NOT NULL")
+        op.execute(
+            f"ALTER TABLE {table_name} DROP CONSTRAINT {table_name}_user_uuid_not_null"
+        )
+    op.execute("DROP FUNCTION auth_user_uuid_dual_write()")
+
+    # drops old foreign key and index too, on partitions as well
+    op.execute("ALTER TABLE auth_refresh_token DROP COLUMN user_id")
+    for table_name, index_name in PRIMARY_KEYS.items():
+        op.execute(f"ALTER TABLE {table_name} DROP CONSTRAINT {table_name}_pkey")
+        op.execute(
+            f"ALTER TABLE {table_name} ADD CONSTRAINT {table_name}_pkey "
+            f"PRIMARY KEY USING INDEX {index_name}"
+        )
+        op.execute(f"ALTER TABLE {table_name} DROP COLUMN user_id")
+
+
+def downgrade():
+    for table_name in TABLES:
+        op.execute(f"ALTER TABLE {table_name} ADD COLUMN user_id VARCHAR(36)")
+        op.execute(f"UPDATE {table_name} SET user_id = user_uuid::text")
+        op.execute(f"ALTER TABLE {table_name} ALTER COLUMN user_id SET NOT NULL")
+
+    # depends on auth_user primary key, added back on unique index below
+    op.execute(
+        "ALTER TABLE auth_refresh_token DROP CONSTRAINT auth_refresh_token_user_uuid_fkey"
+    )
+    for table_name, index_name in PRIMARY_KEYS.items():
+        op.execute(f"ALTER TABLE {table_name} DROP CONSTRAINT {table_name}_pkey")
+        op.execute(f"ALTER TABLE {table_name} ADD PRIMARY KEY (user_id)")
+        op.execute(f"CREATE UNIQUE INDEX {index_name} ON {table_name} (user_uuid)")
+    for column in ("user_id", "user_uuid"):
+        op.execute(
+            "ALTER TABLE auth_refresh_token "
+            f"ADD CONSTRAINT auth_refresh_token_{column}_fkey "
+            f"FOREIGN KEY ({column}) REFERENCES auth_user ({column}) "
+            "ON DELETE CASCADE"
+        )
+    op.execute(
+        "CREATE INDEX ix_auth_refresh_token_user_id ON auth_refresh_token (user_id)"
+    )
+
+    op.execute(
+        """
+        CREATE FUNCTION auth_user_uuid_dual_write() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.user_uuid IS NULL OR (
+                TG_OP = 'UPDATE' AND NEW.user_id IS DISTINCT FROM OLD.user_id
+            ) THEN
+                NEW.user_uuid := NEW.user_id::uuid;
+            ELSE
+                NEW.user_id := NEW.user_uuid::text;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table_name in TABLES:
+        op.execute(f"ALTER TABLE {table_name} ALTER COLUMN user_uuid DROP NOT NULL")
+        op.execute(
+            f"ALTER TABLE {table_name} ADD CONSTRAINT {table_name}_user_uuid_not_null "
+            "CHECK (user_uuid IS NOT NULL)"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table_name}_user_uuid_dual_write "
+            f"BEFORE INSERT OR UPDATE OF user_id, user_uuid ON {table_name} "
+            "FOR EACH ROW EXECUTE FUNCTION auth_user_uuid_dual_write()"
+        )
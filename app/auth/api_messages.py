@@ -1,11 +1,13 @@
 from typing import Any
 
 JWT_ERROR_USER_REMOVED = "User removed"
+JWT_ERROR_TOKEN_REVOKED = "Token revoked"
 PASSWORD_INVALID = "Incorrect email or password"
 REFRESH_TOKEN_NOT_FOUND = "Refresh token not found"
 REFRESH_TOKEN_EXPIRED = "Refresh token expired"
 REFRESH_TOKEN_ALREADY_USED = "Refresh token already used"
 EMAIL_ADDRESS_ALREADY_USED = "Cannot use this email address"
+PASSWORD_HASHING_UNAVAILABLE = "Service busy, try again later"
 
 
 UNAUTHORIZED_RESPONSES: dict[int | str, dict[str, Any]] = {
@@ -26,6 +28,10 @@ UNAUTHORIZED_RESPONSES: dict[int | str, dict[str, Any]] = {
                         "summary": JWT_ERROR_USER_REMOVED,
                         "value": {"detail": JWT_ERROR_USER_REMOVED},
                     },
+                    "revoked token": {
+                        "summary": "Token issued before user was removed or password reset",
+                        "value": {"detail": JWT_ERROR_TOKEN_REVOKED},
+                    },
                 }
             }
         },
@@ -64,3 +70,12 @@ REFRESH_TOKEN_RESPONSES: dict[int | str, dict[str, Any]] = {
         },
     },
 }
+
+PASSWORD_HASHING_RESPONSES: dict[int | str, dict[str, Any]] = {
+    503: {
+        "description": "Too many password hashing requests in progress, see `Retry-After` header",
+        "content": {
+            "application/json": {"example": {"detail": PASSWORD_HASHING_UNAVAILABLE}}
+        },
+    },
+}
@@ -0,0 +1,216 @@
+# Bulk import of users from CSV (with header row) or NDJSON file, both with
+# email and password fields, "-" reads standard input:
+#
+# python -m app.auth.bulk_import users.csv
+# python -m app.auth.bulk_import --format ndjson - < users.ndjson
+#
+# Input is read lazily in batches of --batch-size rows. Passwords of a batch are
+# hashed in parallel in process pool of --processes (CPU count by default) and
+# rows are written with asyncpg copy_records_to_table, instead of one bcrypt call
+# on the event loop and two queries per user of /auth/register.
+#
+# COPY cannot skip conflicting rows, so every batch is copied into temporary
+# table and moved to auth_user with INSERT ... ON CONFLICT (email) DO NOTHING.
+# Emails already taken (or repeated in the input) and invalid rows are reported
+# and skipped, the import goes on. Every batch is committed separately, import
+# stopped in the middle can be run again, imported users are then duplicates.
+
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, TextIO, cast
+
+import asyncpg  # type: ignore[import-untyped]
+import bcrypt
+import sqlalchemy as sa
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.models import User
+from app.auth.password import get_bcrypt_rounds
+from app.auth.schemas import UserCreateRequest
+from app.core import database_session
+
+DEFAULT_BATCH_SIZE = 1000
+IMPORT_TABLE = "auth_user_import"
+COLUMNS = ("user_uuid", "email", "hashed_password")
+FORMATS = ("csv", "ndjson")
+# password hashing tasks per batch, enough to keep all processes busy
+HASH_CHUNKS = 64
+
+
+@dataclass(slots=True)
+class ImportStats:
+    imported: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    start: float = field(default_factory=time.perf_counter)
+
+    def progress(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        return (
+            f"imported {self.imported}, duplicates {self.duplicates}, "
+            f"invalid {self.invalid}, {self.imported / elapsed:.0f} users/s"
+        )
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[tuple[int, Any]]:
+    # yields (line number, row), header is line 1
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson(lines: Iterable[str]) -> Iterator[tuple[int, Any]]:
+    for line_num, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except json.JSONDecodeError:
+            yield line_num, None
+
+
+def batched_users(
+    rows: Iterable[tuple[int, Any]], batch_size: int, stats: ImportStats
+) -> Iterator[list[UserCreateRequest]]:
+    batch: list[UserCreateRequest] = []
+    for line_num, row in rows:
+        try:
+            batch.append(UserCreateRequest.model_validate(row))
+        except ValidationError:
+            stats.invalid += 1
+            print(f"invalid row on line {line_num}, skipped")
+            continue
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def hash_passwords(executor: Executor, passwords: list[str]) -> list[str]:
+    # bcrypt.hashpw is passed to the pool directly, so worker processes only
+    # unpickle bcrypt (see app.auth.password), in chunks, one task per password
+    # costs more in pickling and IPC than bcrypt with low rounds
+    rounds = get_bcrypt_rounds()
+    hashed_passwords = executor.map(
+        bcrypt.hashpw,
+        [password.encode() for password in passwords],
+        [bcrypt.gensalt(rounds) for _ in passwords],
+        chunksize=max(len(passwords) // HASH_CHUNKS, 1),
+    )
+    # waiting for results blocks, so it is done in thread
+    return await asyncio.to_thread(
+        lambda: [hashed_password.decode() for hashed_password in hashed_passwords]
+    )
+
+
+async def copy_users(
+    session: AsyncSession, records: list[tuple[str, str, str]]
+) -> set[str]:
+    # returns emails of inserted users
+    await session.execute(
+        sa.text(
+            f"CREATE TEMP TABLE {IMPORT_TABLE} AS "
+            f"SELECT {', '.join(COLUMNS)} FROM {User.__tablename__} WITH NO DATA"
+        )
+    )
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    asyncpg_connection = cast(asyncpg.Connection, raw_connection.driver_connection)
+    await asyncpg_connection.copy_records_to_table(
+        IMPORT_TABLE, records=records, columns=COLUMNS
+    )
+
+    imported = sa.table(IMPORT_TABLE, *(sa.column(column) for column in COLUMNS))
+    inserted = await session.scalars(
+        insert(User)
+        .from_select(COLUMNS, sa.select(*imported.c))
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User.email)
+    )
+    inserted_emails = set(inserted)
+    await session.execute(sa.text(f"DROP TABLE {IMPORT_TABLE}"))
+    await session.commit()
+    return inserted_emails
+
+
+async def import_users(
+    session: AsyncSession,
+    executor: Executor,
+    rows: Iterable[tuple[int, Any]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> ImportStats:
+    stats = ImportStats()
+    for batch in batched_users(rows, batch_size, stats):
+        hashed_passwords = await hash_passwords(
+            executor, [user.password for user in batch]
+        )
+        inserted_emails = await copy_users(
+            session,
+            [
+                (str(uuid.uuid4()), user.email, hashed_password)
+                for user, hashed_password in zip(batch, hashed_passwords, strict=True)
+            ],
+        )
+
+        # first occurrence of email in batch is the inserted one
+        seen: Counter[str] = Counter(user.email for user in batch)
+        for email, count in seen.items():
+            duplicates = count - 1 if email in inserted_emails else count
+            for _ in range(duplicates):
+                print(f"duplicate email {email}, skipped")
+            stats.duplicates += duplicates
+        stats.imported += len(inserted_emails)
+        print(stats.progress(), flush=True)
+    return stats
+
+
+def open_input(path: str) -> TextIO:  # pragma: no cover
+    if path == "-":
+        return sys.stdin
+    return open(path, newline="", encoding="utf-8")
+
+
+async def main(
+    path: str, input_format: str, batch_size: int, processes: int
+) -> None:  # pragma: no cover
+    read_rows = read_csv if input_format == "csv" else read_ndjson
+    with (
+        open_input(path) as lines,
+        ProcessPoolExecutor(max_workers=processes) as executor,
+    ):
+        async with database_session.new_script_async_session() as session:
+            stats = await import_users(session, executor, read_rows(lines), batch_size)
+    print(f"finished: {stats.progress()}")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Bulk import of users")
+    parser.add_argument("path", help="CSV or NDJSON file, - for standard input")
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        help="input format, by default taken from file extension",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    input_format = args.format or args.path.rsplit(".", 1)[-1]
+    if input_format not in FORMATS:
+        parser.error("use --format csv or --format ndjson")
+
+    asyncio.run(main(args.path, input_format, args.batch_size, args.processes))
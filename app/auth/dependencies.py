@@ -1,25 +1,48 @@
+from dataclasses import dataclass
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth import api_messages
-from app.auth.jwt import verify_jwt_token
+from app.auth import api_messages, revocation, user_cache
+from app.auth.jwt import JWTTokenPayload, verify_jwt_token
 from app.auth.models import User
 from app.core import database_session
+from app.core.config import get_settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/access-token")
 
 
+@dataclass(frozen=True, slots=True)
+class Principal:
+    user_id: str
+
+
+def verify_access_token(token: str) -> JWTTokenPayload:
+    token_payload = verify_jwt_token(token)
+
+    if get_settings().security.jwt_stateless_auth and revocation.is_token_revoked(
+        token_payload
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=api_messages.JWT_ERROR_TOKEN_REVOKED,
+        )
+    return token_payload
+
+
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    session: AsyncSession = Depends(database_session.new_async_session),
+    session: AsyncSession = Depends(database_session.new_async_read_session),
 ) -> User:
-    token_payload = verify_jwt_token(token)
+    token_payload = verify_access_token(token)
 
-    user = await session.scalar(select(User).where(User.user_id == token_payload.sub))
+    user = await user_cache.get_user(session, token_payload.sub)
+    if user is None and "replica" in session.info:
+        # user created just before may not be replicated yet
+        async with database_session._ASYNC_SESSIONMAKER() as primary_session:
+            user = await user_cache.get_user(primary_session, token_payload.sub)
 
     if user is None:
         raise HTTPException(
@@ -27,3 +50,16 @@ async def get_current_user(
             detail=api_messages.JWT_ERROR_USER_REMOVED,
         )
     return user
+
+
+async def get_current_principal(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    session: AsyncSession = Depends(database_session.new_async_read_session),
+) -> Principal:
+    # for endpoints that need only user id, in stateless mode token claims are
+    # trusted without database query, deleted users are in revocation set
+    if get_settings().security.jwt_stateless_auth:
+        return Principal(user_id=verify_access_token(token).sub)
+
+    user = await get_current_user(token, session)
+    return Principal(user_id=user.user_id)
@@ -1,67 +1,203 @@
+import base64
+import hashlib
+import json
 import time
+from dataclasses import dataclass
+from typing import Any
 
 import jwt
 from fastapi import HTTPException, status
-from pydantic import BaseModel
 
-from app.core.config import get_settings
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import Security, get_settings
+
+# RFC 7638 required members of public keys, used to compute "kid"
+# https://www.rfc-editor.org/rfc/rfc7638#section-3.2
+_JWK_THUMBPRINT_MEMBERS = {
+    "EC": ("crv", "kty", "x", "y"),
+    "OKP": ("crv", "kty", "x"),
+    "RSA": ("e", "kty", "n"),
+}
 
 
 # Payload follows RFC 7519
 # https://www.rfc-editor.org/rfc/rfc7519#section-4.1
-class JWTTokenPayload(BaseModel):
+# "iat" has millisecond precision, NumericDate may be non-integer, it is compared
+# with user revocation time, see app.auth.revocation
+@dataclass(frozen=True, slots=True)
+class JWTTokenPayload:
     iss: str
     sub: str
     exp: int
-    iat: int
+    iat: float
 
 
-class JWTToken(BaseModel):
+@dataclass(frozen=True, slots=True)
+class JWTToken:
     payload: JWTTokenPayload
     access_token: str
 
 
-def create_jwt_token(user_id: str) -> JWTToken:
-    iat = int(time.time())
-    exp = iat + get_settings().security.jwt_access_token_expire_secs
+def jwk_thumbprint(jwk: dict[str, Any]) -> str:
+    members = {name: jwk[name] for name in _JWK_THUMBPRINT_MEMBERS[jwk["kty"]]}
+    digest = hashlib.sha256(
+        json.dumps(members, sort_keys=True, separators=(",", ":")).encode()
+    ).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
 
-    token_payload = JWTTokenPayload(
-        iss=get_settings().security.jwt_issuer,
-        sub=user_id,
-        exp=exp,
-        iat=iat,
-    )
 
-    access_token = jwt.encode(
-        token_payload.model_dump(),
-        key=get_settings().security.jwt_secret_key.get_secret_value(),
-        algorithm=get_settings().security.jwt_algorithm,
-    )
+class JWTCodec:
+    # Signer and verifier for access tokens, built once from Settings.security,
+    # so creating and verifying tokens does not look up settings, secret value
+    # and algorithms on every call. See get_jwt_codec.
+    #
+    # With HS256 tokens are signed and verified with jwt_secret_key.
+    # With asymmetric algorithms (EdDSA, ES256, RS256) tokens are signed with
+    # jwt_private_key and carry "kid" header, the RFC 7638 thumbprint of the
+    # public key. Token is verified with public key matching its "kid", either
+    # the current one or one of jwt_verification_keys kept during rotation.
+    # Public keys are published as JWKS, so other services can verify tokens
+    # without calling this app.
 
-    return JWTToken(payload=token_payload, access_token=access_token)
+    def __init__(self, security: Security) -> None:
+        self.security = security
+        self.algorithm = security.jwt_algorithm
+        self.algorithms = [security.jwt_algorithm]
+        self.issuer = security.jwt_issuer
+        self.key: Any
+        self.headers: dict[str, Any] | None = None
+        self.verification_keys: dict[str, Any] = {}
+        jwks: list[dict[str, Any]] = []
 
+        if security.jwt_private_key is None or self.algorithm == "HS256":
+            self.key = security.jwt_secret_key.get_secret_value().encode()
+        else:
+            algorithm = jwt.get_algorithm_by_name(self.algorithm)
+            self.key = algorithm.prepare_key(
+                security.jwt_private_key.get_secret_value()
+            )
+            public_keys = [self.key.public_key()] + [
+                algorithm.prepare_key(pem) for pem in security.jwt_verification_keys
+            ]
+            for public_key in public_keys:
+                jwk = algorithm.to_jwk(public_key, as_dict=True)
+                jwk.pop("key_ops", None)
+                kid = jwk_thumbprint(jwk)
+                self.verification_keys[kid] = public_key
+                jwks.append({**jwk, "kid": kid, "use": "sig", "alg": self.algorithm})
+            self.headers = {"kid": jwks[0]["kid"]}
 
-def verify_jwt_token(token: str) -> JWTTokenPayload:
-    # Pay attention to verify_signature passed explicite, even if it is the default.
-    # Verification is based on expected payload fields like "exp", "iat" etc.
-    # so if you rename for example "exp" to "my_custom_exp", this is gonna break,
-    # jwt.ExpiredSignatureError will not be raised, that can potentialy
-    # be major security risk - not validating tokens at all.
-    # If unsure, jump into jwt.decode code, make sure tests are passing
-    # https://pyjwt.readthedocs.io/en/stable/usage.html#encoding-decoding-tokens-with-hs256
-
-    try:
-        raw_payload = jwt.decode(
-            token,
-            get_settings().security.jwt_secret_key.get_secret_value(),
-            algorithms=[get_settings().security.jwt_algorithm],
-            options={"verify_signature": True},
-            issuer=get_settings().security.jwt_issuer,
+        self.jwks_json = json.dumps({"keys": jwks}, separators=(",", ":")).encode()
+        self.jwks_etag = f'"{hashlib.sha256(self.jwks_json).hexdigest()[:32]}"'
+        self.jwks_cache_control = f"public, max-age={security.jwks_max_age_secs}"
+        self.expire_secs = security.jwt_access_token_expire_secs
+        # Pay attention to verify_signature passed explicite, even if it is the default.
+        # Verification is based on expected payload fields like "exp", "iat" etc.
+        # so if you rename for example "exp" to "my_custom_exp", this is gonna break,
+        # jwt.ExpiredSignatureError will not be raised, that can potentialy
+        # be major security risk - not validating tokens at all.
+        # If unsure, jump into jwt.decode code, make sure tests are passing
+        # https://pyjwt.readthedocs.io/en/stable/usage.html#encoding-decoding-tokens-with-hs256
+        self.pyjwt = jwt.PyJWT(
+            options={"verify_signature": True, "require": ["iss", "sub", "exp", "iat"]}
+        )
+        # Clients reuse the same access token for all requests until it expires,
+        # so verified payloads are cached by token digest until token "exp",
+        # only cache misses pay for signature verification.
+        self.verified_tokens: TTLCache[bytes, JWTTokenPayload] = TTLCache(
+            maxsize=security.jwt_verify_cache_size
+        )
+        self.cache_hits = metrics.JWT_VERIFY_CACHE.labels(result="hit")
+        self.cache_misses = metrics.JWT_VERIFY_CACHE.labels(result="miss")
+
+    def encode(self, user_id: str) -> JWTToken:
+        iat_ms = round(time.time() * 1000)
+        token_payload = JWTTokenPayload(
+            iss=self.issuer,
+            sub=user_id,
+            exp=iat_ms // 1000 + self.expire_secs,
+            iat=iat_ms / 1000,
+        )
+
+        access_token = self.pyjwt.encode(
+            {
+                "iss": token_payload.iss,
+                "sub": token_payload.sub,
+                "exp": token_payload.exp,
+                "iat": token_payload.iat,
+            },
+            key=self.key,
+            algorithm=self.algorithm,
+            headers=self.headers,
+        )
+
+        return JWTToken(payload=token_payload, access_token=access_token)
+
+    def decode(self, token: str) -> JWTTokenPayload:
+        token_digest = hashlib.sha256(token.encode()).digest()
+
+        token_payload = self.verified_tokens.get(token_digest, now=time.time())
+        if token_payload is not None:
+            self.cache_hits.inc()
+            return token_payload
+        self.cache_misses.inc()
+
+        try:
+            raw_payload = self.pyjwt.decode(
+                token,
+                self.verification_key(token),
+                algorithms=self.algorithms,
+                issuer=self.issuer,
+            )
+        except jwt.InvalidTokenError as e:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=f"Token invalid: {e}",
+            )
+
+        # types of required claims are already validated by PyJWT
+        token_payload = JWTTokenPayload(
+            iss=raw_payload["iss"],
+            sub=raw_payload["sub"],
+            exp=raw_payload["exp"],
+            iat=raw_payload["iat"],
         )
-    except jwt.InvalidTokenError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Token invalid: {e}",
+        self.verified_tokens.set(
+            token_digest, token_payload, expires_at=token_payload.exp
         )
 
-    return JWTTokenPayload(**raw_payload)
+        return token_payload
+
+    def verification_key(self, token: str) -> Any:
+        if self.headers is None:
+            return self.key
+        kid = jwt.get_unverified_header(token).get("kid")
+        if not isinstance(kid, str) or kid not in self.verification_keys:
+            raise jwt.InvalidTokenError("Unknown key id")
+        return self.verification_keys[kid]
+
+
+class _JWTCodecHolder:
+    def __init__(self) -> None:
+        self.codec: JWTCodec | None = None
+
+
+_JWT_CODEC = _JWTCodecHolder()
+
+
+def get_jwt_codec() -> JWTCodec:
+    # codec is rebuilt only when settings are cleared (get_settings.cache_clear())
+    security = get_settings().security
+    codec = _JWT_CODEC.codec
+    if codec is None or codec.security is not security:
+        codec = _JWT_CODEC.codec = JWTCodec(security)
+    return codec
+
+
+def create_jwt_token(user_id: str) -> JWTToken:
+    return get_jwt_codec().encode(user_id)
+
+
+def verify_jwt_token(token: str) -> JWTTokenPayload:
+    return get_jwt_codec().decode(token)
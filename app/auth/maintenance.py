@@ -0,0 +1,190 @@
+# Garbage collection of auth tables, nothing else deletes their rows:
+#
+# - auth_refresh_token rows that are used or expired
+# - auth_user_revocation rows older than access token lifetime (see app.auth.revocation)
+#
+# When auth_refresh_token is partitioned (see app.auth.partitions), its future
+# partitions are created and expired ones dropped instead of deleting rows.
+#
+# Rows are deleted in batches of Maintenance.batch_size, every batch is separate
+# short transaction, so it does not hold locks on many rows or bloat WAL with
+# one huge delete. Rows locked by concurrent requests are skipped.
+# Maintenance.batch_delay_secs between batches throttles load on the database.
+#
+# Run takes session level advisory lock once, on its own connection, and holds
+# it until all tables are done (batches commit and return session connection to
+# pool). When it is held by another app process, that process is already running
+# maintenance, so this run is skipped, that way only one replica deletes rows at
+# a time and batches of replicas do not interleave. Lock connection is in
+# autocommit mode, expired partitions are detached on it outside of transaction.
+#
+# Runs periodically in app when Maintenance.enabled (see lifespan) or as a script
+# from cron:
+#
+# python -m app.auth.maintenance
+
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncGenerator, Callable
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from typing import Any, cast
+
+from sqlalchemy import CursorResult, Delete, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.auth import partitions, revocation
+from app.auth.models import RefreshToken, UserRevocation
+from app.core import database_session, metrics
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# arbitrary, but unique across the app advisory lock key
+MAINTENANCE_LOCK_ID = 7_305_145_170_352_493_569
+
+
+def delete_refresh_tokens(batch_size: int) -> Delete:
+    garbage = (
+        select(RefreshToken.id)
+        .where(or_(RefreshToken.used, RefreshToken.exp < int(time.time())))
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return delete(RefreshToken).where(RefreshToken.id.in_(garbage.scalar_subquery()))
+
+
+def delete_user_revocations(batch_size: int) -> Delete:
+    garbage = (
+        select(UserRevocation.user_id)
+        .where(UserRevocation.revoked_at_ms < revocation.revocation_window_start_ms())
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return delete(UserRevocation).where(
+        UserRevocation.user_id.in_(garbage.scalar_subquery())
+    )
+
+
+PURGES: dict[str, Callable[[int], Delete]] = {
+    RefreshToken.__tablename__: delete_refresh_tokens,
+    UserRevocation.__tablename__: delete_user_revocations,
+}
+
+
+@asynccontextmanager
+async def maintenance_lock(
+    session: AsyncSession,
+) -> AsyncGenerator[AsyncConnection | None]:
+    # yields autocommit connection holding the lock, None when another process
+    # holds it
+    async with session.bind.engine.connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        locked = await connection.scalar(
+            select(func.pg_try_advisory_lock(MAINTENANCE_LOCK_ID))
+        )
+        if not locked:
+            yield None
+            return
+        try:
+            yield connection
+        finally:
+            await connection.execute(
+                select(func.pg_advisory_unlock(MAINTENANCE_LOCK_ID))
+            )
+
+
+async def purge_table(
+    session: AsyncSession, table: str, delete_batch: Callable[[int], Delete]
+) -> int:
+    # returns number of deleted rows, caller holds maintenance_lock
+    batch_size = get_settings().maintenance.batch_size
+    deleted_rows = 0
+
+    while True:
+        with metrics.MAINTENANCE_BATCH_SECONDS.labels(table=table).time():
+            result = cast(
+                CursorResult[Any], await session.execute(delete_batch(batch_size))
+            )
+            await session.commit()
+
+        deleted_rows += result.rowcount
+        metrics.MAINTENANCE_DELETED_ROWS.labels(table=table).inc(result.rowcount)
+        if result.rowcount < batch_size:
+            return deleted_rows
+
+        await asyncio.sleep(get_settings().maintenance.batch_delay_secs)
+
+
+async def manage_refresh_token_partitions(
+    session: AsyncSession, lock_connection: AsyncConnection
+) -> None:
+    now = int(time.time())
+    created = await partitions.create_partitions(session, now)
+    await session.commit()
+    dropped = await partitions.drop_partitions(lock_connection, now)
+
+    table = RefreshToken.__tablename__
+    metrics.MAINTENANCE_PARTITIONS.labels(table=table, action="created").inc(
+        len(created)
+    )
+    metrics.MAINTENANCE_PARTITIONS.labels(table=table, action="dropped").inc(
+        len(dropped)
+    )
+    logger.info(
+        "%s partitions created: %s, dropped: %s",
+        table,
+        [partition.name for partition in created],
+        [partition.name for partition in dropped],
+    )
+
+
+def skip_maintenance() -> None:
+    logger.info("maintenance is running in another process, skipping")
+    metrics.MAINTENANCE_RUNS.labels(result="skipped").inc()
+
+
+async def run_maintenance(session: AsyncSession) -> dict[str, int] | None:
+    async with maintenance_lock(session) as lock_connection:
+        if lock_connection is None:
+            skip_maintenance()
+            return None
+
+        deleted_rows: dict[str, int] = {}
+        partitioned = await partitions.is_partitioned(session)
+        if partitioned:
+            await manage_refresh_token_partitions(session, lock_connection)
+
+        for table, delete_batch in PURGES.items():
+            if partitioned and table == RefreshToken.__tablename__:
+                # used and expired tokens are dropped with their partitions
+                continue
+            deleted_rows[table] = await purge_table(session, table, delete_batch)
+
+    metrics.MAINTENANCE_RUNS.labels(result="completed").inc()
+    return deleted_rows
+
+
+async def run_maintenance_periodically(
+    new_session: Callable[[], AbstractAsyncContextManager[AsyncSession]],
+) -> None:
+    while True:
+        await asyncio.sleep(get_settings().maintenance.interval_secs)
+        try:
+            async with new_session() as session:
+                deleted_rows = await run_maintenance(session)
+            logger.info("maintenance finished, deleted rows: %s", deleted_rows)
+        except Exception:
+            logger.exception("maintenance failed")
+            metrics.MAINTENANCE_RUNS.labels(result="failed").inc()
+
+
+async def main() -> None:  # pragma: no cover
+    async with database_session.new_script_async_session() as session:
+        deleted_rows = await run_maintenance(session)
+    print(f"deleted rows: {deleted_rows}")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    asyncio.run(main())
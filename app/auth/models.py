@@ -13,6 +13,8 @@
 # alembic upgrade head
 
 
+import hashlib
+import secrets
 import uuid
 from datetime import datetime
 
@@ -21,12 +23,20 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.models import Base
 
+# longer exp prefix may not fit in BigInteger column
+REFRESH_TOKEN_EXP_MAX_DIGITS = 18
+
 
 class User(Base):
     __tablename__ = "auth_user"
 
+    # native UUID column, kept as str in Python, same as JWT sub claim, column is
+    # user_uuid since user_id_uuid_expand migration, see its docstring
     user_id: Mapped[str] = mapped_column(
-        sa.String(36), primary_key=True, default=lambda _: str(uuid.uuid4())
+        "user_uuid",
+        sa.Uuid(as_uuid=False),
+        primary_key=True,
+        default=lambda _: str(uuid.uuid4()),
     )
     email: Mapped[str] = mapped_column(
         sa.String(256), nullable=False, unique=True, index=True
@@ -41,21 +51,72 @@ class User(Base):
         onupdate=sa.func.now(),
         nullable=False,
     )
+    # set by asynchronous deletion, row is deleted later, see app.auth.user_deletion
+    deleted_at: Mapped[datetime | None] = mapped_column(
+        sa.DateTime(timezone=True), nullable=True
+    )
 
     refresh_tokens: Mapped[list["RefreshToken"]] = relationship(back_populates="user")  # noqa: UP037
 
+    __table_args__ = (
+        sa.Index(
+            "ix_auth_user_deleted_at",
+            "deleted_at",
+            postgresql_where=sa.text("deleted_at IS NOT NULL"),
+        ),
+    )
+
 
 class RefreshToken(Base):
     __tablename__ = "auth_refresh_token"
 
     id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True)
-    refresh_token: Mapped[str] = mapped_column(
-        sa.String(512), nullable=False, unique=True, index=True
+    # only SHA-256 digest of refresh token is stored, see RefreshToken.digest
+    refresh_token_digest: Mapped[bytes] = mapped_column(
+        sa.LargeBinary(32), nullable=False, unique=True, index=True
     )
     used: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, default=False)
     exp: Mapped[int] = mapped_column(sa.BigInteger, nullable=False)
 
     user_id: Mapped[str] = mapped_column(
-        sa.ForeignKey("auth_user.user_id", ondelete="CASCADE"),
+        "user_uuid",
+        sa.ForeignKey("auth_user.user_uuid", ondelete="CASCADE"),
+        index=True,
     )
     user: Mapped[User] = relationship(back_populates="refresh_tokens")
+
+    @staticmethod
+    def digest(refresh_token: str) -> bytes:
+        # refresh tokens are random 32 bytes, so plain SHA-256 is enough,
+        # there is nothing to brute force like with passwords
+        return hashlib.sha256(refresh_token.encode()).digest()
+
+    @staticmethod
+    def generate(exp: int) -> str:
+        # exp prefix is covered by digest, so it cannot be changed, it lets
+        # lookup hit single partition of partitioned table, see app.auth.partitions
+        return f"{exp}.{secrets.token_urlsafe(32)}"
+
+    @staticmethod
+    def generated_exp(refresh_token: str) -> int | None:
+        # None for tokens issued before exp prefix was added
+        exp, _, _ = refresh_token.partition(".")
+        if not (
+            exp.isascii() and exp.isdigit() and len(exp) <= REFRESH_TOKEN_EXP_MAX_DIGITS
+        ):
+            return None
+        return int(exp)
+
+
+class UserRevocation(Base):
+    # Access tokens of user issued before revoked_at_ms (milliseconds since epoch)
+    # are revoked, see app.auth.revocation
+    # No foreign key, revocation of deleted user must outlive the user row
+    __tablename__ = "auth_user_revocation"
+
+    user_id: Mapped[str] = mapped_column(
+        "user_uuid", sa.Uuid(as_uuid=False), primary_key=True
+    )
+    revoked_at_ms: Mapped[int] = mapped_column(
+        sa.BigInteger, nullable=False, index=True
+    )
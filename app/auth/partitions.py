@@ -0,0 +1,171 @@
+# Optional range partitioning of auth_refresh_token by exp column.
+#
+# With alembic -x refresh_token_partitioning=true upgrade head, migration splits
+# table into ranges (see alembic/versions/*_refresh_token_partitioning_*.py) and
+# maintenance continues with ranges of Maintenance.refresh_token_partition_secs
+# (weekly by default). Expired tokens are then removed by dropping whole
+# partitions instead of deleting rows, so there are no dead tuples to vacuum and
+# no index bloat.
+#
+# Postgres requires partition key in primary key and unique indexes, so they are
+# (id, exp) and (refresh_token_digest, exp). Refresh tokens start with their exp
+# (see RefreshToken.generate), lookup in views.refresh_token compares it and
+# planner scans single partition.
+#
+# Maintenance (see app.auth.maintenance) creates partitions for refresh token
+# lifetime plus refresh_token_partitions_ahead periods ahead, it should run in app
+# or from cron at least once per partition period. There is no DEFAULT partition,
+# inserting token with no partition for its exp fails, app does not start when
+# partitions do not cover refresh token lifetime (see check_partitions).
+#
+# Partitions are created as regular tables and attached, expired ones are
+# detached with DETACH PARTITION CONCURRENTLY and dropped, both take only SHARE
+# UPDATE EXCLUSIVE lock on auth_refresh_token, so logins and refreshes are not
+# blocked. Detach interrupted in the middle is finalized by next maintenance run.
+#
+# Later migrations that change auth_refresh_token must handle both layouts.
+
+
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.auth.models import RefreshToken
+from app.core.config import get_settings
+
+TABLE = RefreshToken.__tablename__
+# DDL waits for queries that use the table, do not queue requests behind it for long
+LOCK_TIMEOUT = "5s"
+
+_BOUND_PATTERN = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+
+
+@dataclass(frozen=True, slots=True)
+class Partition:
+    name: str
+    start: int
+    end: int
+    # DETACH PARTITION CONCURRENTLY was interrupted
+    detach_pending: bool = False
+
+
+def partition_name(start: int) -> str:
+    return f"{TABLE}_p{start}"
+
+
+def planned_partitions(now: int, last_end: int | None) -> list[Partition]:
+    # missing partitions after last_end, up to the longest possible token exp
+    period = get_settings().maintenance.refresh_token_partition_secs
+    max_exp = (
+        now
+        + get_settings().security.jwt_refresh_token_expire_secs
+        + get_settings().maintenance.refresh_token_partitions_ahead * period
+    )
+
+    start = now - now % period
+    if last_end is not None:
+        start = max(start, last_end)
+
+    partitions: list[Partition] = []
+    while start <= max_exp:
+        end = start - start % period + period
+        partitions.append(Partition(name=partition_name(start), start=start, end=end))
+        start = end
+    return partitions
+
+
+async def is_partitioned(session: AsyncSession) -> bool:
+    partitioned: bool | None = await session.scalar(
+        text(
+            "SELECT EXISTS (SELECT FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass(:table))"
+        ),
+        {"table": TABLE},
+    )
+    return bool(partitioned)
+
+
+async def get_partitions(bind: AsyncSession | AsyncConnection) -> list[Partition]:
+    rows = await bind.execute(
+        text(
+            """
+            SELECT
+                child.relname,
+                pg_get_expr(child.relpartbound, child.oid),
+                pg_inherits.inhdetachpending
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(:table)
+            """
+        ),
+        {"table": TABLE},
+    )
+    partitions: list[Partition] = []
+    for name, bound, detach_pending in rows:
+        match = _BOUND_PATTERN.search(bound)
+        if match is None:  # pragma: no cover
+            # DEFAULT partition added by hand
+            continue
+        partitions.append(
+            Partition(
+                name=name,
+                start=int(match[1]),
+                end=int(match[2]),
+                detach_pending=detach_pending,
+            )
+        )
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+async def check_partitions(session: AsyncSession, now: int) -> None:
+    # tokens issued now must have partition for their exp
+    if not await is_partitioned(session):
+        return
+    partitions = await get_partitions(session)
+    max_exp = now + get_settings().security.jwt_refresh_token_expire_secs
+    if not partitions or partitions[-1].end <= max_exp:
+        raise RuntimeError(
+            f"{TABLE} partitions do not cover refresh token lifetime, "
+            "run python -m app.auth.maintenance"
+        )
+
+
+async def create_partitions(session: AsyncSession, now: int) -> list[Partition]:
+    # creates missing future partitions, caller commits the session
+    partitions = await get_partitions(session)
+    last_end = max((partition.end for partition in partitions), default=None)
+    created = planned_partitions(now, last_end)
+
+    await session.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+    for partition in created:
+        await session.execute(
+            text(f"CREATE TABLE {partition.name} (LIKE {TABLE} INCLUDING DEFAULTS)")
+        )
+        await session.execute(
+            text(
+                f"ALTER TABLE {TABLE} ATTACH PARTITION {partition.name} "
+                f"FOR VALUES FROM ({partition.start}) TO ({partition.end})"
+            )
+        )
+    return created
+
+
+async def drop_partitions(connection: AsyncConnection, now: int) -> list[Partition]:
+    # drops partitions with only expired tokens, connection must be in autocommit
+    # mode, DETACH PARTITION CONCURRENTLY cannot run in transaction block
+    partitions = await get_partitions(connection)
+    dropped = [partition for partition in partitions if partition.end <= now]
+
+    await connection.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+    try:
+        for partition in dropped:
+            detach = "FINALIZE" if partition.detach_pending else "CONCURRENTLY"
+            await connection.execute(
+                text(f"ALTER TABLE {TABLE} DETACH PARTITION {partition.name} {detach}")
+            )
+            await connection.execute(text(f"DROP TABLE {partition.name}"))
+    finally:
+        await connection.execute(text("RESET lock_timeout"))
+    return dropped
@@ -1,8 +1,123 @@
+# bcrypt is CPU bound on purpose, with 12 rounds one call takes ~200ms and would
+# block the event loop (and so every other request in the worker) for that time.
+#
+# Async views use async_verify_password and async_get_password_hash that run bcrypt
+# in a process pool started and stopped in app lifespan, see app/core/lifespan.py.
+# Pool size, max number of queued calls and timeout are set in Settings.security.
+#
+# Hashing work is admission controlled per worker, at most password_hash_pool_size
+# calls run at once and at most password_hash_queue_depth calls wait for a free slot.
+# When the queue is full we fail fast with 503 and Retry-After instead of piling up
+# work that cheap endpoints (like /auth/me) would have to wait for.
+#
+# Optionally bcrypt cost is calibrated at startup (password_bcrypt_calibrate) to the
+# highest number of rounds that fits password_bcrypt_calibration_budget_ms on current
+# node, but never lower than password_bcrypt_rounds. Hashes with lower cost than
+# the current one are rewritten on successful login, see login_access_token view.
+# Nodes may calibrate to different costs, so hashes are never rewritten to lower
+# cost, otherwise they would flip between costs of nodes on every login.
+# When pool is not started (scripts, tests) calls go to default thread pool executor,
+# bcrypt releases GIL so event loop is not blocked there either.
+
+import asyncio
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor
+
 import bcrypt
+from fastapi import HTTPException, status
 
+from app.auth import api_messages
+from app.core import metrics
 from app.core.config import get_settings
 
 
+class _PasswordHashPool:
+    def __init__(self) -> None:
+        self.executor: Executor | None = None
+        self.slots: asyncio.Semaphore | None = None
+        self.waiting = 0
+        self.rounds: int | None = None
+        self.dummy_password_hash: str | None = None
+
+    def start(self) -> None:
+        self.executor = ProcessPoolExecutor(
+            max_workers=get_settings().security.password_hash_pool_size
+        )
+        self.slots = asyncio.Semaphore(get_settings().security.password_hash_pool_size)
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        self.executor = None
+        self.slots = None
+        self.rounds = None
+        self.dummy_password_hash = None
+
+    def _unavailable(self, reason: str) -> HTTPException:
+        metrics.PASSWORD_HASH_REJECTED.labels(reason=reason).inc()
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=api_messages.PASSWORD_HASHING_UNAVAILABLE,
+            headers={
+                "Retry-After": str(
+                    get_settings().security.password_hash_retry_after_secs
+                )
+            },
+        )
+
+    async def _acquire(self, slots: asyncio.Semaphore) -> None:
+        if slots.locked() and (
+            self.waiting >= get_settings().security.password_hash_queue_depth
+        ):
+            raise self._unavailable(reason="queue_full")
+
+        self.waiting += 1
+        metrics.PASSWORD_HASH_QUEUE_DEPTH.inc()
+        start = time.perf_counter()
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+            metrics.PASSWORD_HASH_QUEUE_DEPTH.dec()
+            metrics.PASSWORD_HASH_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+    async def run[T](self, func: Callable[..., T], *args: object) -> T:
+        # functions passed here must be picklable, so we pass bcrypt functions
+        # directly and not local wrappers, worker processes only import bcrypt
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(
+                get_settings().security.password_hash_pool_size
+            )
+        slots = self.slots
+
+        loop = asyncio.get_running_loop()
+        try:
+            async with asyncio.timeout(
+                get_settings().security.password_hash_timeout_secs
+            ):
+                await self._acquire(slots)
+                metrics.PASSWORD_HASH_IN_PROGRESS.inc()
+                future = loop.run_in_executor(self.executor, func, *args)
+
+                def release(future: asyncio.Future[T]) -> None:
+                    # running call cannot be stopped, slot is held until it
+                    # finishes also when caller timed out, so work in the pool
+                    # never exceeds password_hash_pool_size
+                    slots.release()
+                    metrics.PASSWORD_HASH_IN_PROGRESS.dec()
+                    if not future.cancelled():
+                        future.exception()
+
+                future.add_done_callback(release)
+                return await asyncio.shield(future)
+        except TimeoutError:
+            raise self._unavailable(reason="timeout")
+
+
+_HASH_POOL = _PasswordHashPool()
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(
         plain_password.encode("utf-8"), hashed_password.encode("utf-8")
@@ -12,8 +127,82 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return bcrypt.hashpw(
         password.encode(),
-        bcrypt.gensalt(get_settings().security.password_bcrypt_rounds),
+        bcrypt.gensalt(get_bcrypt_rounds()),
     ).decode()
 
 
+def get_bcrypt_rounds() -> int:
+    return _HASH_POOL.rounds or get_settings().security.password_bcrypt_rounds
+
+
+def get_dummy_password_hash() -> str:
+    # hash with current cost, so checking password of not existing user
+    # takes the same time as for existing one
+    return _HASH_POOL.dummy_password_hash or DUMMY_PASSWORD
+
+
+def password_hash_needs_update(hashed_password: str) -> bool:
+    # bcrypt hash format is $2b$<rounds>$<salt and hash>
+    return int(hashed_password.split("$")[2]) < get_bcrypt_rounds()
+
+
+def calibrate_bcrypt_rounds(
+    min_rounds: int, max_rounds: int, budget_secs: float
+) -> int:
+    rounds = min_rounds
+    for candidate in range(min_rounds, max_rounds + 1):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(candidate))
+        elapsed = time.perf_counter() - start
+
+        if candidate > min_rounds and elapsed > budget_secs:
+            break
+        rounds = candidate
+        # every round doubles the cost, no need to measure what won't fit
+        if elapsed * 2 > budget_secs:
+            break
+
+    return rounds
+
+
+async def calibrate_password_hash_rounds() -> int:
+    security = get_settings().security
+    loop = asyncio.get_running_loop()
+
+    rounds = await loop.run_in_executor(
+        None,
+        calibrate_bcrypt_rounds,
+        security.password_bcrypt_rounds,
+        security.password_bcrypt_max_rounds,
+        security.password_bcrypt_calibration_budget_ms / 1000,
+    )
+    dummy_password_hash = await loop.run_in_executor(
+        None, bcrypt.hashpw, b"", bcrypt.gensalt(rounds)
+    )
+
+    _HASH_POOL.rounds = rounds
+    _HASH_POOL.dummy_password_hash = dummy_password_hash.decode()
+    return rounds
+
+
+def start_password_hash_pool() -> None:
+    _HASH_POOL.start()
+
+
+def shutdown_password_hash_pool() -> None:
+    _HASH_POOL.shutdown()
+
+
+async def async_verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _HASH_POOL.run(
+        bcrypt.checkpw, plain_password.encode("utf-8"), hashed_password.encode("utf-8")
+    )
+
+
+async def async_get_password_hash(password: str) -> str:
+    salt = bcrypt.gensalt(get_bcrypt_rounds())
+    hashed_password = await _HASH_POOL.run(bcrypt.hashpw, password.encode(), salt)
+    return hashed_password.decode()
+
+
 DUMMY_PASSWORD = get_password_hash("")
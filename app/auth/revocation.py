@@ -0,0 +1,108 @@
+# Revoked access tokens for stateless authentication, see
+# Security.jwt_stateless_auth and app.auth.dependencies.get_current_principal.
+#
+# Deleting user or resetting password stores revocation time of the user in
+# auth_user_revocation table and sends NOTIFY in the same transaction, so every
+# app process (see PgListener in lifespan) learns about it when it is committed.
+# Access token is revoked when it was issued before revocation time of its user
+# or in the same millisecond. Both are kept in milliseconds, iat of access tokens
+# has millisecond precision (see JWTCodec.encode), so token issued right after
+# password reset in the same second stays valid.
+#
+# Revocation matters only for jwt_access_token_expire_secs after it happened,
+# older tokens are expired anyway, so older entries are dropped. The set size is
+# bounded by number of revocations in that window and stays small enough to be
+# kept exact in memory, approximate structures like Bloom filter would reject
+# tokens of random users on false positives.
+
+
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.jwt import JWTTokenPayload
+from app.auth.models import UserRevocation
+from app.core.config import get_settings
+
+REVOCATION_CHANNEL = "auth_user_revocation"
+
+
+def now_ms() -> int:
+    return round(time.time() * 1000)
+
+
+class _RevokedUsers:
+    def __init__(self) -> None:
+        self.revoked_at_ms: dict[str, int] = {}
+
+    def add(self, user_id: str, revoked_at_ms: int) -> None:
+        if revoked_at_ms > self.revoked_at_ms.get(user_id, 0):
+            self.revoked_at_ms[user_id] = revoked_at_ms
+
+    def prune(self, before_ms: int) -> None:
+        self.revoked_at_ms = {
+            user_id: revoked_at_ms
+            for user_id, revoked_at_ms in self.revoked_at_ms.items()
+            if revoked_at_ms >= before_ms
+        }
+
+
+_REVOKED_USERS = _RevokedUsers()
+
+
+def revocation_window_start_ms() -> int:
+    return now_ms() - get_settings().security.jwt_access_token_expire_secs * 1000
+
+
+def is_token_revoked(token_payload: JWTTokenPayload) -> bool:
+    revoked_at_ms = _REVOKED_USERS.revoked_at_ms.get(token_payload.sub)
+    return (
+        revoked_at_ms is not None and round(token_payload.iat * 1000) <= revoked_at_ms
+    )
+
+
+def add_revocation(user_id: str, revoked_at_ms: int) -> None:
+    _REVOKED_USERS.add(user_id, revoked_at_ms)
+    _REVOKED_USERS.prune(before_ms=revocation_window_start_ms())
+
+
+def clear_revocations() -> None:
+    _REVOKED_USERS.revoked_at_ms.clear()
+
+
+def on_revocation_notify(payload: str) -> None:
+    revoked_at_ms, user_id = payload.split(":", 1)
+    add_revocation(user_id, int(revoked_at_ms))
+
+
+async def revoke_user_tokens(session: AsyncSession, user_id: str) -> int:
+    # caller commits the session, then calls add_revocation with returned value
+    revoked_at_ms = now_ms()
+    await session.execute(
+        insert(UserRevocation)
+        .values(user_id=user_id, revoked_at_ms=revoked_at_ms)
+        .on_conflict_do_update(
+            index_elements=[UserRevocation.user_id],
+            set_={"revoked_at_ms": revoked_at_ms},
+        )
+    )
+    await session.execute(
+        select(func.pg_notify(REVOCATION_CHANNEL, f"{revoked_at_ms}:{user_id}"))
+    )
+    return revoked_at_ms
+
+
+async def load_revocations(session: AsyncSession) -> int:
+    rows = await session.execute(
+        select(UserRevocation.user_id, UserRevocation.revoked_at_ms).where(
+            UserRevocation.revoked_at_ms >= revocation_window_start_ms()
+        )
+    )
+    loaded = 0
+    for user_id, revoked_at_ms in rows:
+        _REVOKED_USERS.add(user_id, revoked_at_ms)
+        loaded += 1
+    _REVOKED_USERS.prune(before_ms=revocation_window_start_ms())
+    return loaded
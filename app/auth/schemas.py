@@ -1,5 +1,9 @@
+from typing import Self
+
 from pydantic import BaseModel, ConfigDict, EmailStr
 
+from app.auth.models import User
+
 
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
@@ -29,3 +33,9 @@ class UserResponse(BaseModel):
     email: EmailStr
 
     model_config = ConfigDict(from_attributes=True)
+
+    @classmethod
+    def from_user(cls, user: User) -> Self:
+        # trusted output, no validation: email of User was validated on
+        # registration, model_validate would run email-validator on every response
+        return cls.model_construct(user_id=user.user_id, email=user.email)
@@ -0,0 +1,82 @@
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import bulk_import
+from app.auth.models import User
+from app.auth.password import verify_password
+
+
+@pytest.fixture(name="executor", scope="module")
+def fixture_executor() -> Iterator[ProcessPoolExecutor]:
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+async def imported_users(session: AsyncSession, domain: str) -> dict[str, User]:
+    users = await session.scalars(select(User).where(User.email.endswith(domain)))
+    return {user.email: user for user in users}
+
+
+async def test_import_users_from_csv(
+    session: AsyncSession, executor: ProcessPoolExecutor
+) -> None:
+    lines = [
+        "email,password\n",
+        "a@csv.example.com,password-a\n",
+        "b@csv.example.com,password-b\n",
+        "c@csv.example.com,password-c\n",
+    ]
+
+    stats = await bulk_import.import_users(
+        session, executor, bulk_import.read_csv(lines), batch_size=2
+    )
+
+    users = await imported_users(session, "@csv.example.com")
+    assert (stats.imported, stats.duplicates, stats.invalid) == (len(users), 0, 0)
+    assert sorted(users) == [
+        "a@csv.example.com",
+        "b@csv.example.com",
+        "c@csv.example.com",
+    ]
+    assert verify_password("password-b", users["b@csv.example.com"].hashed_password)
+
+
+async def test_import_users_skips_duplicates_and_invalid_rows(
+    session: AsyncSession,
+    executor: ProcessPoolExecutor,
+    default_user: User,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    lines = [
+        '{"email": "a@ndjson.example.com", "password": "password-a"}\n',
+        "\n",
+        f'{{"email": "{default_user.email}", "password": "password"}}\n',
+        '{"email": "a@ndjson.example.com", "password": "password-a2"}\n',
+        '{"email": "not an email", "password": "password"}\n',
+        "not json\n",
+        '{"email": "b@ndjson.example.com", "password": "password-b"}\n',
+    ]
+
+    stats = await bulk_import.import_users(
+        session, executor, bulk_import.read_ndjson(lines)
+    )
+
+    users = await imported_users(session, "@ndjson.example.com")
+    duplicates = 2
+    invalid = 2
+    assert (stats.imported, stats.duplicates, stats.invalid) == (
+        len(users),
+        duplicates,
+        invalid,
+    )
+    assert verify_password("password-a", users["a@ndjson.example.com"].hashed_password)
+    output = capsys.readouterr().out
+    assert f"duplicate email {default_user.email}, skipped" in output
+    assert "duplicate email a@ndjson.example.com, skipped" in output
+    assert "invalid row on line 5, skipped" in output
+    assert "invalid row on line 6, skipped" in output
+    assert "imported 2, duplicates 2, invalid 2" in output
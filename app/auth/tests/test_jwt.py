@@ -1,12 +1,69 @@
+import json
 import time
+from typing import Any
 
 import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
 from fastapi import HTTPException
 from freezegun import freeze_time
-from pydantic import SecretStr
+from jwt import PyJWT, get_unverified_header
+from pydantic import SecretStr, ValidationError
 
 from app.auth import jwt
-from app.core.config import get_settings
+from app.core.config import Security, get_settings
+from app.tests.metrics import metric
+
+
+def generate_private_key_pem(algorithm: str) -> str:
+    private_key: (
+        ed25519.Ed25519PrivateKey | ec.EllipticCurvePrivateKey | rsa.RSAPrivateKey
+    )
+    if algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+
+def public_key_pem(private_key_pem: str) -> str:
+    private_key = serialization.load_pem_private_key(
+        private_key_pem.encode(), password=None
+    )
+    return (
+        private_key.public_key()
+        .public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode()
+    )
+
+
+def replace_security(monkeypatch: pytest.MonkeyPatch, **values: Any) -> None:
+    # jwt codec is built once per Security, new one makes it rebuilt
+    security = get_settings().security.model_copy(update=values)
+    monkeypatch.setattr(get_settings(), "security", security)
+
+
+def use_asymmetric_keys(
+    monkeypatch: pytest.MonkeyPatch,
+    algorithm: str,
+    private_key_pem: str,
+    verification_keys: list[str] | None = None,
+) -> None:
+    replace_security(
+        monkeypatch,
+        jwt_algorithm=algorithm,
+        jwt_private_key=SecretStr(private_key_pem),
+        jwt_verification_keys=verification_keys or [],
+    )
 
 
 def test_jwt_access_token_can_be_decoded_back_into_user_id() -> None:
@@ -42,6 +99,17 @@ def test_jwt_error_after_exp_time() -> None:
         assert e.value.detail == "Token invalid: Signature has expired"
 
 
+@freeze_time("2024-01-01 00:00:00.123")
+def test_jwt_iat_has_millisecond_precision() -> None:
+    token = jwt.create_jwt_token("test_user_id")
+
+    assert token.payload.iat == round(time.time(), 3)
+    assert token.payload.exp == (
+        int(time.time()) + get_settings().security.jwt_access_token_expire_secs
+    )
+    assert jwt.verify_jwt_token(token.access_token).iat == token.payload.iat
+
+
 def test_jwt_error_before_iat_time() -> None:
     user_id = "test_user_id"
     with freeze_time("2024-01-01"):
@@ -60,11 +128,11 @@ def test_jwt_error_with_invalid_token() -> None:
     assert e.value.detail == "Token invalid: Not enough segments"
 
 
-def test_jwt_error_with_invalid_issuer() -> None:
+def test_jwt_error_with_invalid_issuer(monkeypatch: pytest.MonkeyPatch) -> None:
     user_id = "test_user_id"
     token = jwt.create_jwt_token(user_id)
 
-    get_settings().security.jwt_issuer = "another_issuer"
+    replace_security(monkeypatch, jwt_issuer="another_issuer")
 
     with pytest.raises(HTTPException) as e:
         jwt.verify_jwt_token(token=token.access_token)
@@ -72,13 +140,127 @@ def test_jwt_error_with_invalid_issuer() -> None:
     assert e.value.detail == "Token invalid: Invalid issuer"
 
 
-def test_jwt_error_with_invalid_secret_key() -> None:
+def test_jwt_error_with_invalid_secret_key(monkeypatch: pytest.MonkeyPatch) -> None:
     user_id = "test_user_id"
     token = jwt.create_jwt_token(user_id)
 
-    get_settings().security.jwt_secret_key = SecretStr("x" * 32)
+    replace_security(monkeypatch, jwt_secret_key=SecretStr("x" * 32))
 
     with pytest.raises(HTTPException) as e:
         jwt.verify_jwt_token(token=token.access_token)
 
     assert e.value.detail == "Token invalid: Signature verification failed"
+
+
+def test_jwt_verified_token_is_cached(monkeypatch: pytest.MonkeyPatch) -> None:
+    token = jwt.create_jwt_token("test_user_id")
+    payload = jwt.verify_jwt_token(token=token.access_token)
+
+    def decode_not_expected(*args: Any, **kwargs: Any) -> None:
+        raise AssertionError("cached token should not be decoded again")
+
+    monkeypatch.setattr(PyJWT, "decode", decode_not_expected)
+
+    hits_before = metric("org_app_jwt_verify_cache_total", result="hit")
+    assert jwt.verify_jwt_token(token=token.access_token) is payload
+    assert metric("org_app_jwt_verify_cache_total", result="hit") == hits_before + 1
+
+
+def test_jwt_cached_token_error_after_exp_time() -> None:
+    user_id = "test_user_id"
+    with freeze_time("2024-01-01"):
+        token = jwt.create_jwt_token(user_id)
+        jwt.verify_jwt_token(token=token.access_token)
+    with freeze_time("2024-02-01"):
+        with pytest.raises(HTTPException) as e:
+            jwt.verify_jwt_token(token=token.access_token)
+
+        assert e.value.detail == "Token invalid: Signature has expired"
+
+
+def test_jwt_codec_is_rebuilt_only_when_settings_are_cleared() -> None:
+    codec = jwt.get_jwt_codec()
+    assert jwt.get_jwt_codec() is codec
+
+    get_settings.cache_clear()
+
+    assert jwt.get_jwt_codec() is not codec
+
+
+@pytest.mark.parametrize("algorithm", ["EdDSA", "ES256", "RS256"])
+def test_jwt_asymmetric_token_can_be_decoded_back_into_user_id(
+    monkeypatch: pytest.MonkeyPatch, algorithm: str
+) -> None:
+    use_asymmetric_keys(monkeypatch, algorithm, generate_private_key_pem(algorithm))
+    user_id = "test_user_id"
+    token = jwt.create_jwt_token(user_id)
+
+    header = get_unverified_header(token.access_token)
+    jwks = json.loads(jwt.get_jwt_codec().jwks_json)
+    assert header["alg"] == algorithm
+    assert [key["kid"] for key in jwks["keys"]] == [header["kid"]]
+    assert jwt.verify_jwt_token(token=token.access_token).sub == user_id
+
+
+def test_jwt_token_signed_with_rotated_key_is_verified_by_verification_key(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    old_private_key = generate_private_key_pem("EdDSA")
+    use_asymmetric_keys(monkeypatch, "EdDSA", old_private_key)
+    token = jwt.create_jwt_token("test_user_id")
+
+    use_asymmetric_keys(
+        monkeypatch,
+        "EdDSA",
+        generate_private_key_pem("EdDSA"),
+        verification_keys=[public_key_pem(old_private_key)],
+    )
+
+    assert jwt.verify_jwt_token(token=token.access_token).sub == "test_user_id"
+    assert len(json.loads(jwt.get_jwt_codec().jwks_json)["keys"]) == len(["new", "old"])
+
+
+def test_jwt_error_with_unknown_key_id(monkeypatch: pytest.MonkeyPatch) -> None:
+    use_asymmetric_keys(monkeypatch, "EdDSA", generate_private_key_pem("EdDSA"))
+    token = jwt.create_jwt_token("test_user_id")
+
+    use_asymmetric_keys(monkeypatch, "EdDSA", generate_private_key_pem("EdDSA"))
+
+    with pytest.raises(HTTPException) as e:
+        jwt.verify_jwt_token(token=token.access_token)
+
+    assert e.value.detail == "Token invalid: Unknown key id"
+
+
+def test_jwt_error_with_hs256_token_when_asymmetric_keys_are_used(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    token = jwt.create_jwt_token("test_user_id")
+
+    use_asymmetric_keys(monkeypatch, "ES256", generate_private_key_pem("ES256"))
+
+    with pytest.raises(HTTPException) as e:
+        jwt.verify_jwt_token(token=token.access_token)
+
+    assert e.value.detail == "Token invalid: Unknown key id"
+
+
+def test_jwk_thumbprint_matches_rfc_8037_example() -> None:
+    # https://www.rfc-editor.org/rfc/rfc8037#appendix-A.3
+    jwk = {
+        "crv": "Ed25519",
+        "kty": "OKP",
+        "x": "11qYAYKxCrfVS_7TyWQHOg7hcvPapiMlrwIaaPcHURo",
+    }
+
+    assert jwt.jwk_thumbprint(jwk) == "kPrK_qmxVWaYVA9wwBF6Iuo3vVzz7TxHCTwXBygrS4k"
+
+
+def test_security_requires_private_key_for_asymmetric_algorithm() -> None:
+    with pytest.raises(ValidationError, match="jwt_private_key is required"):
+        Security(jwt_algorithm="EdDSA")
+
+
+def test_security_rejects_unsupported_algorithm() -> None:
+    with pytest.raises(ValidationError, match="jwt_algorithm must be one of"):
+        Security(jwt_algorithm="none")
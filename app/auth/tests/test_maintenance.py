@@ -0,0 +1,189 @@
+import asyncio
+import time
+import uuid
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import maintenance, revocation
+from app.auth.models import RefreshToken, User, UserRevocation
+from app.core import database_session
+from app.core.config import get_settings
+from app.tests.metrics import metric
+
+
+@pytest_asyncio.fixture(name="user", loop_scope="session", scope="function")
+async def fixture_user(session: AsyncSession) -> User:
+    # UserFactory creates also random refresh tokens
+    user = User(email="maintenance@example.com", hashed_password="hashed_password")
+    session.add(user)
+    await session.flush()
+    return user
+
+
+def add_refresh_token(session: AsyncSession, user: User, used: bool, exp: int) -> None:
+    session.add(
+        RefreshToken(
+            user_id=user.user_id,
+            refresh_token_digest=RefreshToken.digest(str(time.perf_counter_ns())),
+            used=used,
+            exp=exp,
+        )
+    )
+
+
+async def refresh_tokens_count(session: AsyncSession) -> int:
+    result = await session.execute(select(func.count()).select_from(RefreshToken))
+    return result.scalar_one()
+
+
+async def test_maintenance_deletes_used_and_expired_refresh_tokens(
+    session: AsyncSession, user: User
+) -> None:
+    now = int(time.time())
+    add_refresh_token(session, user, used=True, exp=now + 3600)
+    add_refresh_token(session, user, used=False, exp=now - 1)
+    add_refresh_token(session, user, used=False, exp=now + 3600)
+    await session.commit()
+
+    deleted_rows = await maintenance.run_maintenance(session)
+
+    assert deleted_rows == {"auth_refresh_token": 2, "auth_user_revocation": 0}
+    assert await refresh_tokens_count(session) == 1
+
+
+async def test_maintenance_deletes_refresh_tokens_in_batches(
+    session: AsyncSession, user: User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_settings().maintenance, "batch_size", 2)
+    monkeypatch.setattr(get_settings().maintenance, "batch_delay_secs", 0)
+    expired_tokens = 5
+    for _ in range(expired_tokens):
+        add_refresh_token(session, user, used=False, exp=0)
+    await session.commit()
+    deleted_before = metric(
+        "org_app_maintenance_deleted_rows_total", table="auth_refresh_token"
+    )
+
+    deleted_rows = await maintenance.run_maintenance(session)
+
+    assert deleted_rows is not None
+    assert deleted_rows["auth_refresh_token"] == expired_tokens
+    assert (
+        metric("org_app_maintenance_deleted_rows_total", table="auth_refresh_token")
+        == deleted_before + expired_tokens
+    )
+    assert await refresh_tokens_count(session) == 0
+
+
+async def test_maintenance_deletes_revocations_older_than_access_token(
+    session: AsyncSession,
+) -> None:
+    window_start_ms = revocation.revocation_window_start_ms()
+    old_user_id, recent_user_id = str(uuid.uuid4()), str(uuid.uuid4())
+    session.add(UserRevocation(user_id=old_user_id, revoked_at_ms=window_start_ms - 1))
+    session.add(
+        UserRevocation(user_id=recent_user_id, revoked_at_ms=revocation.now_ms())
+    )
+    await session.commit()
+
+    deleted_rows = await maintenance.run_maintenance(session)
+
+    assert deleted_rows == {"auth_refresh_token": 0, "auth_user_revocation": 1}
+    revocations = await session.scalars(select(UserRevocation.user_id))
+    assert revocations.all() == [recent_user_id]
+
+
+async def test_maintenance_is_skipped_when_another_process_holds_lock(
+    session: AsyncSession, user: User
+) -> None:
+    add_refresh_token(session, user, used=True, exp=0)
+    await session.commit()
+    skipped_before = metric("org_app_maintenance_runs_total", result="skipped")
+    deleted_before = metric(
+        "org_app_maintenance_deleted_rows_total", table="auth_refresh_token"
+    )
+
+    async with database_session._ASYNC_ENGINE.connect() as connection:
+        await connection.execute(
+            select(func.pg_advisory_lock(maintenance.MAINTENANCE_LOCK_ID))
+        )
+        try:
+            assert await maintenance.run_maintenance(session) is None
+        finally:
+            await connection.execute(
+                select(func.pg_advisory_unlock(maintenance.MAINTENANCE_LOCK_ID))
+            )
+
+    assert (
+        metric("org_app_maintenance_runs_total", result="skipped") == skipped_before + 1
+    )
+    assert (
+        metric("org_app_maintenance_deleted_rows_total", table="auth_refresh_token")
+        == deleted_before
+    )
+
+
+async def test_maintenance_releases_lock_when_finished(session: AsyncSession) -> None:
+    assert await maintenance.run_maintenance(session) is not None
+
+    async with database_session._ASYNC_ENGINE.connect() as connection:
+        locked = await connection.scalar(
+            select(func.pg_try_advisory_lock(maintenance.MAINTENANCE_LOCK_ID))
+        )
+        await connection.execute(
+            select(func.pg_advisory_unlock(maintenance.MAINTENANCE_LOCK_ID))
+        )
+    assert locked
+
+
+async def test_maintenance_runs_periodically(
+    session: AsyncSession, user: User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_settings().maintenance, "interval_secs", 0)
+    add_refresh_token(session, user, used=True, exp=0)
+    await session.commit()
+    completed_before = metric("org_app_maintenance_runs_total", result="completed")
+    failed_before = metric("org_app_maintenance_runs_total", result="failed")
+    failures: list[str] = []
+    loop_sessions: list[AsyncSession] = []
+    run_finished = asyncio.Event()
+
+    @asynccontextmanager
+    async def new_session() -> AsyncGenerator[AsyncSession]:
+        # first run fails, next one deletes rows with its own session (on test
+        # connection, so it is rolled back with the test), the one after starts
+        # when it is finished and logged
+        if not failures:
+            failures.append("failed")
+            raise ConnectionError("database is down")
+        if loop_sessions:
+            run_finished.set()
+            await asyncio.Event().wait()
+        async with AsyncSession(
+            bind=await session.connection(), expire_on_commit=False
+        ) as loop_session:
+            loop_sessions.append(loop_session)
+            yield loop_session
+
+    task = asyncio.create_task(maintenance.run_maintenance_periodically(new_session))
+    try:
+        async with asyncio.timeout(5):
+            await run_finished.wait()
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert failures == ["failed"]
+    assert (
+        metric("org_app_maintenance_runs_total", result="failed") == failed_before + 1
+    )
+    assert (
+        metric("org_app_maintenance_runs_total", result="completed")
+        == completed_before + 1
+    )
+    assert await refresh_tokens_count(session) == 0
@@ -0,0 +1,317 @@
+import time
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+import pytest
+import pytest_asyncio
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.auth import maintenance, partitions
+from app.auth.models import RefreshToken, User
+from app.core import database_session
+from app.core.config import get_settings
+from app.main import app
+from app.tests.auth import TESTS_USER_PASSWORD
+from app.tests.metrics import metric
+from app.tests.partitions import partition_table_sql, unpartition_table_sql
+
+
+@pytest_asyncio.fixture(name="partitioned", loop_scope="session", scope="function")
+async def fixture_partitioned(session: AsyncSession) -> int:
+    # DDL is rolled back with the rest of test transaction
+    now = int(time.time())
+    for statement in partition_table_sql(now):
+        await session.execute(text(statement))
+    return now
+
+
+@pytest_asyncio.fixture(
+    name="committed_partitioned", loop_scope="session", scope="function"
+)
+async def fixture_committed_partitioned() -> AsyncGenerator[int]:
+    # DETACH PARTITION CONCURRENTLY cannot run in test transaction, layout is
+    # committed to test database and reverted after the test
+    now = int(time.time())
+    async with database_session._ASYNC_ENGINE.connect() as connection:
+        async with connection.begin():
+            for statement in partition_table_sql(now):
+                await connection.execute(text(statement))
+        try:
+            yield now
+        finally:
+            async with connection.begin():
+                for statement in unpartition_table_sql():
+                    await connection.execute(text(statement))
+
+
+@asynccontextmanager
+async def autocommit_connection() -> AsyncGenerator[AsyncConnection]:
+    async with database_session._ASYNC_ENGINE.connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        yield connection
+
+
+async def refresh_tokens_count(session: AsyncSession) -> int:
+    result = await session.execute(select(func.count()).select_from(RefreshToken))
+    return result.scalar_one()
+
+
+def test_planned_partitions_cover_refresh_token_lifetime_and_ahead() -> None:
+    now = int(time.time())
+    period = get_settings().maintenance.refresh_token_partition_secs
+    max_exp = now + get_settings().security.jwt_refresh_token_expire_secs
+
+    planned = partitions.planned_partitions(now, last_end=None)
+
+    assert planned[0].start <= now < planned[0].end
+    assert planned[-1].start > max_exp
+    assert all(partition.end % period == 0 for partition in planned)
+    assert all(
+        previous.end == partition.start
+        for previous, partition in zip(planned, planned[1:], strict=False)
+    )
+
+
+def test_planned_partitions_start_after_last_partition() -> None:
+    now = int(time.time())
+    period = get_settings().maintenance.refresh_token_partition_secs
+    last_end = now - now % period + 3 * period
+
+    planned = partitions.planned_partitions(now, last_end=last_end)
+
+    assert planned[0].start == last_end
+    assert planned[0].name == f"auth_refresh_token_p{last_end}"
+
+
+async def test_partition_table_keeps_not_expired_tokens(
+    session: AsyncSession, default_user: User
+) -> None:
+    now = int(time.time())
+    period = get_settings().maintenance.refresh_token_partition_secs
+    for exp in (now - period, now, now + 3600):
+        session.add(
+            RefreshToken(
+                user_id=default_user.user_id,
+                refresh_token_digest=RefreshToken.digest(str(exp)),
+                exp=exp,
+            )
+        )
+    await session.commit()
+    assert not await partitions.is_partitioned(session)
+
+    for statement in partition_table_sql(now):
+        await session.execute(text(statement))
+
+    assert await partitions.is_partitioned(session)
+    kept = await session.scalars(select(RefreshToken.exp).order_by(RefreshToken.exp))
+    assert kept.all() == [now, now + 3600]
+    assert await partitions.get_partitions(session) == partitions.planned_partitions(
+        now, last_end=None
+    )
+
+    for statement in unpartition_table_sql():
+        await session.execute(text(statement))
+
+    assert not await partitions.is_partitioned(session)
+    kept = await session.scalars(select(RefreshToken.exp).order_by(RefreshToken.exp))
+    assert kept.all() == [now, now + 3600]
+
+
+def test_generated_exp_is_none_for_tokens_without_exp_prefix() -> None:
+    exp = int(time.time())
+    assert RefreshToken.generated_exp(RefreshToken.generate(exp)) == exp
+    assert RefreshToken.generated_exp("blaxx") is None
+    assert RefreshToken.generated_exp("1" * 19 + ".blaxx") is None
+
+
+async def test_refresh_token_lookup_scans_single_partition(
+    session: AsyncSession, partitioned: int
+) -> None:
+    refresh_token = RefreshToken.generate(partitioned + 3600)
+
+    plan = await session.scalars(
+        text(
+            "EXPLAIN SELECT exp FROM auth_refresh_token "
+            "WHERE refresh_token_digest = :digest AND exp = :exp"
+        ),
+        {
+            "digest": RefreshToken.digest(refresh_token),
+            "exp": RefreshToken.generated_exp(refresh_token),
+        },
+    )
+
+    scanned = [line for line in plan if " on auth_refresh_token_p" in line]
+    assert len(scanned) == 1
+
+
+async def test_login_and_refresh_token_on_partitioned_table(
+    client: AsyncClient, default_user: User, partitioned: int
+) -> None:
+    login_response = await client.post(
+        app.url_path_for("login_access_token"),
+        data={
+            "username": default_user.email,
+            "password": TESTS_USER_PASSWORD,
+        },
+    )
+    refresh_response = await client.post(
+        app.url_path_for("refresh_token"),
+        json={"refresh_token": login_response.json()["refresh_token"]},
+    )
+    reused_response = await client.post(
+        app.url_path_for("refresh_token"),
+        json={"refresh_token": login_response.json()["refresh_token"]},
+    )
+
+    assert login_response.status_code == status.HTTP_200_OK
+    assert refresh_response.status_code == status.HTTP_200_OK
+    assert reused_response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+async def test_create_partitions_continues_after_last_partition(
+    session: AsyncSession, partitioned: int
+) -> None:
+    period = get_settings().maintenance.refresh_token_partition_secs
+    partitions_before = await partitions.get_partitions(session)
+    later = partitioned + 2 * period
+
+    created = await partitions.create_partitions(session, later)
+
+    assert created[0].start == partitions_before[-1].end
+    assert await partitions.get_partitions(session) == partitions_before + created
+    assert await partitions.create_partitions(session, later) == []
+
+
+async def test_token_without_partition_is_not_inserted(
+    session: AsyncSession, default_user: User, partitioned: int
+) -> None:
+    partitions_before = await partitions.get_partitions(session)
+
+    with pytest.raises(DBAPIError, match="no partition"):
+        async with session.begin_nested():
+            session.add(
+                RefreshToken(
+                    user_id=default_user.user_id,
+                    refresh_token_digest=RefreshToken.digest("not_partitioned"),
+                    exp=partitions_before[-1].end,
+                )
+            )
+
+
+async def test_check_partitions_requires_partitions_for_refresh_token_lifetime(
+    session: AsyncSession, partitioned: int
+) -> None:
+    partitions_before = await partitions.get_partitions(session)
+
+    await partitions.check_partitions(session, partitioned)
+    with pytest.raises(RuntimeError, match="python -m app.auth.maintenance"):
+        await partitions.check_partitions(session, partitions_before[-1].end)
+
+
+async def test_check_partitions_passes_without_partitioning(
+    session: AsyncSession,
+) -> None:
+    await partitions.check_partitions(session, int(time.time()))
+
+
+async def test_drop_partitions_detaches_and_drops_expired_partitions(
+    committed_partitioned: int,
+) -> None:
+    period = get_settings().maintenance.refresh_token_partition_secs
+    later = committed_partitioned + 2 * period
+
+    async with autocommit_connection() as connection:
+        partitions_before = await partitions.get_partitions(connection)
+        dropped = await partitions.drop_partitions(connection, later)
+        partitions_after = await partitions.get_partitions(connection)
+        left_tables = await connection.scalar(
+            text(
+                "SELECT count(to_regclass(name)) FROM unnest(CAST(:names AS text[])) name"
+            ),
+            {"names": [partition.name for partition in dropped]},
+        )
+
+    assert dropped == [
+        partition for partition in partitions_before if partition.end <= later
+    ]
+    assert partitions_after == [
+        partition for partition in partitions_before if partition not in dropped
+    ]
+    assert left_tables == 0
+
+
+async def test_drop_partitions_finalizes_interrupted_detach(
+    committed_partitioned: int,
+) -> None:
+    period = get_settings().maintenance.refresh_token_partition_secs
+    later = committed_partitioned + period
+
+    async with autocommit_connection() as connection:
+        expired = (await partitions.get_partitions(connection))[0]
+        # detach waits for transactions using the table, it is interrupted then
+        async with database_session._ASYNC_ENGINE.connect() as reader:
+            await reader.execute(text("SELECT FROM auth_refresh_token"))
+            await connection.execute(text("SET lock_timeout = '100ms'"))
+            with pytest.raises(DBAPIError, match="lock timeout"):
+                await connection.execute(
+                    text(
+                        "ALTER TABLE auth_refresh_token "
+                        f"DETACH PARTITION {expired.name} CONCURRENTLY"
+                    )
+                )
+        pending = (await partitions.get_partitions(connection))[0]
+
+        dropped = await partitions.drop_partitions(connection, later)
+        partitions_after = await partitions.get_partitions(connection)
+
+    assert pending.detach_pending
+    assert dropped == [pending]
+    assert expired.name not in [partition.name for partition in partitions_after]
+
+
+async def test_maintenance_does_not_delete_refresh_token_rows_when_partitioned(
+    session: AsyncSession, default_user: User, partitioned: int
+) -> None:
+    session.add(
+        RefreshToken(
+            user_id=default_user.user_id,
+            refresh_token_digest=RefreshToken.digest("used"),
+            used=True,
+            exp=partitioned + 3600,
+        )
+    )
+    await session.commit()
+    tokens_before = await refresh_tokens_count(session)
+    created = {"table": "auth_refresh_token", "action": "created"}
+    created_before = metric("org_app_maintenance_partitions_total", **created)
+
+    deleted_rows = await maintenance.run_maintenance(session)
+
+    assert deleted_rows == {"auth_user_revocation": 0}
+    assert await refresh_tokens_count(session) == tokens_before
+    assert metric("org_app_maintenance_partitions_total", **created) == created_before
+
+
+async def test_maintenance_of_partitions_is_skipped_when_another_process_holds_lock(
+    session: AsyncSession, partitioned: int
+) -> None:
+    skipped_before = metric("org_app_maintenance_runs_total", result="skipped")
+
+    async with database_session._ASYNC_ENGINE.connect() as connection:
+        await connection.execute(
+            select(func.pg_advisory_lock(maintenance.MAINTENANCE_LOCK_ID))
+        )
+        try:
+            assert await maintenance.run_maintenance(session) is None
+        finally:
+            await connection.execute(
+                select(func.pg_advisory_unlock(maintenance.MAINTENANCE_LOCK_ID))
+            )
+
+    assert (
+        metric("org_app_maintenance_runs_total", result="skipped") == skipped_before + 1
+    )
@@ -1,4 +1,35 @@
-from app.auth.password import get_password_hash, verify_password
+import asyncio
+import time
+
+import bcrypt
+import pytest
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+
+from app.auth import api_messages
+from app.auth.password import (
+    DUMMY_PASSWORD,
+    async_get_password_hash,
+    async_verify_password,
+    calibrate_bcrypt_rounds,
+    calibrate_password_hash_rounds,
+    get_dummy_password_hash,
+    get_password_hash,
+    password_hash_needs_update,
+    shutdown_password_hash_pool,
+    start_password_hash_pool,
+    verify_password,
+)
+from app.core.config import Security, get_settings
+
+
+def slow_checkpw(*_: object) -> bool:
+    time.sleep(0.2)
+    return True
+
+
+def get_password_hash_with_rounds(rounds: int) -> str:
+    return bcrypt.hashpw(b"my_password", bcrypt.gensalt(rounds)).decode()
 
 
 def test_hashed_password_is_verified() -> None:
@@ -9,3 +40,138 @@ def test_hashed_password_is_verified() -> None:
 def test_invalid_password_is_not_verified() -> None:
     pwd_hash = get_password_hash("my_password")
     assert not verify_password("my_password_invalid", pwd_hash)
+
+
+async def test_async_hashed_password_is_verified() -> None:
+    pwd_hash = await async_get_password_hash("my_password")
+    assert await async_verify_password("my_password", pwd_hash)
+    assert not await async_verify_password("my_password_invalid", pwd_hash)
+
+
+async def test_async_hashed_password_is_verified_in_process_pool() -> None:
+    start_password_hash_pool()
+    try:
+        pwd_hash = await async_get_password_hash("my_password")
+        assert await async_verify_password("my_password", pwd_hash)
+        assert verify_password("my_password", pwd_hash)
+    finally:
+        shutdown_password_hash_pool()
+
+
+async def test_async_password_hash_raise_503_after_timeout(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(bcrypt, "checkpw", lambda *_: time.sleep(0.5))
+    monkeypatch.setattr(get_settings().security, "password_hash_timeout_secs", 0.01)
+
+    with pytest.raises(HTTPException) as e:
+        await async_verify_password("my_password", DUMMY_PASSWORD)
+
+    assert e.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert e.value.detail == api_messages.PASSWORD_HASHING_UNAVAILABLE
+    assert e.value.headers == {"Retry-After": "1"}
+
+
+async def test_async_password_hash_raise_503_when_queue_is_full(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(bcrypt, "checkpw", slow_checkpw)
+    monkeypatch.setattr(get_settings().security, "password_hash_pool_size", 1)
+    monkeypatch.setattr(get_settings().security, "password_hash_queue_depth", 1)
+    monkeypatch.setattr(get_settings().security, "password_hash_retry_after_secs", 5)
+
+    running = asyncio.create_task(async_verify_password("pwd", DUMMY_PASSWORD))
+    waiting = asyncio.create_task(async_verify_password("pwd", DUMMY_PASSWORD))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(HTTPException) as e:
+        await async_verify_password("my_password", DUMMY_PASSWORD)
+
+    assert e.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert e.value.detail == api_messages.PASSWORD_HASHING_UNAVAILABLE
+    assert e.value.headers == {"Retry-After": "5"}
+
+    assert await running
+    assert await waiting
+
+
+async def test_async_password_hash_holds_slot_until_timed_out_call_finishes(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(bcrypt, "checkpw", slow_checkpw)
+    monkeypatch.setattr(get_settings().security, "password_hash_pool_size", 1)
+    monkeypatch.setattr(get_settings().security, "password_hash_queue_depth", 0)
+    monkeypatch.setattr(get_settings().security, "password_hash_timeout_secs", 0.05)
+
+    with pytest.raises(HTTPException):
+        await async_verify_password("pwd", DUMMY_PASSWORD)
+    # first call still runs in the pool, no free slot and no place in queue
+    with pytest.raises(HTTPException) as e:
+        await async_verify_password("pwd", DUMMY_PASSWORD)
+    assert e.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    await asyncio.sleep(0.3)
+    monkeypatch.setattr(get_settings().security, "password_hash_timeout_secs", 1.0)
+    assert await async_verify_password("pwd", DUMMY_PASSWORD)
+
+
+def test_calibrate_bcrypt_rounds_picks_highest_rounds_fitting_budget() -> None:
+    max_rounds = 6
+    assert (
+        calibrate_bcrypt_rounds(min_rounds=4, max_rounds=max_rounds, budget_secs=60)
+        == max_rounds
+    )
+
+
+def test_calibrate_bcrypt_rounds_stops_on_first_rounds_over_budget(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # 4 rounds take 0.1s, then 5 rounds take 0.3s that is over 0.25s budget
+    perf_counter = iter([0, 0.1, 1, 1.3])
+    monkeypatch.setattr(time, "perf_counter", lambda: next(perf_counter))
+
+    min_rounds = 4
+    assert (
+        calibrate_bcrypt_rounds(min_rounds=min_rounds, max_rounds=10, budget_secs=0.25)
+        == min_rounds
+    )
+
+
+def test_calibrate_bcrypt_rounds_never_goes_below_min_rounds() -> None:
+    min_rounds = 5
+    assert (
+        calibrate_bcrypt_rounds(min_rounds=min_rounds, max_rounds=10, budget_secs=0)
+        == min_rounds
+    )
+
+
+def test_security_rejects_bcrypt_max_rounds_lower_than_rounds() -> None:
+    with pytest.raises(ValidationError, match="password_bcrypt_max_rounds"):
+        Security(password_bcrypt_rounds=12, password_bcrypt_max_rounds=10)
+
+
+async def test_calibrate_password_hash_rounds_changes_current_cost(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    max_rounds = 5
+    security = get_settings().security
+    monkeypatch.setattr(security, "password_bcrypt_rounds", 4)
+    monkeypatch.setattr(security, "password_bcrypt_max_rounds", max_rounds)
+    monkeypatch.setattr(security, "password_bcrypt_calibration_budget_ms", 60_000)
+
+    assert await calibrate_password_hash_rounds() == max_rounds
+
+    assert get_password_hash("my_password").startswith("$2b$05$")
+    assert (await async_get_password_hash("my_password")).startswith("$2b$05$")
+    assert get_dummy_password_hash().startswith("$2b$05$")
+    assert password_hash_needs_update(get_password_hash_with_rounds(4))
+    assert not password_hash_needs_update(get_dummy_password_hash())
+
+
+def test_password_hash_with_higher_cost_is_not_downgraded(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().security, "password_bcrypt_rounds", 5)
+    assert not password_hash_needs_update(get_password_hash_with_rounds(6))
+    assert not password_hash_needs_update(get_password_hash_with_rounds(5))
+    assert password_hash_needs_update(get_password_hash_with_rounds(4))
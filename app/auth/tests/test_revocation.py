@@ -0,0 +1,92 @@
+import time
+import uuid
+
+from freezegun import freeze_time
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import revocation
+from app.auth.jwt import JWTTokenPayload, create_jwt_token
+from app.auth.models import UserRevocation
+from app.core.config import get_settings
+
+
+def token_payload(user_id: str, iat_ms: int) -> JWTTokenPayload:
+    return JWTTokenPayload(
+        iss="my-app", sub=user_id, exp=iat_ms // 1000 + 60, iat=iat_ms / 1000
+    )
+
+
+@freeze_time("2024-01-01")
+def test_token_issued_before_or_in_millisecond_of_revocation_is_revoked() -> None:
+    revoked_at_ms = revocation.now_ms()
+    revocation.add_revocation("user_id", revoked_at_ms)
+
+    assert revocation.is_token_revoked(token_payload("user_id", revoked_at_ms - 1))
+    assert revocation.is_token_revoked(token_payload("user_id", revoked_at_ms))
+    assert not revocation.is_token_revoked(token_payload("user_id", revoked_at_ms + 1))
+    assert not revocation.is_token_revoked(token_payload("other", revoked_at_ms - 1))
+
+
+@freeze_time("2024-01-01 00:00:00.200")
+def test_token_issued_after_revocation_in_the_same_second_is_not_revoked() -> None:
+    revocation.add_revocation("user_id", revocation.now_ms())
+
+    with freeze_time("2024-01-01 00:00:00.201"):
+        token = create_jwt_token("user_id")
+
+    assert int(token.payload.iat) == int(time.time())
+    assert not revocation.is_token_revoked(token.payload)
+
+
+@freeze_time("2024-01-01")
+def test_revocation_keeps_latest_revocation_time() -> None:
+    revoked_at_ms = revocation.now_ms()
+    revocation.add_revocation("user_id", revoked_at_ms)
+    revocation.add_revocation("user_id", revoked_at_ms - 10)
+
+    assert revocation.is_token_revoked(token_payload("user_id", revoked_at_ms - 1))
+
+
+def test_revocation_older_than_access_token_lifetime_is_dropped() -> None:
+    expire_ms = get_settings().security.jwt_access_token_expire_secs * 1000
+    with freeze_time("2024-01-01"):
+        revoked_at_ms = revocation.now_ms()
+        revocation.add_revocation("old_user_id", revoked_at_ms)
+    with freeze_time("2024-01-02"):
+        revocation.add_revocation("user_id", revocation.now_ms())
+
+    assert not revocation.is_token_revoked(
+        token_payload("old_user_id", revoked_at_ms - expire_ms)
+    )
+
+
+@freeze_time("2024-01-01")
+def test_revocation_notify_payload_is_added() -> None:
+    revoked_at_ms = revocation.now_ms()
+    revocation.on_revocation_notify(f"{revoked_at_ms}:user_id")
+
+    assert revocation.is_token_revoked(token_payload("user_id", revoked_at_ms - 1))
+
+
+async def test_revoke_user_tokens_is_stored_and_loaded(session: AsyncSession) -> None:
+    user_id = str(uuid.uuid4())
+    revoked_at_ms = await revocation.revoke_user_tokens(session, user_id)
+    assert await revocation.revoke_user_tokens(session, user_id) >= revoked_at_ms
+
+    stored = await session.scalar(
+        select(UserRevocation).where(UserRevocation.user_id == user_id)
+    )
+    assert stored is not None
+
+    assert await revocation.load_revocations(session) == 1
+    assert revocation.is_token_revoked(token_payload(user_id, revoked_at_ms - 1))
+
+
+async def test_load_revocations_skips_expired_revocations(
+    session: AsyncSession,
+) -> None:
+    with freeze_time("2024-01-01"):
+        await revocation.revoke_user_tokens(session, str(uuid.uuid4()))
+
+    assert await revocation.load_revocations(session) == 0
@@ -0,0 +1,15 @@
+import uuid
+
+from app.auth.models import User
+from app.auth.schemas import UserResponse
+
+
+def test_user_response_from_user_equals_validated_response() -> None:
+    user = User(user_id=str(uuid.uuid4()), email="user@example.com")
+
+    user_response = UserResponse.from_user(user)
+
+    assert user_response == UserResponse.model_validate(user)
+    assert user_response.model_dump_json() == (
+        UserResponse.model_validate(user).model_dump_json()
+    )
@@ -0,0 +1,177 @@
+import time
+import uuid
+from typing import Any
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy import delete, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import user_cache
+from app.auth.models import User
+from app.core import database_session
+from app.core.config import get_settings
+from app.core.database_session import new_async_read_session
+from app.main import app
+from app.tests.metrics import metric
+
+
+@pytest.fixture(autouse=True)
+def enable_user_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings().security, "user_cache_size", 100)
+
+
+async def test_user_cache_returns_detached_copy_of_cached_user(
+    session: AsyncSession, default_user: User
+) -> None:
+    hits_before = metric("org_app_user_cache_total", result="hit")
+
+    user = await user_cache.get_user(session, default_user.user_id)
+    assert user is not None
+    assert user.user_id == default_user.user_id
+
+    cached_user = await user_cache.get_user(session, default_user.user_id)
+    assert cached_user is not None
+    assert cached_user is not user
+    assert inspect(cached_user).detached
+    assert cached_user.email == default_user.email
+    assert cached_user.updated_at == default_user.updated_at
+    assert metric("org_app_user_cache_total", result="hit") == hits_before + 1
+
+
+async def test_user_cache_does_not_cache_missing_user(session: AsyncSession) -> None:
+    misses_before = metric("org_app_user_cache_total", result="miss")
+
+    missing_user_id = str(uuid.uuid4())
+
+    assert await user_cache.get_user(session, missing_user_id) is None
+    assert await user_cache.get_user(session, missing_user_id) is None
+
+    assert metric("org_app_user_cache_total", result="miss") == misses_before + len(
+        ["first", "second"]
+    )
+
+
+async def test_user_cache_is_disabled_with_zero_size(
+    session: AsyncSession, default_user: User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_settings().security, "user_cache_size", 0)
+    await user_cache.get_user(session, default_user.user_id)
+
+    await session.execute(delete(User).where(User.user_id == default_user.user_id))
+
+    assert await user_cache.get_user(session, default_user.user_id) is None
+
+
+async def test_user_cache_invalidated_by_notification(
+    session: AsyncSession, default_user: User
+) -> None:
+    await user_cache.get_user(session, default_user.user_id)
+    await session.execute(delete(User).where(User.user_id == default_user.user_id))
+
+    lag_before = metric("org_app_user_cache_invalidation_lag_seconds_count")
+    user_cache.on_user_cache_notify(f"{time.time()}:{default_user.user_id}")
+
+    assert await user_cache.get_user(session, default_user.user_id) is None
+    assert metric("org_app_user_cache_invalidation_lag_seconds_count") == lag_before + 1
+
+
+async def test_user_cache_skips_user_read_before_invalidation(
+    session: AsyncSession, default_user: User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    scalar = session.scalar
+
+    async def scalar_invalidated_during_read(*args: Any, **kwargs: Any) -> Any:
+        # invalidation handled while the row is read from database
+        user_cache.invalidate_user(default_user.user_id)
+        return await scalar(*args, **kwargs)
+
+    monkeypatch.setattr(session, "scalar", scalar_invalidated_during_read)
+    await user_cache.get_user(session, default_user.user_id)
+    monkeypatch.setattr(session, "scalar", scalar)
+
+    await session.execute(delete(User).where(User.user_id == default_user.user_id))
+    assert await user_cache.get_user(session, default_user.user_id) is None
+
+
+async def test_user_cache_does_not_cache_user_read_from_replica(
+    session: AsyncSession, default_user: User
+) -> None:
+    replica_session = AsyncSession(
+        bind=await session.connection(), info={"replica": "replica0"}
+    )
+    user = await user_cache.get_user(replica_session, default_user.user_id)
+    assert user is not None
+
+    await session.execute(delete(User).where(User.user_id == default_user.user_id))
+
+    assert await user_cache.get_user(session, default_user.user_id) is None
+
+
+async def test_user_cache_returns_cached_user_for_replica_session(
+    session: AsyncSession, default_user: User
+) -> None:
+    await user_cache.get_user(session, default_user.user_id)
+    await session.execute(delete(User).where(User.user_id == default_user.user_id))
+    replica_session = AsyncSession(
+        bind=await session.connection(), info={"replica": "replica0"}
+    )
+
+    cached_user = await user_cache.get_user(replica_session, default_user.user_id)
+    assert cached_user is not None
+
+
+async def test_read_current_user_stays_on_replica_with_cache(
+    client: AsyncClient,
+    default_user_headers: dict[str, str],
+    default_user: User,
+    session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    replica_session = AsyncSession(
+        bind=await session.connection(), info={"replica": "replica0"}
+    )
+    app.dependency_overrides[new_async_read_session] = lambda: replica_session
+    primary_sessions: list[AsyncSession] = []
+    monkeypatch.setattr(
+        database_session, "_ASYNC_SESSIONMAKER", primary_sessions.append
+    )
+
+    for _ in range(2):
+        response = await client.get(
+            app.url_path_for("read_current_user"), headers=default_user_headers
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    assert primary_sessions == []
+    await session.execute(delete(User).where(User.user_id == default_user.user_id))
+    assert await user_cache.get_user(session, default_user.user_id) is None
+
+
+async def test_user_cache_cleared(session: AsyncSession, default_user: User) -> None:
+    await user_cache.get_user(session, default_user.user_id)
+    await session.execute(delete(User).where(User.user_id == default_user.user_id))
+
+    user_cache.clear_user_cache()
+
+    assert await user_cache.get_user(session, default_user.user_id) is None
+
+
+async def test_delete_current_user_invalidates_cached_user(
+    client: AsyncClient,
+    default_user_headers: dict[str, str],
+) -> None:
+    response = await client.get(
+        app.url_path_for("read_current_user"), headers=default_user_headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    await client.delete(
+        app.url_path_for("delete_current_user"), headers=default_user_headers
+    )
+
+    response = await client.get(
+        app.url_path_for("read_current_user"), headers=default_user_headers
+    )
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import maintenance, user_deletion
+from app.auth.models import RefreshToken, User
+from app.core import database_session
+from app.core.config import get_settings
+
+
+async def add_user(
+    session: AsyncSession, email: str, refresh_tokens: int, deleted: bool
+) -> User:
+    # UserFactory creates also random refresh tokens
+    user = User(
+        email=email,
+        hashed_password="hashed_password",
+        deleted_at=datetime.now(UTC) if deleted else None,
+    )
+    session.add(user)
+    await session.flush()
+    for _ in range(refresh_tokens):
+        session.add(
+            RefreshToken(
+                user_id=user.user_id,
+                refresh_token_digest=RefreshToken.digest(str(time.perf_counter_ns())),
+                exp=int(time.time()) + 3600,
+            )
+        )
+    await session.commit()
+    return user
+
+
+@pytest_asyncio.fixture(name="deleted_user", loop_scope="session", scope="function")
+async def fixture_deleted_user(session: AsyncSession) -> User:
+    return await add_user(session, "deleted@example.com", 5, deleted=True)
+
+
+@pytest_asyncio.fixture(name="active_user", loop_scope="session", scope="function")
+async def fixture_active_user(session: AsyncSession) -> User:
+    return await add_user(session, "active@example.com", 2, deleted=False)
+
+
+async def user_ids(session: AsyncSession) -> list[str]:
+    return list(await session.scalars(select(User.user_id)))
+
+
+async def refresh_tokens_count(session: AsyncSession, user: User) -> int:
+    result = await session.execute(
+        select(func.count()).where(RefreshToken.user_id == user.user_id)
+    )
+    return result.scalar_one()
+
+
+async def test_user_deletion_deletes_tokens_in_batches_then_users(
+    session: AsyncSession,
+    deleted_user: User,
+    active_user: User,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().maintenance, "batch_size", 2)
+    monkeypatch.setattr(get_settings().maintenance, "batch_delay_secs", 0)
+    active_tokens = await refresh_tokens_count(session, active_user)
+    deleted_tokens = await refresh_tokens_count(session, deleted_user)
+
+    deleted_rows = await user_deletion.run_user_deletion(session)
+
+    assert deleted_rows == {"auth_refresh_token": deleted_tokens, "auth_user": 1}
+    assert await user_ids(session) == [active_user.user_id]
+    assert await refresh_tokens_count(session, active_user) == active_tokens
+
+
+async def test_user_deletion_is_skipped_when_maintenance_holds_lock(
+    session: AsyncSession, deleted_user: User
+) -> None:
+    async with database_session._ASYNC_ENGINE.connect() as connection:
+        await connection.execute(
+            select(func.pg_advisory_lock(maintenance.MAINTENANCE_LOCK_ID))
+        )
+        try:
+            assert await user_deletion.run_user_deletion(session) is None
+        finally:
+            await connection.execute(
+                select(func.pg_advisory_unlock(maintenance.MAINTENANCE_LOCK_ID))
+            )
+
+
+async def test_user_deletion_runs_periodically(
+    session: AsyncSession, deleted_user: User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_settings().maintenance, "user_deletion_interval_secs", 0)
+    failures: list[str] = []
+    loop_sessions: list[AsyncSession] = []
+    run_finished = asyncio.Event()
+
+    @asynccontextmanager
+    async def new_session() -> AsyncGenerator[AsyncSession]:
+        # first run fails, next one uses test session, the one after starts when
+        # it is finished and logged
+        if not failures:
+            failures.append("failed")
+            raise ConnectionError("database is down")
+        if loop_sessions:
+            run_finished.set()
+            await asyncio.Event().wait()
+        loop_sessions.append(session)
+        yield session
+
+    task = asyncio.create_task(
+        user_deletion.run_user_deletion_periodically(new_session)
+    )
+    try:
+        async with asyncio.timeout(5):
+            await run_finished.wait()
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert failures == ["failed"]
+    assert deleted_user.user_id not in await user_ids(session)
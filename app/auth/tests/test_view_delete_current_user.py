@@ -1,20 +1,31 @@
+import time
+import uuid
+
+import pytest
 from fastapi import status
+from freezegun import freeze_time
 from httpx import AsyncClient
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth.models import User
+from app.auth import api_messages
+from app.auth.jwt import create_jwt_token
+from app.auth.models import RefreshToken, User, UserRevocation
+from app.core.config import get_settings
 from app.main import app
+from app.tests.auth import TESTS_USER_PASSWORD
+from app.tests.queries import assert_max_queries
 
 
 async def test_delete_current_user_status_code(
     client: AsyncClient,
     default_user_headers: dict[str, str],
 ) -> None:
-    response = await client.delete(
-        app.url_path_for("delete_current_user"),
-        headers=default_user_headers,
-    )
+    with assert_max_queries(5):
+        response = await client.delete(
+            app.url_path_for("delete_current_user"),
+            headers=default_user_headers,
+        )
 
     assert response.status_code == status.HTTP_204_NO_CONTENT
 
@@ -34,3 +45,143 @@ async def test_delete_current_user_is_deleted_in_db(
         select(User).where(User.user_id == default_user.user_id)
     )
     assert user is None
+
+
+async def test_delete_current_user_stores_revocation_in_stateless_mode(
+    client: AsyncClient,
+    default_user_headers: dict[str, str],
+    default_user: User,
+    session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().security, "jwt_stateless_auth", True)
+
+    await client.delete(
+        app.url_path_for("delete_current_user"),
+        headers=default_user_headers,
+    )
+
+    user_revocation = await session.scalar(
+        select(UserRevocation).where(UserRevocation.user_id == default_user.user_id)
+    )
+    assert user_revocation is not None
+
+
+async def test_delete_current_user_does_not_store_revocation_by_default(
+    client: AsyncClient,
+    default_user_headers: dict[str, str],
+    default_user: User,
+    session: AsyncSession,
+) -> None:
+    await client.delete(
+        app.url_path_for("delete_current_user"),
+        headers=default_user_headers,
+    )
+
+    user_revocation = await session.scalar(
+        select(UserRevocation).where(UserRevocation.user_id == default_user.user_id)
+    )
+    assert user_revocation is None
+
+
+async def test_delete_current_user_raise_401_when_user_removed(
+    client: AsyncClient,
+) -> None:
+    access_token = create_jwt_token(user_id=str(uuid.uuid4())).access_token
+
+    response = await client.delete(
+        app.url_path_for("delete_current_user"),
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json() == {"detail": api_messages.JWT_ERROR_USER_REMOVED}
+
+
+async def test_delete_current_user_revokes_token_in_stateless_mode(
+    client: AsyncClient,
+    default_user: User,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().security, "jwt_stateless_auth", True)
+    with freeze_time("2024-01-01"):
+        access_token = create_jwt_token(user_id=default_user.user_id).access_token
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    with freeze_time("2024-01-01 00:00:01"):
+        response = await client.delete(
+            app.url_path_for("delete_current_user"), headers=headers
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+        response = await client.delete(
+            app.url_path_for("delete_current_user"), headers=headers
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.json() == {"detail": api_messages.JWT_ERROR_TOKEN_REVOKED}
+
+
+async def test_delete_current_user_only_marks_user_in_async_deletion_mode(
+    client: AsyncClient,
+    default_user_headers: dict[str, str],
+    default_user: User,
+    session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().maintenance, "async_user_deletion", True)
+
+    response = await client.delete(
+        app.url_path_for("delete_current_user"),
+        headers=default_user_headers,
+    )
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    user = await session.scalar(
+        select(User)
+        .where(User.user_id == default_user.user_id)
+        .execution_options(populate_existing=True)
+    )
+    assert user is not None
+    assert user.deleted_at is not None
+
+
+async def test_delete_current_user_in_async_deletion_mode_user_is_removed_for_api(
+    client: AsyncClient,
+    default_user_headers: dict[str, str],
+    default_user: User,
+    session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().maintenance, "async_user_deletion", True)
+    session.add(
+        RefreshToken(
+            user_id=default_user.user_id,
+            refresh_token_digest=RefreshToken.digest("blaxx"),
+            exp=int(time.time()) + 1000,
+        )
+    )
+    await session.commit()
+
+    await client.delete(
+        app.url_path_for("delete_current_user"),
+        headers=default_user_headers,
+    )
+
+    me_response = await client.get(
+        app.url_path_for("read_current_user"), headers=default_user_headers
+    )
+    assert me_response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert me_response.json() == {"detail": api_messages.JWT_ERROR_USER_REMOVED}
+
+    login_response = await client.post(
+        app.url_path_for("login_access_token"),
+        data={"username": default_user.email, "password": TESTS_USER_PASSWORD},
+    )
+    assert login_response.status_code == status.HTTP_400_BAD_REQUEST
+    assert login_response.json() == {"detail": api_messages.PASSWORD_INVALID}
+
+    refresh_response = await client.post(
+        app.url_path_for("refresh_token"), json={"refresh_token": "blaxx"}
+    )
+    assert refresh_response.status_code == status.HTTP_404_NOT_FOUND
+    assert refresh_response.json() == {"detail": api_messages.REFRESH_TOKEN_NOT_FOUND}
@@ -1,5 +1,8 @@
+import asyncio
 import time
 
+import bcrypt
+import pytest
 from fastapi import status
 from freezegun import freeze_time
 from httpx import AsyncClient
@@ -9,23 +12,31 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth import api_messages
 from app.auth.jwt import verify_jwt_token
 from app.auth.models import RefreshToken, User
+from app.auth.password import DUMMY_PASSWORD, async_verify_password, verify_password
 from app.core.config import get_settings
 from app.main import app
 from app.tests.auth import TESTS_USER_PASSWORD
+from app.tests.queries import assert_max_queries
+
+
+def slow_checkpw(*_: object) -> bool:
+    time.sleep(0.2)
+    return True
 
 
 async def test_login_access_token_has_response_status_code(
     client: AsyncClient,
     default_user: User,
 ) -> None:
-    response = await client.post(
-        app.url_path_for("login_access_token"),
-        data={
-            "username": default_user.email,
-            "password": TESTS_USER_PASSWORD,
-        },
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-    )
+    with assert_max_queries(2):
+        response = await client.post(
+            app.url_path_for("login_access_token"),
+            data={
+                "username": default_user.email,
+                "password": TESTS_USER_PASSWORD,
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
     assert response.status_code == status.HTTP_200_OK, response.text
 
 
@@ -132,7 +143,10 @@ async def test_login_access_token_refresh_token_exists_in_db(
     token = response.json()
 
     token_db_count = await session.scalar(
-        select(func.count()).where(RefreshToken.refresh_token == token["refresh_token"])
+        select(func.count()).where(
+            RefreshToken.refresh_token_digest
+            == RefreshToken.digest(token["refresh_token"])
+        )
     )
     assert token_db_count == 1
 
@@ -154,7 +168,10 @@ async def test_login_access_token_refresh_token_in_db_has_valid_fields(
 
     token = response.json()
     result = await session.scalars(
-        select(RefreshToken).where(RefreshToken.refresh_token == token["refresh_token"])
+        select(RefreshToken).where(
+            RefreshToken.refresh_token_digest
+            == RefreshToken.digest(token["refresh_token"])
+        )
     )
     refresh_token = result.one()
 
@@ -194,3 +211,80 @@ async def test_auth_access_token_fail_for_invalid_password_with_message(
 
     assert response.status_code == status.HTTP_400_BAD_REQUEST, response.text
     assert response.json() == {"detail": api_messages.PASSWORD_INVALID}
+
+
+async def test_login_access_token_rehash_password_with_lower_cost(
+    client: AsyncClient,
+    default_user: User,
+    session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    assert default_user.hashed_password.startswith("$2b$04$")
+    monkeypatch.setattr(get_settings().security, "password_bcrypt_rounds", 5)
+
+    response = await client.post(
+        app.url_path_for("login_access_token"),
+        data={
+            "username": default_user.email,
+            "password": TESTS_USER_PASSWORD,
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+
+    hashed_password = await session.scalar(
+        select(User.hashed_password).where(User.user_id == default_user.user_id)
+    )
+    assert hashed_password is not None
+    assert hashed_password.startswith("$2b$05$")
+    assert verify_password(TESTS_USER_PASSWORD, hashed_password)
+
+
+async def test_login_access_token_does_not_rehash_password_with_current_cost(
+    client: AsyncClient,
+    default_user: User,
+    session: AsyncSession,
+) -> None:
+    old_hashed_password = default_user.hashed_password
+
+    response = await client.post(
+        app.url_path_for("login_access_token"),
+        data={
+            "username": default_user.email,
+            "password": TESTS_USER_PASSWORD,
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+
+    hashed_password = await session.scalar(
+        select(User.hashed_password).where(User.user_id == default_user.user_id)
+    )
+    assert hashed_password == old_hashed_password
+
+
+async def test_auth_access_token_fail_fast_with_503_when_hashing_queue_is_full(
+    client: AsyncClient,
+    default_user: User,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(bcrypt, "checkpw", slow_checkpw)
+    monkeypatch.setattr(get_settings().security, "password_hash_pool_size", 1)
+    monkeypatch.setattr(get_settings().security, "password_hash_queue_depth", 0)
+
+    running = asyncio.create_task(async_verify_password("pwd", DUMMY_PASSWORD))
+    await asyncio.sleep(0.05)
+
+    response = await client.post(
+        app.url_path_for("login_access_token"),
+        data={
+            "username": default_user.email,
+            "password": TESTS_USER_PASSWORD,
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE, response.text
+    assert response.json() == {"detail": api_messages.PASSWORD_HASHING_UNAVAILABLE}
+    assert response.headers["Retry-After"] == "1"
+    assert await running
@@ -1,3 +1,6 @@
+from contextlib import nullcontext
+
+import pytest
 from fastapi import status
 from freezegun import freeze_time
 from httpx import AsyncClient
@@ -7,7 +10,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth import api_messages
 from app.auth.jwt import create_jwt_token
 from app.auth.models import User
+from app.core import database_session
+from app.core.database_session import new_async_read_session
 from app.main import app
+from app.tests.queries import assert_max_queries
 
 
 async def test_read_current_user_status_code(
@@ -15,10 +21,11 @@ async def test_read_current_user_status_code(
     default_user_headers: dict[str, str],
     default_user: User,
 ) -> None:
-    response = await client.get(
-        app.url_path_for("read_current_user"),
-        headers=default_user_headers,
-    )
+    with assert_max_queries(1):
+        response = await client.get(
+            app.url_path_for("read_current_user"),
+            headers=default_user_headers,
+        )
 
     assert response.status_code == status.HTTP_200_OK
 
@@ -82,3 +89,30 @@ async def test_api_raise_401_on_jwt_user_deleted(
     )
     assert response.status_code == status.HTTP_401_UNAUTHORIZED, response.text
     assert response.json() == {"detail": api_messages.JWT_ERROR_USER_REMOVED}
+
+
+async def test_read_current_user_falls_back_to_primary_when_missing_on_replica(
+    client: AsyncClient,
+    default_user_headers: dict[str, str],
+    default_user: User,
+    session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # default user is not committed, other connections do not see it like
+    # replica that did not replay it yet
+    replica_session = AsyncSession(
+        database_session._ASYNC_ENGINE, info={"replica": "replica0"}
+    )
+    app.dependency_overrides[new_async_read_session] = lambda: replica_session
+    monkeypatch.setattr(
+        database_session, "_ASYNC_SESSIONMAKER", lambda: nullcontext(session)
+    )
+
+    response = await client.get(
+        app.url_path_for("read_current_user"),
+        headers=default_user_headers,
+    )
+    await replica_session.close()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["user_id"] == default_user.user_id
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from app.auth.jwt import get_jwt_codec
+from app.auth.tests.test_jwt import (
+    generate_private_key_pem,
+    public_key_pem,
+    use_asymmetric_keys,
+)
+from app.core.config import get_settings
+from app.main import app
+from app.tests.queries import assert_max_queries
+
+
+async def test_read_jwks_is_empty_for_hs256(client: AsyncClient) -> None:
+    with assert_max_queries(0):
+        response = await client.get(app.url_path_for("read_jwks"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"keys": []}
+
+
+async def test_read_jwks_cache_headers(client: AsyncClient) -> None:
+    response = await client.get(app.url_path_for("read_jwks"))
+
+    max_age = get_settings().security.jwks_max_age_secs
+    assert response.headers["cache-control"] == f"public, max-age={max_age}"
+    assert response.headers["etag"] == get_jwt_codec().jwks_etag
+
+
+async def test_read_jwks_returns_current_and_verification_keys(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    old_private_key = generate_private_key_pem("ES256")
+    use_asymmetric_keys(
+        monkeypatch,
+        "ES256",
+        generate_private_key_pem("ES256"),
+        verification_keys=[public_key_pem(old_private_key)],
+    )
+
+    response = await client.get(app.url_path_for("read_jwks"))
+
+    assert response.status_code == status.HTTP_200_OK
+    keys = response.json()["keys"]
+    assert [key["kid"] for key in keys] == list(get_jwt_codec().verification_keys)
+    for key in keys:
+        assert key["kty"] == "EC"
+        assert key["crv"] == "P-256"
+        assert key["alg"] == "ES256"
+        assert key["use"] == "sig"
+        assert "d" not in key
+
+
+async def test_read_jwks_not_modified_for_matching_etag(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    use_asymmetric_keys(monkeypatch, "EdDSA", generate_private_key_pem("EdDSA"))
+    response = await client.get(app.url_path_for("read_jwks"))
+
+    response_not_modified = await client.get(
+        app.url_path_for("read_jwks"),
+        headers={"If-None-Match": f"W/{response.headers['etag']}"},
+    )
+
+    assert response_not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response_not_modified.content == b""
+    assert response_not_modified.headers["etag"] == response.headers["etag"]
+
+
+async def test_read_jwks_modified_after_key_rotation(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    use_asymmetric_keys(monkeypatch, "EdDSA", generate_private_key_pem("EdDSA"))
+    response = await client.get(app.url_path_for("read_jwks"))
+
+    use_asymmetric_keys(monkeypatch, "EdDSA", generate_private_key_pem("EdDSA"))
+    response_after_rotation = await client.get(
+        app.url_path_for("read_jwks"),
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+
+    assert response_after_rotation.status_code == status.HTTP_200_OK
+    assert response_after_rotation.headers["etag"] != response.headers["etag"]
+    assert json.loads(response_after_rotation.content)["keys"]
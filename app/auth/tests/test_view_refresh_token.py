@@ -11,6 +11,7 @@ from app.auth.jwt import verify_jwt_token
 from app.auth.models import RefreshToken, User
 from app.core.config import get_settings
 from app.main import app
+from app.tests.queries import assert_max_queries
 
 
 async def test_refresh_token_fails_with_message_when_token_does_not_exist(
@@ -34,7 +35,7 @@ async def test_refresh_token_fails_with_message_when_token_is_expired(
 ) -> None:
     test_refresh_token = RefreshToken(
         user_id=default_user.user_id,
-        refresh_token="blaxx",
+        refresh_token_digest=RefreshToken.digest("blaxx"),
         exp=int(time.time()) - 1,
     )
     session.add(test_refresh_token)
@@ -58,7 +59,7 @@ async def test_refresh_token_fails_with_message_when_token_is_used(
 ) -> None:
     test_refresh_token = RefreshToken(
         user_id=default_user.user_id,
-        refresh_token="blaxx",
+        refresh_token_digest=RefreshToken.digest("blaxx"),
         exp=int(time.time()) + 1000,
         used=True,
     )
@@ -83,7 +84,7 @@ async def test_refresh_token_success_response_status_code(
 ) -> None:
     test_refresh_token = RefreshToken(
         user_id=default_user.user_id,
-        refresh_token="blaxx",
+        refresh_token_digest=RefreshToken.digest("blaxx"),
         exp=int(time.time()) + 1000,
         used=False,
     )
@@ -107,7 +108,7 @@ async def test_refresh_token_success_old_token_is_used(
 ) -> None:
     test_refresh_token = RefreshToken(
         user_id=default_user.user_id,
-        refresh_token="blaxx",
+        refresh_token_digest=RefreshToken.digest("blaxx"),
         exp=int(time.time()) + 1000,
         used=False,
     )
@@ -121,8 +122,11 @@ async def test_refresh_token_success_old_token_is_used(
         },
     )
 
+    # rotation is not ORM flush, so cached instance must be reloaded
     used_test_refresh_token = await session.scalar(
-        select(RefreshToken).where(RefreshToken.refresh_token == "blaxx")
+        select(RefreshToken)
+        .where(RefreshToken.refresh_token_digest == RefreshToken.digest("blaxx"))
+        .execution_options(populate_existing=True)
     )
     assert used_test_refresh_token is not None
     assert used_test_refresh_token.used
@@ -135,19 +139,20 @@ async def test_refresh_token_success_jwt_has_valid_token_type(
 ) -> None:
     test_refresh_token = RefreshToken(
         user_id=default_user.user_id,
-        refresh_token="blaxx",
+        refresh_token_digest=RefreshToken.digest("blaxx"),
         exp=int(time.time()) + 1000,
         used=False,
     )
     session.add(test_refresh_token)
     await session.commit()
 
-    response = await client.post(
-        app.url_path_for("refresh_token"),
-        json={
-            "refresh_token": "blaxx",
-        },
-    )
+    with assert_max_queries(1):
+        response = await client.post(
+            app.url_path_for("refresh_token"),
+            json={
+                "refresh_token": "blaxx",
+            },
+        )
 
     token = response.json()
     assert token["token_type"] == "Bearer"
@@ -161,7 +166,7 @@ async def test_refresh_token_success_jwt_has_valid_expire_time(
 ) -> None:
     test_refresh_token = RefreshToken(
         user_id=default_user.user_id,
-        refresh_token="blaxx",
+        refresh_token_digest=RefreshToken.digest("blaxx"),
         exp=int(time.time()) + 1000,
         used=False,
     )
@@ -191,7 +196,7 @@ async def test_refresh_token_success_jwt_has_valid_access_token(
 ) -> None:
     test_refresh_token = RefreshToken(
         user_id=default_user.user_id,
-        refresh_token="blaxx",
+        refresh_token_digest=RefreshToken.digest("blaxx"),
         exp=int(time.time()) + 1000,
         used=False,
     )
@@ -222,7 +227,7 @@ async def test_refresh_token_success_refresh_token_has_valid_expire_time(
 ) -> None:
     test_refresh_token = RefreshToken(
         user_id=default_user.user_id,
-        refresh_token="blaxx",
+        refresh_token_digest=RefreshToken.digest("blaxx"),
         exp=int(time.time()) + 1000,
         used=False,
     )
@@ -251,7 +256,7 @@ async def test_refresh_token_success_new_refresh_token_is_in_db(
 ) -> None:
     test_refresh_token = RefreshToken(
         user_id=default_user.user_id,
-        refresh_token="blaxx",
+        refresh_token_digest=RefreshToken.digest("blaxx"),
         exp=int(time.time()) + 1000,
         used=False,
     )
@@ -267,6 +272,41 @@ async def test_refresh_token_success_new_refresh_token_is_in_db(
 
     token = response.json()
     token_db_count = await session.scalar(
-        select(func.count()).where(RefreshToken.refresh_token == token["refresh_token"])
+        select(func.count()).where(
+            RefreshToken.refresh_token_digest
+            == RefreshToken.digest(token["refresh_token"])
+        )
     )
     assert token_db_count == 1
+
+
+async def test_refresh_token_fails_with_message_when_token_is_rotated_twice(
+    client: AsyncClient,
+    default_user: User,
+    session: AsyncSession,
+) -> None:
+    test_refresh_token = RefreshToken(
+        user_id=default_user.user_id,
+        refresh_token_digest=RefreshToken.digest("blaxx"),
+        exp=int(time.time()) + 1000,
+        used=False,
+    )
+    session.add(test_refresh_token)
+    await session.commit()
+
+    first_response = await client.post(
+        app.url_path_for("refresh_token"),
+        json={
+            "refresh_token": "blaxx",
+        },
+    )
+    second_response = await client.post(
+        app.url_path_for("refresh_token"),
+        json={
+            "refresh_token": "blaxx",
+        },
+    )
+
+    assert first_response.status_code == status.HTTP_200_OK
+    assert second_response.status_code == status.HTTP_400_BAD_REQUEST
+    assert second_response.json() == {"detail": api_messages.REFRESH_TOKEN_ALREADY_USED}
@@ -7,18 +7,20 @@ from app.auth import api_messages
 from app.auth.models import User
 from app.main import app
 from app.tests.factories import UserFactory
+from app.tests.queries import assert_max_queries
 
 
 async def test_register_new_user_status_code(
     client: AsyncClient,
 ) -> None:
-    response = await client.post(
-        app.url_path_for("register_new_user"),
-        json={
-            "email": "test@email.com",
-            "password": "testtesttest",
-        },
-    )
+    with assert_max_queries(2):
+        response = await client.post(
+            app.url_path_for("register_new_user"),
+            json={
+                "email": "test@email.com",
+                "password": "testtesttest",
+            },
+        )
 
     assert response.status_code == status.HTTP_201_CREATED
 
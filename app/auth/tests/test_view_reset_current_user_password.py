@@ -1,22 +1,29 @@
+import pytest
 from fastapi import status
+from freezegun import freeze_time
 from httpx import AsyncClient
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.auth import api_messages
+from app.auth.jwt import create_jwt_token
 from app.auth.models import User
 from app.auth.password import verify_password
+from app.core.config import get_settings
 from app.main import app
+from app.tests.queries import assert_max_queries
 
 
 async def test_reset_current_user_password_status_code(
     client: AsyncClient,
     default_user_headers: dict[str, str],
 ) -> None:
-    response = await client.post(
-        app.url_path_for("reset_current_user_password"),
-        headers=default_user_headers,
-        json={"password": "test_pwd"},
-    )
+    with assert_max_queries(5):
+        response = await client.post(
+            app.url_path_for("reset_current_user_password"),
+            headers=default_user_headers,
+            json={"password": "test_pwd"},
+        )
 
     assert response.status_code == status.HTTP_204_NO_CONTENT
 
@@ -38,3 +45,37 @@ async def test_reset_current_user_password_is_changed_in_db(
     )
     assert user is not None
     assert verify_password("test_pwd", user.hashed_password)
+
+
+async def test_reset_current_user_password_revokes_older_tokens_in_stateless_mode(
+    client: AsyncClient,
+    default_user: User,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().security, "jwt_stateless_auth", True)
+    with freeze_time("2024-01-01"):
+        old_access_token = create_jwt_token(default_user.user_id).access_token
+
+    with freeze_time("2024-01-01 00:00:01.200"):
+        response = await client.post(
+            app.url_path_for("reset_current_user_password"),
+            headers={"Authorization": f"Bearer {old_access_token}"},
+            json={"password": "test_pwd"},
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+        response = await client.get(
+            app.url_path_for("read_current_user"),
+            headers={"Authorization": f"Bearer {old_access_token}"},
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.json() == {"detail": api_messages.JWT_ERROR_TOKEN_REVOKED}
+
+    # token issued right after reset in the same second is valid
+    with freeze_time("2024-01-01 00:00:01.500"):
+        new_access_token = create_jwt_token(default_user.user_id).access_token
+        response = await client.get(
+            app.url_path_for("read_current_user"),
+            headers={"Authorization": f"Bearer {new_access_token}"},
+        )
+        assert response.status_code == status.HTTP_200_OK
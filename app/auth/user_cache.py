@@ -0,0 +1,148 @@
+# In-process cache of users loaded by app.auth.dependencies.get_current_user,
+# enabled by Security.user_cache_size > 0.
+#
+# Cache stores immutable snapshots of user columns, every hit returns new User
+# instance in detached state (like loaded by already closed session), so
+# callers cannot change cached values and can still session.add() it.
+#
+# Deleting user or resetting password sends NOTIFY on USER_CACHE_CHANNEL in the
+# same transaction and every app process drops the user from its cache (see
+# PgListener in lifespan), entries expire after user_cache_ttl_secs anyway.
+# The user row may be read just before change is committed and put into cache
+# after its notification was handled, so every invalidation bumps generation
+# and users read before that are not cached. Replica may return the row as it
+# was before a change whose notification was already handled, so users read
+# from replica are returned from cache but misses are not filled with them.
+
+
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Self
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.auth.models import User
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import Security, get_settings
+
+USER_CACHE_CHANNEL = "auth_user_cache_invalidation"
+
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    user_id: str
+    email: str
+    hashed_password: str
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> Self:
+        return cls(
+            user_id=user.user_id,
+            email=user.email,
+            hashed_password=user.hashed_password,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+        )
+
+    def to_user(self) -> User:
+        user = User(
+            user_id=self.user_id,
+            email=self.email,
+            hashed_password=self.hashed_password,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+            deleted_at=None,
+        )
+        make_transient_to_detached(user)
+        return user
+
+
+class _UserCache:
+    def __init__(self, security: Security) -> None:
+        self.security = security
+        self.ttl_secs = security.user_cache_ttl_secs
+        self.users: TTLCache[str, UserSnapshot] = TTLCache(
+            maxsize=security.user_cache_size
+        )
+        self.generation = 0
+        self.hits = metrics.USER_CACHE.labels(result="hit")
+        self.misses = metrics.USER_CACHE.labels(result="miss")
+
+    def invalidate(self, user_id: str) -> None:
+        self.users.pop(user_id)
+        self.generation += 1
+
+
+class _UserCacheHolder:
+    def __init__(self) -> None:
+        self.cache: _UserCache | None = None
+
+
+_USER_CACHE = _UserCacheHolder()
+
+
+def _get_user_cache() -> _UserCache:
+    # cache is rebuilt only when settings are cleared (get_settings.cache_clear())
+    security = get_settings().security
+    cache = _USER_CACHE.cache
+    if cache is None or cache.security is not security:
+        cache = _USER_CACHE.cache = _UserCache(security)
+    return cache
+
+
+def active_user(user_id: str) -> Select[tuple[User]]:
+    # users marked for deletion are treated as deleted, see app.auth.user_deletion
+    return select(User).where(User.user_id == user_id, User.deleted_at.is_(None))
+
+
+async def get_user(session: AsyncSession, user_id: str) -> User | None:
+    cache = _get_user_cache()
+    caching = cache.users.maxsize > 0
+    if caching:
+        snapshot = cache.users.get(user_id, now=time.time())
+        if snapshot is not None:
+            cache.hits.inc()
+            return snapshot.to_user()
+        cache.misses.inc()
+
+    generation = cache.generation
+    user = await session.scalar(active_user(user_id))
+    filling = caching and "replica" not in session.info
+    if filling and user is not None and generation == cache.generation:
+        cache.users.set(
+            user_id,
+            UserSnapshot.from_user(user),
+            expires_at=time.time() + cache.ttl_secs,
+        )
+    return user
+
+
+def invalidate_user(user_id: str) -> None:
+    _get_user_cache().invalidate(user_id)
+
+
+def clear_user_cache() -> None:
+    cache = _get_user_cache()
+    cache.users.clear()
+    cache.generation += 1
+
+
+async def notify_user_changed(session: AsyncSession, user_id: str) -> None:
+    # caller commits the session, then calls invalidate_user
+    await session.execute(
+        select(func.pg_notify(USER_CACHE_CHANNEL, f"{time.time()}:{user_id}"))
+    )
+
+
+def on_user_cache_notify(payload: str) -> None:
+    sent_at, user_id = payload.split(":", 1)
+    invalidate_user(user_id)
+    metrics.USER_CACHE_INVALIDATION_LAG_SECONDS.observe(
+        max(time.time() - float(sent_at), 0.0)
+    )
@@ -0,0 +1,84 @@
+# Asynchronous deletion of users, enabled by Maintenance.async_user_deletion.
+#
+# Deleting user row cascades to all its refresh tokens in one statement that
+# holds locks until every token row is gone. In this mode DELETE /auth/me only
+# sets User.deleted_at, revokes access tokens like before and returns. Marked
+# users cannot log in, use access tokens or rotate refresh tokens.
+#
+# Worker running in app every Maintenance.user_deletion_interval_secs deletes
+# refresh tokens of marked users in batches (see app.auth.maintenance.purge_table),
+# then the users themselves, with nothing left to cascade. It shares advisory
+# lock with maintenance, so it waits for the next run when maintenance is running.
+#
+# Email of marked user stays taken until the worker deletes the row.
+
+
+import asyncio
+import logging
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager
+
+from sqlalchemy import Delete, delete, exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import maintenance
+from app.auth.models import RefreshToken, User
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def delete_deleted_users_refresh_tokens(batch_size: int) -> Delete:
+    deleted_users = select(User.user_id).where(User.deleted_at.is_not(None))
+    garbage = (
+        select(RefreshToken.id)
+        .where(RefreshToken.user_id.in_(deleted_users.scalar_subquery()))
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return delete(RefreshToken).where(RefreshToken.id.in_(garbage.scalar_subquery()))
+
+
+def delete_deleted_users(batch_size: int) -> Delete:
+    # users with refresh tokens inserted after the tokens purge wait for next run
+    garbage = (
+        select(User.user_id)
+        .where(
+            User.deleted_at.is_not(None),
+            ~exists().where(RefreshToken.user_id == User.user_id),
+        )
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return delete(User).where(User.user_id.in_(garbage.scalar_subquery()))
+
+
+PURGES: dict[str, Callable[[int], Delete]] = {
+    RefreshToken.__tablename__: delete_deleted_users_refresh_tokens,
+    User.__tablename__: delete_deleted_users,
+}
+
+
+async def run_user_deletion(session: AsyncSession) -> dict[str, int] | None:
+    # returns number of deleted rows or None when maintenance holds the lock
+    async with maintenance.maintenance_lock(session) as lock_connection:
+        if lock_connection is None:
+            return None
+        return {
+            table: await maintenance.purge_table(session, table, delete_batch)
+            for table, delete_batch in PURGES.items()
+        }
+
+
+async def run_user_deletion_periodically(
+    new_session: Callable[[], AbstractAsyncContextManager[AsyncSession]],
+) -> None:
+    while True:
+        await asyncio.sleep(get_settings().maintenance.user_deletion_interval_secs)
+        try:
+            async with new_session() as session:
+                deleted_rows = await run_user_deletion(session)
+            if deleted_rows and deleted_rows[User.__tablename__]:
+                logger.info("user deletion finished, deleted rows: %s", deleted_rows)
+        except Exception:
+            logger.exception("user deletion failed")
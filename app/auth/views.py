@@ -1,19 +1,19 @@
-import secrets
 import time
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import delete, select
+from sqlalchemy import delete, false, func, insert, literal, select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth import api_messages, dependencies
-from app.auth.jwt import create_jwt_token
+from app.auth import api_messages, dependencies, revocation, user_cache
+from app.auth.jwt import create_jwt_token, get_jwt_codec
 from app.auth.models import RefreshToken, User
 from app.auth.password import (
-    DUMMY_PASSWORD,
-    get_password_hash,
-    verify_password,
+    async_get_password_hash,
+    async_verify_password,
+    get_dummy_password_hash,
+    password_hash_needs_update,
 )
 from app.auth.schemas import (
     AccessTokenResponse,
@@ -23,16 +23,41 @@ from app.auth.schemas import (
     UserUpdatePasswordRequest,
 )
 from app.core.config import get_settings
-from app.core.database_session import new_async_session
+from app.core.database_session import new_async_read_session, new_async_session
+from app.core.deadlines import deadline
+from app.core.responses import ModelResponse
 
 router = APIRouter(responses=api_messages.UNAUTHORIZED_RESPONSES)
 
 
-@router.get("/me", response_model=UserResponse, description="Get current user")
+async def commit_user_change(session: AsyncSession, user_id: str) -> None:
+    # revocations and cache invalidations are sent only when the feature is on,
+    # same as app.core.lifespan subscribes to them
+    security = get_settings().security
+    revoked_at_ms = None
+    if security.jwt_stateless_auth:
+        revoked_at_ms = await revocation.revoke_user_tokens(session, user_id)
+    if security.user_cache_size > 0:
+        await user_cache.notify_user_changed(session, user_id)
+    await session.commit()
+
+    if revoked_at_ms is not None:
+        revocation.add_revocation(user_id, revoked_at_ms)
+    if security.user_cache_size > 0:
+        user_cache.invalidate_user(user_id)
+
+
+@router.get(
+    "/me",
+    response_model=UserResponse,
+    response_class=ModelResponse,
+    description="Get current user",
+)
+@deadline(5.0)
 async def read_current_user(
     current_user: User = Depends(dependencies.get_current_user),
-) -> User:
-    return current_user
+) -> ModelResponse:
+    return ModelResponse(UserResponse.from_user(current_user))
 
 
 @router.delete(
@@ -41,137 +66,218 @@ async def read_current_user(
     description="Delete current user",
 )
 async def delete_current_user(
-    current_user: User = Depends(dependencies.get_current_user),
+    principal: dependencies.Principal = Depends(dependencies.get_current_principal),
     session: AsyncSession = Depends(new_async_session),
 ) -> None:
-    await session.execute(delete(User).where(User.user_id == current_user.user_id))
-    await session.commit()
+    if get_settings().maintenance.async_user_deletion:
+        # rows are deleted by background worker, see app.auth.user_deletion
+        await session.execute(
+            update(User)
+            .where(User.user_id == principal.user_id)
+            .values(deleted_at=func.now())
+        )
+    else:
+        await session.execute(delete(User).where(User.user_id == principal.user_id))
+    await commit_user_change(session, principal.user_id)
 
 
 @router.post(
     "/reset-password",
     status_code=status.HTTP_204_NO_CONTENT,
+    responses=api_messages.PASSWORD_HASHING_RESPONSES,
     description="Update current user password",
 )
 async def reset_current_user_password(
     user_update_password: UserUpdatePasswordRequest,
     session: AsyncSession = Depends(new_async_session),
-    current_user: User = Depends(dependencies.get_current_user),
+    principal: dependencies.Principal = Depends(dependencies.get_current_principal),
 ) -> None:
-    current_user.hashed_password = get_password_hash(user_update_password.password)
-    session.add(current_user)
-    await session.commit()
+    hashed_password = await async_get_password_hash(user_update_password.password)
+    await session.execute(
+        update(User)
+        .where(User.user_id == principal.user_id)
+        .values(hashed_password=hashed_password)
+    )
+    # with jwt_stateless_auth access tokens issued before reset are revoked
+    await commit_user_change(session, principal.user_id)
 
 
 @router.post(
     "/access-token",
     response_model=AccessTokenResponse,
-    responses=api_messages.ACCESS_TOKEN_RESPONSES,
+    responses={
+        **api_messages.ACCESS_TOKEN_RESPONSES,
+        **api_messages.PASSWORD_HASHING_RESPONSES,
+    },
     description="OAuth2 compatible token, get an access token for future requests using username and password",
 )
 async def login_access_token(
     session: AsyncSession = Depends(new_async_session),
     form_data: OAuth2PasswordRequestForm = Depends(),
 ) -> AccessTokenResponse:
-    user = await session.scalar(select(User).where(User.email == form_data.username))
+    user = await session.scalar(
+        select(User).where(User.email == form_data.username, User.deleted_at.is_(None))
+    )
 
     if user is None:
         # this is naive method to not return early
-        verify_password(form_data.password, DUMMY_PASSWORD)
+        await async_verify_password(form_data.password, get_dummy_password_hash())
 
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.PASSWORD_INVALID,
         )
 
-    if not verify_password(form_data.password, user.hashed_password):
+    if not await async_verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.PASSWORD_INVALID,
         )
 
+    if password_hash_needs_update(user.hashed_password):
+        # bcrypt cost has changed since password was hashed, rewrite it
+        # now when we know plain password, so no mass rehash job is needed
+        user.hashed_password = await async_get_password_hash(form_data.password)
+        session.add(user)
+
     jwt_token = create_jwt_token(user_id=user.user_id)
 
-    refresh_token = RefreshToken(
-        user_id=user.user_id,
-        refresh_token=secrets.token_urlsafe(32),
-        exp=int(time.time() + get_settings().security.jwt_refresh_token_expire_secs),
+    refresh_token_exp = int(
+        time.time() + get_settings().security.jwt_refresh_token_expire_secs
+    )
+    refresh_token = RefreshToken.generate(refresh_token_exp)
+    session.add(
+        RefreshToken(
+            user_id=user.user_id,
+            refresh_token_digest=RefreshToken.digest(refresh_token),
+            exp=refresh_token_exp,
+        )
     )
-    session.add(refresh_token)
     await session.commit()
 
     return AccessTokenResponse(
         access_token=jwt_token.access_token,
         expires_at=jwt_token.payload.exp,
-        refresh_token=refresh_token.refresh_token,
-        refresh_token_expires_at=refresh_token.exp,
+        refresh_token=refresh_token,
+        refresh_token_expires_at=refresh_token_exp,
     )
 
 
 @router.post(
     "/refresh-token",
     response_model=AccessTokenResponse,
+    response_class=ModelResponse,
     responses=api_messages.REFRESH_TOKEN_RESPONSES,
     description="OAuth2 compatible token, get an access token for future requests using refresh token",
 )
+@deadline(5.0)
 async def refresh_token(
     data: RefreshTokenRequest,
     session: AsyncSession = Depends(new_async_session),
-) -> AccessTokenResponse:
-    token = await session.scalar(
-        select(RefreshToken)
-        .where(RefreshToken.refresh_token == data.refresh_token)
-        .with_for_update(skip_locked=True)
+) -> ModelResponse:
+    now = int(time.time())
+    refresh_token_exp = now + get_settings().security.jwt_refresh_token_expire_secs
+    refresh_token = RefreshToken.generate(refresh_token_exp)
+
+    old_token = [
+        RefreshToken.refresh_token_digest == RefreshToken.digest(data.refresh_token),
+        # tokens of users marked for deletion are not found, see app.auth.user_deletion
+        select(User.user_id)
+        .where(User.user_id == RefreshToken.user_id, User.deleted_at.is_(None))
+        .exists(),
+    ]
+    generated_exp = RefreshToken.generated_exp(data.refresh_token)
+    if generated_exp is not None:
+        # prunes partitions of partitioned table, see app.auth.partitions
+        old_token.append(RefreshToken.exp == generated_exp)
+
+    # Rotation is one statement. Its parts see the same snapshot, so "exp" is
+    # read from token row as it was before the update. When concurrent request
+    # rotates the same token first, update waits for its commit and then skips
+    # the row, so the loser gets "already used" instead of "not found".
+    rotated = (
+        update(RefreshToken)
+        .where(
+            *old_token,
+            ~RefreshToken.used,
+            RefreshToken.exp >= now,
+        )
+        .values(used=True)
+        .returning(RefreshToken.user_id)
+        .cte("rotated")
+    )
+    inserted = (
+        insert(RefreshToken)
+        .from_select(
+            [
+                RefreshToken.user_id,
+                RefreshToken.refresh_token_digest,
+                RefreshToken.exp,
+                RefreshToken.used,
+            ],
+            select(
+                rotated.c.user_id,
+                literal(RefreshToken.digest(refresh_token)),
+                literal(refresh_token_exp),
+                false(),
+            ),
+        )
+        .returning(RefreshToken.user_id)
+        .cte("inserted")
     )
+    user_id, old_exp = (
+        await session.execute(
+            select(
+                select(inserted.c.user_id).scalar_subquery(),
+                select(RefreshToken.exp).where(*old_token).scalar_subquery(),
+            )
+        )
+    ).one()
 
-    if token is None:
+    if old_exp is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=api_messages.REFRESH_TOKEN_NOT_FOUND,
         )
-    elif time.time() > token.exp:
+    elif user_id is None and old_exp < now:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.REFRESH_TOKEN_EXPIRED,
         )
-    elif token.used:
+    elif user_id is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.REFRESH_TOKEN_ALREADY_USED,
         )
-
-    token.used = True
-    session.add(token)
-
-    jwt_token = create_jwt_token(user_id=token.user_id)
-
-    refresh_token = RefreshToken(
-        user_id=token.user_id,
-        refresh_token=secrets.token_urlsafe(32),
-        exp=int(time.time() + get_settings().security.jwt_refresh_token_expire_secs),
-    )
-    session.add(refresh_token)
     await session.commit()
 
-    return AccessTokenResponse(
-        access_token=jwt_token.access_token,
-        expires_at=jwt_token.payload.exp,
-        refresh_token=refresh_token.refresh_token,
-        refresh_token_expires_at=refresh_token.exp,
+    jwt_token = create_jwt_token(user_id=user_id)
+
+    return ModelResponse(
+        AccessTokenResponse(
+            access_token=jwt_token.access_token,
+            expires_at=jwt_token.payload.exp,
+            refresh_token=refresh_token,
+            refresh_token_expires_at=refresh_token_exp,
+        )
     )
 
 
 @router.post(
     "/register",
     response_model=UserResponse,
+    responses=api_messages.PASSWORD_HASHING_RESPONSES,
     description="Create new user",
+    response_class=ModelResponse,
     status_code=status.HTTP_201_CREATED,
 )
 async def register_new_user(
     new_user: UserCreateRequest,
     session: AsyncSession = Depends(new_async_session),
-) -> User:
-    user = await session.scalar(select(User).where(User.email == new_user.email))
+    read_session: AsyncSession = Depends(new_async_read_session),
+) -> ModelResponse:
+    # email taken on primary but not yet on replica fails on unique constraint
+    user = await read_session.scalar(select(User).where(User.email == new_user.email))
     if user is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -180,7 +286,7 @@ async def register_new_user(
 
     user = User(
         email=new_user.email,
-        hashed_password=get_password_hash(new_user.password),
+        hashed_password=await async_get_password_hash(new_user.password),
     )
     session.add(user)
 
@@ -194,4 +300,29 @@ async def register_new_user(
             detail=api_messages.EMAIL_ADDRESS_ALREADY_USED,
         )
 
-    return user
+    return ModelResponse(
+        UserResponse.from_user(user), status_code=status.HTTP_201_CREATED
+    )
+
+
+@router.get(
+    "/.well-known/jwks.json",
+    response_class=Response,
+    responses={
+        200: {"content": {"application/json": {}}},
+        304: {"description": "JWKS not modified since ETag from If-None-Match"},
+    },
+    description="JSON Web Key Set with public keys to verify access tokens, empty for HS256",
+)
+async def read_jwks(request: Request) -> Response:
+    codec = get_jwt_codec()
+    headers = {"Cache-Control": codec.jwks_cache_control, "ETag": codec.jwks_etag}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    etags = {etag.strip().removeprefix("W/") for etag in if_none_match.split(",")}
+    if codec.jwks_etag in etags or "*" in etags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(
+        content=codec.jwks_json, media_type="application/json", headers=headers
+    )
@@ -1,6 +1,7 @@
 import asyncio
 import os
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Callable
+from typing import Any
 
 import alembic.command
 import alembic.config
@@ -19,9 +20,11 @@ from sqlalchemy.ext.asyncio import (
 
 from app.auth.jwt import create_jwt_token
 from app.auth.models import User
+from app.auth.password import shutdown_password_hash_pool
+from app.auth.revocation import clear_revocations
 from app.core import database_session
 from app.core.config import PROJECT_DIR, get_settings
-from app.core.database_session import new_async_session
+from app.core.database_session import new_async_read_session, new_async_session
 from app.main import app as fastapi_app
 from app.tests.factories import UserFactory
 
@@ -81,6 +84,9 @@ async def fixture_clean_get_settings_between_tests() -> AsyncGenerator[None]:
     yield
 
     get_settings.cache_clear()
+    # password hash limiter is created from settings on first use
+    shutdown_password_hash_pool()
+    clear_revocations()
 
 
 @pytest_asyncio.fixture(name="session", loop_scope="session", scope="function")
@@ -102,6 +108,7 @@ async def fixture_session_with_rollback(
     )
 
     fastapi_app.dependency_overrides[new_async_session] = lambda: session
+    fastapi_app.dependency_overrides[new_async_read_session] = lambda: session
 
     # now some work around SQLAlchemyFactory to actually use our session
     # refer to https://polyfactory.litestar.dev/latest/usage/configuration.html
@@ -113,6 +120,7 @@ async def fixture_session_with_rollback(
     setattr(SQLAlchemyFactory, "__async_persistence__", None)
 
     fastapi_app.dependency_overrides.pop(new_async_session, None)
+    fastapi_app.dependency_overrides.pop(new_async_read_session, None)
 
     await session.close()
     await transaction.rollback()
@@ -138,3 +146,18 @@ async def fixture_default_user(session: AsyncSession) -> AsyncGenerator[User]:
 async def fixture_default_user_headers(default_user: User) -> dict[str, str]:
     access_token = create_jwt_token(user_id=default_user.user_id).access_token
     return {"Authorization": f"Bearer {access_token}"}
+
+
+@pytest_asyncio.fixture(name="override", loop_scope="session", scope="function")
+async def fixture_override() -> AsyncGenerator[Callable[[Any, Any], None]]:
+    # app.dependency_overrides[dependency] = replacement, removed after test
+    overridden: list[Any] = []
+
+    def override(dependency: Any, replacement: Any) -> None:
+        overridden.append(dependency)
+        fastapi_app.dependency_overrides[dependency] = replacement
+
+    yield override
+
+    for dependency in overridden:
+        fastapi_app.dependency_overrides.pop(dependency, None)
@@ -0,0 +1,44 @@
+# Small in-process LRU cache where every entry has its own expiration time.
+#
+# Not thread safe, it is meant to be used from the single event loop of a worker.
+# Current time is passed by caller, so it works with whatever clock entries use
+# (eg. unix timestamp for JWT "exp" claim) and with freezegun in tests.
+
+from collections import OrderedDict
+
+
+class TTLCache[K, V]:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[K, tuple[V, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K, now: float) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if now >= expires_at:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, expires_at: float) -> None:
+        if self.maxsize <= 0:
+            return
+
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
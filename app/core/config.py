@@ -12,17 +12,78 @@
 #
 # See https://pydantic-docs.helpmanual.io/usage/settings/
 # Note, complex types like lists are read as json-encoded strings.
+#
+# JWT signing defaults to HS256 with jwt_secret_key. To let other services verify
+# access tokens locally, set jwt_algorithm to one of EdDSA, ES256 or RS256 and
+# jwt_private_key to a PEM encoded private key. Public keys are served as JWKS on
+# /auth/.well-known/jwks.json. To rotate keys, put the previous public key (PEM)
+# into jwt_verification_keys until tokens signed by it expire.
+#
+# With jwt_stateless_auth endpoints that need only user id trust access token
+# claims instead of loading the user from database on every request. Tokens of
+# deleted users and users that reset password are rejected using in-memory
+# revocation set, see app/auth/revocation.py.
+#
+# user_cache_size > 0 enables in-process cache of users loaded by get_current_user,
+# invalidated on all app processes by Postgres NOTIFY, see app/auth/user_cache.py.
+#
+# alembic -x refresh_token_partitioning=true upgrade head partitions
+# auth_refresh_token by expiration time, maintenance.refresh_token_partition_secs
+# sets ranges of partitions it creates, maintenance must then run in app or from
+# cron, see app/auth/partitions.py.
+#
+# database.replica_dsns (JSON list of postgresql:// URLs) enables routing of read
+# only queries to replicas that lag behind primary less than replica_max_lag_secs,
+# see app/core/database_session.py.
+#
+# database.pgbouncer=true is for PgBouncer in transaction pooling mode, where
+# consecutive transactions may run on different server connections. Prepared
+# statements get unique names, asyncpg statement cache is disabled and so is
+# SQLAlchemy prepared statement cache unless prepared_statement_cache_size is set
+# (only with PgBouncer max_prepared_statements > 0), pool_class defaults to
+# "null" (new PgBouncer connection for every checkout). LISTEN/NOTIFY used by
+# jwt_stateless_auth and user_cache_size needs session pooling or direct connection.
+#
+# /probe/health answers from result of database ping done in background every
+# database.health_check_interval_secs, result older than health_check_max_age_secs
+# is reported as failure, see app/probe/health.py.
+#
+# Statements running longer than database.slow_query_secs are logged with route of
+# the request, see app/core/query_stats.py.
+#
+# Requests are cancelled with 504 after database.request_deadline_secs or deadline of
+# route set by @deadline decorator, queries of the request get statement_timeout
+# and lock_timeout (lock_timeout_secs at most), see app/core/deadlines.py.
+#
+# HTTP requests are measured by route template (latency, count by status, size
+# of bodies, in-flight), histogram buckets are set by
+# prometheus.http_request_duration_buckets and http_body_size_buckets (JSON
+# lists), see app/core/http_metrics.py.
+#
+# maintenance.async_user_deletion makes DELETE /auth/me only mark the user deleted,
+# background worker removes its rows later, see app/auth/user_deletion.py.
 
 
 import logging.config
 from functools import lru_cache
 from pathlib import Path
-
-from pydantic import AnyHttpUrl, BaseModel, Field, SecretStr, computed_field
+from typing import Literal, Self
+
+from pydantic import (
+    AnyHttpUrl,
+    BaseModel,
+    Field,
+    SecretStr,
+    computed_field,
+    model_validator,
+)
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from sqlalchemy.engine.url import URL
 
 PROJECT_DIR = Path(__file__).parent.parent.parent
+JWT_ALGORITHMS = ("HS256", "EdDSA", "ES256", "RS256")
+# prometheus_client defaults without +Inf
+HTTP_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
 
 
 class Security(BaseModel):
@@ -33,11 +94,43 @@ class Security(BaseModel):
     jwt_access_token_expire_secs: int = Field(default=15 * 60, gt=10)  # 15min
     jwt_refresh_token_expire_secs: int = Field(default=28 * 24 * 3600, gt=60)  # 28d
     jwt_algorithm: str = "HS256"
-
-    password_bcrypt_rounds: int = 12
+    jwt_private_key: SecretStr | None = None
+    jwt_verification_keys: list[str] = []
+    jwt_verify_cache_size: int = Field(default=10_000, ge=0)
+    jwks_max_age_secs: int = Field(default=5 * 60, ge=0)  # 5min
+    jwt_stateless_auth: bool = False
+    user_cache_size: int = Field(default=0, ge=0)
+    user_cache_ttl_secs: int = Field(default=60, gt=0)
+
+    password_bcrypt_rounds: int = Field(default=12, ge=4, le=31)
+    password_bcrypt_calibrate: bool = False
+    password_bcrypt_max_rounds: int = Field(default=16, ge=4, le=31)
+    password_bcrypt_calibration_budget_ms: int = Field(default=250, gt=0)
+    password_hash_pool_size: int = Field(default=2, ge=1)
+    password_hash_queue_depth: int = Field(default=32, ge=0)
+    password_hash_timeout_secs: float = Field(default=10.0, gt=0)
+    password_hash_retry_after_secs: int = Field(default=1, ge=0)
     allowed_hosts: list[str] = ["localhost", "127.0.0.1", "0.0.0.0"]
     backend_cors_origins: list[AnyHttpUrl] = []
 
+    @model_validator(mode="after")
+    def check_password_bcrypt_max_rounds(self) -> Self:
+        # calibration searches from password_bcrypt_rounds up to max rounds
+        if self.password_bcrypt_max_rounds < self.password_bcrypt_rounds:
+            raise ValueError(
+                "password_bcrypt_max_rounds must not be lower than "
+                "password_bcrypt_rounds"
+            )
+        return self
+
+    @model_validator(mode="after")
+    def check_jwt_keys(self) -> Self:
+        if self.jwt_algorithm not in JWT_ALGORITHMS:
+            raise ValueError(f"jwt_algorithm must be one of {JWT_ALGORITHMS}")
+        if self.jwt_algorithm != "HS256" and self.jwt_private_key is None:
+            raise ValueError(f"jwt_private_key is required for {self.jwt_algorithm}")
+        return self
+
 
 class Database(BaseModel):
     hostname: str = "postgres"
@@ -45,6 +138,25 @@ class Database(BaseModel):
     password: SecretStr = SecretStr("passwd-change-me")
     port: int = 5432
     db: str = "postgres"
+    pool_size: int = Field(default=5, ge=1)
+    pool_max_overflow: int = Field(default=10, ge=0)
+    pool_timeout_secs: float = Field(default=30.0, gt=0)
+    pool_recycle_secs: int = Field(default=600, gt=0)
+    pgbouncer: bool = False
+    # None means "null" with pgbouncer, "queue" otherwise
+    pool_class: Literal["queue", "null"] | None = None
+    # None means 0 with pgbouncer, 100 (SQLAlchemy default) otherwise
+    prepared_statement_cache_size: int | None = Field(default=None, ge=0)
+    replica_dsns: list[SecretStr] = []
+    replica_max_lag_secs: float = Field(default=5.0, ge=0)
+    replica_check_interval_secs: float = Field(default=1.0, gt=0)
+    replica_check_timeout_secs: float = Field(default=1.0, gt=0)
+    health_check_interval_secs: float = Field(default=5.0, gt=0)
+    health_check_timeout_secs: float = Field(default=2.0, gt=0)
+    health_check_max_age_secs: float = Field(default=15.0, gt=0)
+    slow_query_secs: float = Field(default=0.5, gt=0)
+    request_deadline_secs: float = Field(default=15.0, gt=0)
+    lock_timeout_secs: float = Field(default=2.0, gt=0)
 
 
 class Prometheus(BaseModel):
@@ -52,12 +164,37 @@ class Prometheus(BaseModel):
     port: int = 9090
     addr: str = "0.0.0.0"
     stop_delay_secs: int = 0
+    # +Inf bucket is always added to both
+    http_request_duration_buckets: list[float] = list(HTTP_DURATION_BUCKETS)
+    http_body_size_buckets: list[float] = [1e2, 1e3, 1e4, 1e5, 1e6, 1e7]
+
+    @model_validator(mode="after")
+    def check_buckets(self) -> Self:
+        for buckets in (
+            self.http_request_duration_buckets,
+            self.http_body_size_buckets,
+        ):
+            if not buckets or buckets != sorted(set(buckets)):
+                raise ValueError("histogram buckets must be non-empty and increasing")
+        return self
+
+
+class Maintenance(BaseModel):
+    enabled: bool = False
+    interval_secs: int = Field(default=3600, gt=0)
+    batch_size: int = Field(default=1000, gt=0)
+    batch_delay_secs: float = Field(default=0.1, ge=0)
+    refresh_token_partition_secs: int = Field(default=7 * 24 * 3600, ge=3600)  # 7d
+    refresh_token_partitions_ahead: int = Field(default=2, ge=1)
+    async_user_deletion: bool = False
+    user_deletion_interval_secs: int = Field(default=10, gt=0)
 
 
 class Settings(BaseSettings):
     security: Security = Field(default_factory=Security)
     database: Database = Field(default_factory=Database)
     prometheus: Prometheus = Field(default_factory=Prometheus)
+    maintenance: Maintenance = Field(default_factory=Maintenance)
 
     log_level: str = "INFO"
 
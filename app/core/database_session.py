@@ -2,33 +2,95 @@
 #
 # https://docs.sqlalchemy.org/en/20/orm/extensions/asyncio.html
 #
-# for pool size configuration:
+# for pool size configuration (see Database.pool_* settings):
 # https://docs.sqlalchemy.org/en/20/core/pooling.html#sqlalchemy.pool.Pool
+#
+# Pool usage, checkout wait and connect time are exported as Prometheus metrics
+# labeled by engine name, see app.core.metrics.instrument_engine
+#
+# Behind PgBouncer in transaction pooling mode (Database.pgbouncer) prepared
+# statements get unique names and statement caches are disabled, see engine_options.
+# Hit rate of prepared statement cache is exported too, compare it with connect
+# time of both setups when choosing between app pool and PgBouncer.
+#
+# Read only endpoints can use new_async_read_session, it balances sessions
+# round robin across Database.replica_dsns. Lag of every replica is checked
+# in background (see monitor_read_replicas in lifespan), replicas lagging more
+# than replica_max_lag_secs, failing or not checked yet are skipped, when none
+# is left session is opened on primary. Data written just before may be missing
+# on replica even with small lag, callers that must see it use primary.
+#
+# Connections checked out while handling request get statement_timeout and
+# lock_timeout of request deadline, see app.core.deadlines.
 
 
+import asyncio
+import itertools
+import logging
+import math
+import uuid
+import weakref
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from typing import Any
 
-from sqlalchemy.engine.url import URL
+from sqlalchemy import text
+from sqlalchemy.engine.url import URL, make_url
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.pool import NullPool
 
+from app.core import deadlines, metrics, query_stats
 from app.core.config import get_settings
 
+logger = logging.getLogger(__name__)
+
+# SQLAlchemy asyncpg dialect default
+PREPARED_STATEMENT_CACHE_SIZE = 100
+
+
+def unique_statement_name() -> str:
+    # asyncpg default names are unique per client connection only, PgBouncer
+    # may run statements of many clients on one server connection
+    return f"__asyncpg_{uuid.uuid4().hex}__"
+
+
+def engine_options() -> dict[str, Any]:
+    database = get_settings().database
+    cache_size = database.prepared_statement_cache_size
+    if cache_size is None:
+        cache_size = 0 if database.pgbouncer else PREPARED_STATEMENT_CACHE_SIZE
+    connect_args: dict[str, Any] = {"prepared_statement_cache_size": cache_size}
+    if database.pgbouncer:
+        # asyncpg own cache is used by executemany and type introspection
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = unique_statement_name
+
+    pool_class = database.pool_class or ("null" if database.pgbouncer else "queue")
+    if pool_class == "null":
+        return {"connect_args": connect_args, "poolclass": NullPool}
+    return {
+        "connect_args": connect_args,
+        "poolclass": metrics.InstrumentedAsyncAdaptedQueuePool,
+        "pool_pre_ping": True,
+        "pool_size": database.pool_size,
+        "max_overflow": database.pool_max_overflow,
+        "pool_timeout": database.pool_timeout_secs,
+        "pool_recycle": database.pool_recycle_secs,
+    }
 
-def new_async_engine(uri: URL) -> AsyncEngine:
-    return create_async_engine(
-        uri,
-        pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10,
-        pool_timeout=30.0,
-        pool_recycle=600,
-    )
+
+def new_async_engine(uri: URL, name: str = "primary") -> AsyncEngine:
+    # name is "engine" label of pool metrics, see app.core.metrics
+    engine = create_async_engine(uri, pool_logging_name=name, **engine_options())
+    metrics.instrument_engine(engine, name)
+    query_stats.instrument_queries(engine)
+    deadlines.instrument_deadlines(engine)
+    return engine
 
 
 _ASYNC_ENGINE = new_async_engine(get_settings().sqlalchemy_database_uri)
@@ -43,22 +105,136 @@ async def new_async_session() -> AsyncGenerator[AsyncSession]:  # pragma: no cov
         await session.close()
 
 
-@asynccontextmanager
-async def new_script_async_session() -> AsyncGenerator[
-    AsyncSession
-]:  # pragma: no cover
-    # you can use this version inside scripts that run eg. as cronjobs outside of FastAPI context
-    # that you will run with asyncio.run()
-    # Global enginer and sessionmaker are created by global loop and cannot be shared across loops,
-    # so we need to create new ones here
-    _engine = create_async_engine(
-        get_settings().sqlalchemy_database_uri, pool_pre_ping=True
-    )
-    _async_sessionmaker = async_sessionmaker(_engine, expire_on_commit=False)
+class ReadReplica:
+    def __init__(self, name: str, uri: URL) -> None:
+        self.name = name
+        self.engine = new_async_engine(uri, name=name)
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        # None until first lag check or after failed one
+        self.lag_secs: float | None = None
+
+
+def replica_uri(dsn: str) -> URL:
+    return make_url(dsn).set(drivername="postgresql+asyncpg")
+
+
+_READ_REPLICAS = [
+    ReadReplica(f"replica{i}", replica_uri(dsn.get_secret_value()))
+    for i, dsn in enumerate(get_settings().database.replica_dsns)
+]
+_READ_REPLICA_COUNTER = itertools.count()
+
+REPLICA_LAG_SQL = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(
+            extract(epoch FROM now() - pg_last_xact_replay_timestamp()),
+            'Infinity'
+        )
+    END::float8
+    """
+)
+
+
+def choose_read_replica() -> ReadReplica | None:
+    max_lag_secs = get_settings().database.replica_max_lag_secs
+    replicas = [
+        replica
+        for replica in _READ_REPLICAS
+        if replica.lag_secs is not None and replica.lag_secs <= max_lag_secs
+    ]
+    if not replicas:
+        return None
+    return replicas[next(_READ_REPLICA_COUNTER) % len(replicas)]
 
-    session = _async_sessionmaker()
+
+def new_read_session() -> AsyncSession:
+    # session.info["replica"] is set when session is not on primary
+    replica = choose_read_replica()
+    if replica is None:
+        metrics.DB_READ_SESSIONS.labels(engine="primary").inc()
+        return _ASYNC_SESSIONMAKER()
+
+    metrics.DB_READ_SESSIONS.labels(engine=replica.name).inc()
+    return replica.sessionmaker(info={"replica": replica.name})
+
+
+async def new_async_read_session() -> AsyncGenerator[AsyncSession]:  # pragma: no cover
+    session = new_read_session()
     try:
         yield session
     finally:
         await session.close()
-        await _engine.dispose()
+
+
+async def check_read_replica(replica: ReadReplica) -> None:
+    try:
+        async with asyncio.timeout(get_settings().database.replica_check_timeout_secs):
+            async with replica.engine.connect() as connection:
+                lag_secs = await connection.scalar(REPLICA_LAG_SQL)
+    except Exception:
+        logger.warning("lag check of %s failed", replica.name, exc_info=True)
+        replica.lag_secs = None
+    else:
+        replica.lag_secs = float(lag_secs)
+
+    metrics.DB_REPLICA_LAG_SECONDS.labels(engine=replica.name).set(
+        math.inf if replica.lag_secs is None else replica.lag_secs
+    )
+
+
+async def monitor_read_replicas() -> None:
+    while True:
+        await asyncio.gather(*(check_read_replica(r) for r in _READ_REPLICAS))
+        await asyncio.sleep(get_settings().database.replica_check_interval_secs)
+
+
+class _ScriptEngines:
+    # engines and their pooled connections are bound to event loop they were
+    # created in, so scripts get one engine per running loop, created on first
+    # session and disposed when the loop shuts down
+    def __init__(self) -> None:
+        self.sessionmakers: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, async_sessionmaker[AsyncSession]
+        ] = weakref.WeakKeyDictionary()
+        self.keepers: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, AsyncGenerator[None]
+        ] = weakref.WeakKeyDictionary()
+
+    async def sessionmaker(self) -> async_sessionmaker[AsyncSession]:
+        loop = asyncio.get_running_loop()
+        sessionmaker = self.sessionmakers.get(loop)
+        if sessionmaker is None:
+            engine = new_async_engine(get_settings().sqlalchemy_database_uri, "script")
+            keeper = self.dispose_at_shutdown(engine)
+            await anext(keeper)
+            self.keepers[loop] = keeper
+            sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+            self.sessionmakers[loop] = sessionmaker
+        return sessionmaker
+
+    async def dispose_at_shutdown(self, engine: AsyncEngine) -> AsyncGenerator[None]:
+        # loop.shutdown_asyncgens(), called by asyncio.run() before it closes
+        # the loop, closes this generator while the loop still runs
+        try:
+            yield
+        finally:
+            loop = asyncio.get_running_loop()
+            self.sessionmakers.pop(loop, None)
+            self.keepers.pop(loop, None)
+            await engine.dispose()
+
+
+_SCRIPT_ENGINES = _ScriptEngines()
+
+
+@asynccontextmanager
+async def new_script_async_session() -> AsyncGenerator[AsyncSession]:
+    # you can use this version inside scripts that run eg. as cronjobs outside of
+    # FastAPI context that you will run with asyncio.run(), sessions opened in
+    # the same loop share connection pool
+    sessionmaker = await _SCRIPT_ENGINES.sessionmaker()
+    async with sessionmaker() as session:
+        yield session
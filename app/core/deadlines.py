@@ -0,0 +1,175 @@
+# Request deadlines, enforced by DeadlineMiddleware.
+#
+# Requests handled by a route must finish within Database.request_deadline_secs,
+# routes override it with @deadline(secs) placed under the router decorator.
+# Request runs in asyncio.timeout, apply_route_deadline app dependency moves it
+# to deadline of matched route. When deadline passes, request is cancelled
+# wherever it waits, also for pool connection (so it is capped below
+# Database.pool_timeout_secs) and for running query, asyncpg then sends cancel
+# request to Postgres. Client gets 504.
+#
+# Connections checked out by request get statement_timeout of route deadline and
+# lock_timeout of Database.lock_timeout_secs (or deadline when shorter), so
+# Postgres stops queries on its own too, and waiting for row locks gives up
+# early, also with 504. Timeouts are SET only when they differ from these of
+# previous checkout of the connection, and RESET for checkouts outside requests.
+# With Database.pgbouncer they are not set, use PgBouncer query_timeout.
+#
+# Requests ended by deadline are counted by route and operation: query (client
+# cancelled running statement), statement_timeout or lock_timeout (Postgres
+# stopped it) and request (deadline passed anywhere else).
+
+
+import asyncio
+import logging
+from collections.abc import Callable
+from contextvars import ContextVar
+from typing import Any
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.util import await_only
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.query_stats import route_path
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_EXCEEDED = "Request deadline exceeded"
+
+# endpoint attribute set by @deadline
+_DEADLINE_SECS = "deadline_secs"
+# connection record info key of (statement_timeout, lock_timeout) set on connection
+_TIMEOUTS = "deadlines_timeouts"
+# operation label of Postgres errors raised by statement_timeout and lock_timeout
+_TIMEOUT_SQLSTATES = {"57014": "statement_timeout", "55P03": "lock_timeout"}
+
+
+class RequestDeadline:
+    def __init__(self) -> None:
+        self.start = asyncio.get_running_loop().time()
+        self.secs = get_settings().database.request_deadline_secs
+        self.timeout = asyncio.Timeout(self.start + self.secs)
+        self.query_running = False
+
+    def set_secs(self, secs: float) -> None:
+        self.secs = secs
+        self.timeout.reschedule(self.start + secs)
+
+    def timeouts_ms(self) -> tuple[int, int]:
+        lock_timeout_secs = min(self.secs, get_settings().database.lock_timeout_secs)
+        return round(self.secs * 1000), round(lock_timeout_secs * 1000)
+
+
+_REQUEST_DEADLINE: ContextVar[RequestDeadline | None] = ContextVar(
+    "request_deadline", default=None
+)
+
+
+def deadline[F: Callable[..., Any]](secs: float) -> Callable[[F], F]:
+    def decorator(endpoint: F) -> F:
+        setattr(endpoint, _DEADLINE_SECS, secs)
+        return endpoint
+
+    return decorator
+
+
+async def apply_route_deadline(request: Request) -> None:
+    # app dependency, runs right after routing, before dependencies of route
+    request_deadline = _REQUEST_DEADLINE.get()
+    secs = getattr(request.scope["route"].endpoint, _DEADLINE_SECS, None)
+    if request_deadline is not None and secs is not None:
+        request_deadline.set_secs(secs)
+
+
+def instrument_deadlines(engine: AsyncEngine) -> None:
+    @event.listens_for(engine.sync_engine, "checkout")
+    def set_timeouts(dbapi_connection: Any, connection_record: Any, *_: Any) -> None:
+        if get_settings().database.pgbouncer:
+            return
+        request_deadline = _REQUEST_DEADLINE.get()
+        timeouts = None if request_deadline is None else request_deadline.timeouts_ms()
+        if connection_record.info.get(_TIMEOUTS) == timeouts:
+            return
+
+        if timeouts is None:
+            sql = "RESET statement_timeout; RESET lock_timeout"
+        else:
+            statement_timeout_ms, lock_timeout_ms = timeouts
+            sql = (
+                f"SET statement_timeout = {statement_timeout_ms}; "
+                f"SET lock_timeout = {lock_timeout_ms}"
+            )
+        # directly on asyncpg connection, SQLAlchemy adapter would run it in
+        # transaction and rollback at checkin would revert it
+        await_only(dbapi_connection.driver_connection.execute(sql))
+        connection_record.info[_TIMEOUTS] = timeouts
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def start_query(*_: Any) -> None:
+        request_deadline = _REQUEST_DEADLINE.get()
+        if request_deadline is not None:
+            request_deadline.query_running = True
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def finish_query(*_: Any) -> None:
+        request_deadline = _REQUEST_DEADLINE.get()
+        if request_deadline is not None:
+            request_deadline.query_running = False
+
+
+class DeadlineMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":  # pragma: no cover
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_response(message: Message) -> None:
+            nonlocal response_started
+            response_started = True
+            await send(message)
+
+        request_deadline = RequestDeadline()
+        token = _REQUEST_DEADLINE.set(request_deadline)
+        try:
+            async with request_deadline.timeout:
+                await self.app(scope, receive, send_response)
+            return
+        except TimeoutError:
+            if not request_deadline.timeout.expired() or response_started:
+                raise
+            operation = "query" if request_deadline.query_running else "request"
+        except DBAPIError as error:
+            timeout_operation = _TIMEOUT_SQLSTATES.get(
+                getattr(error.orig, "sqlstate", "")
+            )
+            if timeout_operation is None or response_started:
+                raise
+            operation = timeout_operation
+        finally:
+            _REQUEST_DEADLINE.reset(token)
+
+        route = route_path(scope)
+        metrics.HTTP_REQUEST_DEADLINE_EXCEEDED.labels(
+            route=route, operation=operation
+        ).inc()
+        logger.warning(
+            "request on route %s exceeded deadline of %.3fs in %s",
+            route,
+            request_deadline.secs,
+            operation,
+        )
+        response = JSONResponse(
+            {"detail": DEADLINE_EXCEEDED}, status_code=status.HTTP_504_GATEWAY_TIMEOUT
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,99 @@
+# HTTP request metrics, recorded by HttpMetricsMiddleware.
+#
+# Every request is counted by route, method and status code, its duration (until
+# the last chunk of response body is sent) and sizes of request and response
+# bodies are recorded in histograms with buckets from Prometheus settings.
+#
+# Routes are labeled by path template of matched route (e.g. /pets/{pet_id}),
+# never by raw path, requests not matching any route get NO_ROUTE. Methods
+# outside of HTTP_METHODS get "other", so label values stay bounded by
+# routes in the code.
+#
+# Request body size is what the app read from it. Requests failing with
+# exception before response started are counted with status 500, which
+# ServerErrorMiddleware responds with.
+
+
+import time
+from functools import lru_cache
+
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.query_stats import route_path
+
+HTTP_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE", "CONNECT")
+)
+# method label of requests with method not in HTTP_METHODS
+OTHER_METHOD = "other"
+
+
+# labels() costs few microseconds, children of bounded label values are cached
+@lru_cache(maxsize=1024)
+def _in_progress(method: str) -> Gauge:
+    return metrics.HTTP_REQUESTS_IN_PROGRESS.labels(method=method)
+
+
+@lru_cache(maxsize=1024)
+def _requests(route: str, method: str, status: int) -> Counter:
+    return metrics.HTTP_REQUESTS.labels(route=route, method=method, status=str(status))
+
+
+@lru_cache(maxsize=1024)
+def _histograms(route: str, method: str) -> tuple[Histogram, Histogram, Histogram]:
+    return (
+        metrics.HTTP_REQUEST_DURATION_SECONDS.labels(route=route, method=method),
+        metrics.HTTP_REQUEST_SIZE_BYTES.labels(route=route),
+        metrics.HTTP_RESPONSE_SIZE_BYTES.labels(route=route),
+    )
+
+
+class HttpMetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":  # pragma: no cover
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in HTTP_METHODS else OTHER_METHOD
+        status = 500
+        request_size = 0
+        response_size = 0
+
+        async def receive_request() -> Message:
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def send_response(message: Message) -> None:
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = _in_progress(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_request, send_response)
+        finally:
+            duration = time.perf_counter() - start
+            in_progress.dec()
+
+            # router sets matched route in scope
+            route = route_path(scope)
+            _requests(route, method, status).inc()
+            duration_seconds, request_size_bytes, response_size_bytes = _histograms(
+                route, method
+            )
+            duration_seconds.observe(duration)
+            request_size_bytes.observe(request_size)
+            response_size_bytes.observe(response_size)
@@ -1,17 +1,77 @@
 import asyncio
 import logging
+import time
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
 import prometheus_client
 from fastapi import FastAPI
 
+from app.auth import (
+    maintenance,
+    partitions,
+    password,
+    revocation,
+    user_cache,
+    user_deletion,
+)
 from app.core import database_session, metrics
 from app.core.config import get_settings
+from app.core.pg_listener import PgListener, asyncpg_dsn
+from app.probe import health
 
 logger = logging.getLogger(__name__)
 
 
+def start_background_tasks() -> list[asyncio.Task[None]]:  # pragma: no cover
+    background_tasks: list[asyncio.Task[None]] = []
+
+    if get_settings().maintenance.enabled:
+        background_tasks.append(
+            asyncio.create_task(
+                maintenance.run_maintenance_periodically(
+                    database_session._ASYNC_SESSIONMAKER
+                )
+            )
+        )
+        logger.info(
+            "started database maintenance every %d seconds",
+            get_settings().maintenance.interval_secs,
+        )
+
+    if get_settings().maintenance.async_user_deletion:
+        background_tasks.append(
+            asyncio.create_task(
+                user_deletion.run_user_deletion_periodically(
+                    database_session._ASYNC_SESSIONMAKER
+                )
+            )
+        )
+        logger.info(
+            "started user deletion every %d seconds",
+            get_settings().maintenance.user_deletion_interval_secs,
+        )
+
+    background_tasks.append(
+        asyncio.create_task(health._DATABASE_HEALTH_CHECKER.run_periodically())
+    )
+    logger.info(
+        "started database health checks every %s seconds",
+        get_settings().database.health_check_interval_secs,
+    )
+
+    if database_session._READ_REPLICAS:
+        background_tasks.append(
+            asyncio.create_task(database_session.monitor_read_replicas())
+        )
+        logger.info(
+            "started lag checks of %d read replicas",
+            len(database_session._READ_REPLICAS),
+        )
+
+    return background_tasks
+
+
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncGenerator[None]:  # pragma: no cover
     logger.info("starting application...")
@@ -28,11 +88,73 @@ async def lifespan(_: FastAPI) -> AsyncGenerator[None]:  # pragma: no cover
         )
         metrics.APP_STARTED.inc()
 
+    if get_settings().security.password_bcrypt_calibrate:
+        logger.info(
+            "calibrating bcrypt rounds to fit %d ms budget...",
+            get_settings().security.password_bcrypt_calibration_budget_ms,
+        )
+        rounds = await password.calibrate_password_hash_rounds()
+        logger.info("calibrated bcrypt rounds to %d", rounds)
+
+    password.start_password_hash_pool()
+    logger.info(
+        "started password hash process pool with %d workers",
+        get_settings().security.password_hash_pool_size,
+    )
+
+    pg_listener = PgListener(asyncpg_dsn(get_settings().sqlalchemy_database_uri))
+    if get_settings().security.jwt_stateless_auth:
+
+        async def load_revocations() -> None:
+            async with database_session._ASYNC_SESSIONMAKER() as session:
+                loaded = await revocation.load_revocations(session)
+            logger.info("loaded %d user revocations", loaded)
+
+        pg_listener.subscribe(
+            revocation.REVOCATION_CHANNEL,
+            revocation.on_revocation_notify,
+            on_connect=load_revocations,
+        )
+    if get_settings().security.user_cache_size > 0:
+
+        async def clear_user_cache() -> None:
+            # invalidations sent while disconnected are lost
+            user_cache.clear_user_cache()
+
+        pg_listener.subscribe(
+            user_cache.USER_CACHE_CHANNEL,
+            user_cache.on_user_cache_notify,
+            on_connect=clear_user_cache,
+        )
+    if pg_listener.subscriptions:
+        await pg_listener.start()
+        logger.info("started LISTEN connection for database notifications")
+
+    async with database_session._ASYNC_SESSIONMAKER() as session:
+        # inserts of refresh tokens fail without partitions for them
+        await partitions.check_partitions(session, int(time.time()))
+
+    background_tasks = start_background_tasks()
+
     yield
 
     logger.info("shutting down application...")
 
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    logger.info("stopped background tasks...")
+
+    await pg_listener.stop()
+    health._DATABASE_HEALTH_CHECKER.close()
+
+    # waits for running bcrypt calls, not on the event loop
+    await asyncio.to_thread(password.shutdown_password_hash_pool)
+    logger.info("stopped password hash process pool...")
+
     await database_session._ASYNC_ENGINE.dispose()
+    for replica in database_session._READ_REPLICAS:
+        await replica.engine.dispose()
     logger.info("disposed database engine and closed connections...")
 
     if get_settings().prometheus.enabled:
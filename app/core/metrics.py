@@ -1,4 +1,14 @@
+import logging
+import time
+from typing import Any, cast
+
 import prometheus_client
+from sqlalchemy import Connection, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection, QueuePool
+
+from app.core.config import get_settings
 
 NAMESPACE = "org"
 SUBSYSTEM = "app"
@@ -18,3 +28,321 @@ APP_STOPPED = prometheus_client.Counter(
     namespace=NAMESPACE,
     subsystem=SUBSYSTEM,
 )
+
+PASSWORD_HASH_QUEUE_DEPTH = prometheus_client.Gauge(
+    "password_hash_queue_depth",
+    "Password hashing calls waiting for free slot in process pool",
+    labelnames=(),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+PASSWORD_HASH_IN_PROGRESS = prometheus_client.Gauge(
+    "password_hash_in_progress",
+    "Password hashing calls running in process pool",
+    labelnames=(),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+PASSWORD_HASH_WAIT_SECONDS = prometheus_client.Histogram(
+    "password_hash_wait_seconds",
+    "Time password hashing calls waited for free slot in process pool",
+    labelnames=(),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+PASSWORD_HASH_REJECTED = prometheus_client.Counter(
+    "password_hash_rejected_total",
+    "Password hashing calls rejected with 503, by reason (queue_full, timeout)",
+    labelnames=("reason",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+JWT_VERIFY_CACHE = prometheus_client.Counter(
+    "jwt_verify_cache_total",
+    "Verified access tokens cache lookups, by result (hit, miss)",
+    labelnames=("result",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+USER_CACHE = prometheus_client.Counter(
+    "user_cache_total",
+    "Current user cache lookups, by result (hit, miss)",
+    labelnames=("result",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+USER_CACHE_INVALIDATION_LAG_SECONDS = prometheus_client.Histogram(
+    "user_cache_invalidation_lag_seconds",
+    "Time from user change to invalidation of cached user by NOTIFY",
+    labelnames=(),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+MAINTENANCE_RUNS = prometheus_client.Counter(
+    "maintenance_runs_total",
+    "Database maintenance runs, by result (completed, skipped, failed)",
+    labelnames=("result",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+MAINTENANCE_DELETED_ROWS = prometheus_client.Counter(
+    "maintenance_deleted_rows_total",
+    "Rows deleted by database maintenance, by table",
+    labelnames=("table",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+MAINTENANCE_BATCH_SECONDS = prometheus_client.Histogram(
+    "maintenance_batch_seconds",
+    "Duration of database maintenance delete batches, by table",
+    labelnames=("table",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+MAINTENANCE_PARTITIONS = prometheus_client.Counter(
+    "maintenance_partitions_total",
+    "Partitions created or dropped by database maintenance, by table and action",
+    labelnames=("table", "action"),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_POOL_CHECKED_OUT = prometheus_client.Gauge(
+    "db_pool_checked_out_connections",
+    "Database connections checked out from pool, by engine",
+    labelnames=("engine",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_POOL_OVERFLOW = prometheus_client.Gauge(
+    "db_pool_overflow_connections",
+    "Database connections open above pool size, by engine",
+    labelnames=("engine",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_POOL_CHECKOUT_WAIT_SECONDS = prometheus_client.Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to get connection from pool, including wait for free one, by engine",
+    labelnames=("engine",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_POOL_CHECKOUT_TIMEOUTS = prometheus_client.Counter(
+    "db_pool_checkout_timeouts_total",
+    "Connection checkouts that failed after Database.pool_timeout_secs, by engine",
+    labelnames=("engine",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_CONNECT_SECONDS = prometheus_client.Histogram(
+    "db_connect_seconds",
+    "Time to open new database connection, by engine",
+    labelnames=("engine",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_STATEMENT_CACHE = prometheus_client.Counter(
+    "db_statement_cache_total",
+    "Prepared statement cache lookups of executed statements, by engine and result",
+    labelnames=("engine", "result"),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_HEALTH_CHECK_SECONDS = prometheus_client.Histogram(
+    "db_health_check_seconds",
+    "Round trip time of background database health check query",
+    labelnames=(),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_HEALTH_CHECK_FAILURES = prometheus_client.Counter(
+    "db_health_check_failures_total",
+    "Failed background database health checks",
+    labelnames=(),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_QUERY_SECONDS = prometheus_client.Histogram(
+    "db_query_seconds",
+    "Duration of SQL statements, by normalized statement",
+    labelnames=("statement",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+HTTP_REQUESTS = prometheus_client.Counter(
+    "http_requests_total",
+    "HTTP requests, by route, method and status code",
+    labelnames=("route", "method", "status"),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+HTTP_REQUEST_DURATION_SECONDS = prometheus_client.Histogram(
+    "http_request_duration_seconds",
+    "Time from start of HTTP request to end of response body, by route and method",
+    labelnames=("route", "method"),
+    buckets=get_settings().prometheus.http_request_duration_buckets,
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+HTTP_REQUESTS_IN_PROGRESS = prometheus_client.Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled, by method",
+    labelnames=("method",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+HTTP_REQUEST_SIZE_BYTES = prometheus_client.Histogram(
+    "http_request_size_bytes",
+    "Size of HTTP request body read by the app, by route",
+    labelnames=("route",),
+    buckets=get_settings().prometheus.http_body_size_buckets,
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+HTTP_RESPONSE_SIZE_BYTES = prometheus_client.Histogram(
+    "http_response_size_bytes",
+    "Size of HTTP response body, by route",
+    labelnames=("route",),
+    buckets=get_settings().prometheus.http_body_size_buckets,
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+HTTP_REQUEST_DB_QUERIES = prometheus_client.Histogram(
+    "http_request_db_queries",
+    "SQL statements executed while handling HTTP request, by route",
+    labelnames=("route",),
+    buckets=(0, 1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50, 100),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+HTTP_REQUEST_DEADLINE_EXCEEDED = prometheus_client.Counter(
+    "http_request_deadline_exceeded_total",
+    "Requests ended with 504 by deadline, by route and operation that timed out",
+    labelnames=("route", "operation"),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_READ_SESSIONS = prometheus_client.Counter(
+    "db_read_sessions_total",
+    "Read only sessions, by engine (primary when no replica is usable)",
+    labelnames=("engine",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+DB_REPLICA_LAG_SECONDS = prometheus_client.Gauge(
+    "db_replica_lag_seconds",
+    "Replication lag of read replica, +Inf when lag check failed, by engine",
+    labelnames=("engine",),
+    namespace=NAMESPACE,
+    subsystem=SUBSYSTEM,
+)
+
+# connection info keys of prepared statement counter, see instrument_engine
+_PREPARED_STATEMENTS = "metrics_prepared_statements"
+_PREPARED_STATEMENTS_BEFORE = "metrics_prepared_statements_before"
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    # no pool event fires before checkout starts to wait for free connection,
+    # engine label is pool logging name, see instrument_engine
+    def connect(self) -> PoolProxiedConnection:
+        engine = str(self.logging_name)
+        try:
+            with DB_POOL_CHECKOUT_WAIT_SECONDS.labels(engine=engine).time():
+                return super().connect()
+        except PoolTimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(engine=engine).inc()
+            raise
+
+
+# SQLAlchemy loggers default to WARNING, logger of this subclass is named after
+# this module and would log every pool dispose on app log level
+logging.getLogger(f"{__name__}.{InstrumentedAsyncAdaptedQueuePool.__name__}").setLevel(
+    logging.WARNING
+)
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    # engine must use pool_logging_name=name and InstrumentedAsyncAdaptedQueuePool
+    # or NullPool, gauges read current pool on scrape, engine.dispose() replaces it
+    def pool() -> AsyncAdaptedQueuePool:
+        return cast(AsyncAdaptedQueuePool, engine.sync_engine.pool)
+
+    if isinstance(pool(), QueuePool):
+        DB_POOL_CHECKED_OUT.labels(engine=name).set_function(
+            lambda: pool().checkedout()
+        )
+        DB_POOL_OVERFLOW.labels(engine=name).set_function(
+            lambda: max(pool().overflow(), 0)
+        )
+
+    connect_seconds = DB_CONNECT_SECONDS.labels(engine=name)
+    statement_cache_hits = DB_STATEMENT_CACHE.labels(engine=name, result="hit")
+    statement_cache_misses = DB_STATEMENT_CACHE.labels(engine=name, result="miss")
+
+    @event.listens_for(engine.sync_engine, "do_connect")
+    def measure_connect(
+        dialect: Any, conn_rec: Any, cargs: tuple[Any, ...], cparams: dict[str, Any]
+    ) -> Any:
+        # asyncpg dialect calls prepared_statement_name_func for every statement
+        # it prepares, that is on every prepared statement cache miss
+        name_func = cparams.get("prepared_statement_name_func", lambda: None)
+
+        def counting_name_func() -> str | None:
+            conn_rec.info[_PREPARED_STATEMENTS] += 1
+            return cast(str | None, name_func())
+
+        conn_rec.info[_PREPARED_STATEMENTS] = 0
+        start = time.perf_counter()
+        try:
+            return dialect.connect(
+                *cargs,
+                **{**cparams, "prepared_statement_name_func": counting_name_func},
+            )
+        finally:
+            connect_seconds.observe(time.perf_counter() - start)
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def remember_prepared_statements(conn: Connection, *_: Any) -> None:
+        conn.info[_PREPARED_STATEMENTS_BEFORE] = conn.info.get(_PREPARED_STATEMENTS)
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute", named=True)
+    def count_statement_cache(conn: Connection, executemany: bool, **_: Any) -> None:
+        # executemany goes to asyncpg directly, without dialect cache
+        if executemany:
+            return
+        if (
+            conn.info.get(_PREPARED_STATEMENTS)
+            == conn.info[_PREPARED_STATEMENTS_BEFORE]
+        ):
+            statement_cache_hits.inc()
+        else:
+            statement_cache_misses.inc()
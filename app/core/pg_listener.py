@@ -0,0 +1,143 @@
+# Postgres LISTEN/NOTIFY on dedicated asyncpg connection
+#
+# https://www.postgresql.org/docs/current/sql-notify.html
+# https://magicstack.github.io/asyncpg/current/api/index.html#asyncpg.connection.Connection.add_listener
+#
+# NOTIFY is delivered only to connections listening at the moment of commit,
+# notifications sent while the connection is down are lost. That's why every
+# subscription has optional on_connect callback, awaited after each (re)connect
+# when listeners are already registered, to reload state from the database.
+#
+# The connection is supervised by background task: lost connection (closed by
+# server or failing periodic health check) is replaced by new one, retried
+# with reconnect_delay_secs delay until it succeeds.
+
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+import asyncpg  # type: ignore[import-untyped]
+from sqlalchemy.engine.url import URL
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Subscription:
+    channel: str
+    on_notify: Callable[[str], None]
+    on_connect: Callable[[], Awaitable[None]] | None = None
+
+
+def asyncpg_dsn(uri: URL) -> str:
+    return uri.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class PgListener:
+    def __init__(
+        self,
+        dsn: str,
+        health_check_interval_secs: float = 10.0,
+        reconnect_delay_secs: float = 1.0,
+    ) -> None:
+        self.dsn = dsn
+        self.health_check_interval_secs = health_check_interval_secs
+        self.reconnect_delay_secs = reconnect_delay_secs
+        self.subscriptions: list[Subscription] = []
+        self.connection: asyncpg.Connection | None = None
+        self.connection_lost = asyncio.Event()
+        self.task: asyncio.Task[None] | None = None
+
+    def subscribe(
+        self,
+        channel: str,
+        on_notify: Callable[[str], None],
+        on_connect: Callable[[], Awaitable[None]] | None = None,
+    ) -> None:
+        self.subscriptions.append(Subscription(channel, on_notify, on_connect))
+
+    async def start(self) -> None:
+        # first connection is made here, so startup fails when database is down
+        # and subscribers are loaded before app starts serving requests
+        await self.connect()
+        self.task = asyncio.create_task(self.supervise())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+    async def connect(self) -> None:
+        connection = await asyncpg.connect(self.dsn)
+        try:
+            self.connection_lost.clear()
+            connection.add_termination_listener(self.on_termination)
+            for subscription in self.subscriptions:
+                await connection.add_listener(
+                    subscription.channel, self.notify_callback(subscription)
+                )
+            for subscription in self.subscriptions:
+                if subscription.on_connect is not None:
+                    await subscription.on_connect()
+        except BaseException:
+            connection.terminate()
+            raise
+        self.connection = connection
+
+    def notify_callback(
+        self, subscription: Subscription
+    ) -> Callable[[Any, int, str, str], None]:
+        def callback(_: Any, pid: int, channel: str, payload: str) -> None:
+            try:
+                subscription.on_notify(payload)
+            except Exception:
+                logger.exception("failed to handle notification on %s", channel)
+
+        return callback
+
+    def on_termination(self, connection: Any) -> None:
+        # ignore connections already replaced by supervise
+        if connection is self.connection:
+            self.connection_lost.set()
+
+    async def supervise(self) -> None:
+        while True:
+            await self.wait_connection_lost()
+            logger.warning("LISTEN connection lost, reconnecting...")
+            if self.connection is not None:
+                self.connection.terminate()
+                self.connection = None
+            await self.reconnect()
+
+    async def wait_connection_lost(self) -> None:
+        while self.connection is not None:
+            try:
+                await asyncio.wait_for(
+                    self.connection_lost.wait(), self.health_check_interval_secs
+                )
+                return
+            except TimeoutError:
+                pass
+            try:
+                await self.connection.execute(
+                    "SELECT 1", timeout=self.health_check_interval_secs
+                )
+            except Exception:
+                return
+
+    async def reconnect(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconnect_delay_secs)
+            try:
+                await self.connect()
+                logger.info("LISTEN connection reestablished")
+                return
+            except Exception as err:
+                logger.warning("failed to reconnect LISTEN connection: %s", err)
@@ -0,0 +1,135 @@
+# SQL statement instrumentation, installed on every engine by new_async_engine.
+#
+# Statements are timed between before_cursor_execute and after_cursor_execute
+# events and recorded in histogram labeled by normalized statement: parameters,
+# literals, expanded IN lists and numbers in identifiers (partitions like
+# auth_refresh_token_p<start>, temporary tables) are replaced by "?", so label
+# values stay bounded by number of distinct queries in the code.
+#
+# QueryStatsMiddleware keeps RequestQueries of current request in contextvar,
+# statements executed while handling it are counted there, then the count is
+# recorded per route. Statements slower than Database.slow_query_secs are logged
+# with route, without parameters which may contain secrets.
+
+
+import logging
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any
+
+from fastapi.routing import APIRoute
+from sqlalchemy import Connection, event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.applications import Starlette
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# connection info key of current statement start, see instrument_queries
+_QUERY_START = "query_stats_start"
+# route label of requests not matching any route and statements outside requests
+NO_ROUTE = "none"
+
+_PARAMETER = re.compile(r"\$\d+|'(?:[^']|'')*'|\b\d+\b")
+_IDENTIFIER_NUMBER = re.compile(r"(?<=[A-Za-z_])\d+")
+_PARAMETER_LIST = re.compile(r"\(\?(?:, \?)*\)")
+_PARAMETER_LISTS = re.compile(r"\(\?\)(?:, \(\?\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class RequestQueries:
+    def __init__(self, scope: Scope) -> None:
+        self.scope = scope
+        self.count = 0
+
+    @property
+    def route(self) -> str:
+        # router sets matched route in scope before calling endpoint
+        return route_path(self.scope)
+
+
+_REQUEST_QUERIES: ContextVar[RequestQueries | None] = ContextVar(
+    "request_queries", default=None
+)
+
+
+def route_path(scope: Scope) -> str:
+    route = scope.get("route")
+    if not isinstance(route, APIRoute):
+        return NO_ROUTE
+    return _full_route_path(
+        scope["app"], route.name, route.path, tuple(route.param_convertors)
+    )
+
+
+@lru_cache(maxsize=1024)
+def _full_route_path(
+    app: Starlette, name: str, path: str, params: tuple[str, ...]
+) -> str:
+    # path of route from included router is relative to router prefix, full path
+    # template is rebuilt by url_path_for with parameter placeholders
+    try:
+        return str(
+            app.url_path_for(name, **{param: f"{{{param}}}" for param in params})
+        )
+    except Exception:  # pragma: no cover
+        # converters like int reject placeholders
+        return path
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(statement: str) -> str:
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _PARAMETER.sub("?", statement)
+    statement = _IDENTIFIER_NUMBER.sub("?", statement)
+    statement = _PARAMETER_LIST.sub("(?)", statement)
+    return _PARAMETER_LISTS.sub("(?), ...", statement)
+
+
+def instrument_queries(engine: AsyncEngine) -> None:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def start_query(conn: Connection, *_: Any) -> None:
+        conn.info[_QUERY_START] = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute", named=True)
+    def finish_query(conn: Connection, statement: str, **_: Any) -> None:
+        duration = time.perf_counter() - conn.info[_QUERY_START]
+        metrics.DB_QUERY_SECONDS.labels(
+            statement=normalize_statement(statement)
+        ).observe(duration)
+
+        request_queries = _REQUEST_QUERIES.get()
+        if request_queries is not None:
+            request_queries.count += 1
+        if duration > get_settings().database.slow_query_secs:
+            logger.warning(
+                "slow query on route %s took %.3fs: %s",
+                NO_ROUTE if request_queries is None else request_queries.route,
+                duration,
+                normalize_statement(statement),
+            )
+
+
+class QueryStatsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":  # pragma: no cover
+            await self.app(scope, receive, send)
+            return
+
+        request_queries = RequestQueries(scope)
+        token = _REQUEST_QUERIES.set(request_queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _REQUEST_QUERIES.reset(token)
+            metrics.HTTP_REQUEST_DB_QUERIES.labels(route=request_queries.route).observe(
+                request_queries.count
+            )
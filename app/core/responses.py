@@ -0,0 +1,29 @@
+# JSON response for hot endpoints, opt-in per route:
+#
+# @router.get("/me", response_model=UserResponse, response_class=ModelResponse)
+# async def read_current_user(...) -> ModelResponse:
+#     return ModelResponse(UserResponse.from_user(current_user))
+#
+# When endpoint returns anything else than Response, FastAPI validates it against
+# response_model again and only then serializes it. Endpoint that builds response
+# model itself does not need that, ModelResponse renders the model straight to
+# bytes with its pydantic serializer (same output as FastAPI). response_model is
+# kept on the route only for OpenAPI schema.
+#
+# Other content (dicts, lists) is rendered like JSONResponse does. See
+# benchmarks/json_responses.py.
+
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class ModelResponse(JSONResponse):
+    # JSONResponse subclass, so OpenAPI gets schema of response_model
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            # model_dump_json() is the same call, decoded to str
+            return content.__pydantic_serializer__.to_json(content, by_alias=True)
+        return super().render(content)
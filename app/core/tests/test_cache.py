@@ -0,0 +1,51 @@
+from app.core.cache import TTLCache
+
+
+def test_ttl_cache_returns_value_before_expiration() -> None:
+    cache: TTLCache[str, str] = TTLCache(maxsize=10)
+    cache.set("key", "value", expires_at=100)
+
+    assert cache.get("key", now=99) == "value"
+    assert cache.get("missing", now=99) is None
+
+
+def test_ttl_cache_evicts_value_after_expiration() -> None:
+    cache: TTLCache[str, str] = TTLCache(maxsize=10)
+    cache.set("key", "value", expires_at=100)
+
+    assert cache.get("key", now=100) is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used_entry() -> None:
+    cache: TTLCache[str, str] = TTLCache(maxsize=2)
+    cache.set("a", "1", expires_at=100)
+    cache.set("b", "2", expires_at=100)
+    assert cache.get("a", now=0) == "1"
+
+    cache.set("c", "3", expires_at=100)
+
+    assert cache.get("b", now=0) is None
+    assert cache.get("a", now=0) == "1"
+    assert cache.get("c", now=0) == "3"
+
+
+def test_ttl_cache_with_zero_maxsize_is_disabled() -> None:
+    cache: TTLCache[str, str] = TTLCache(maxsize=0)
+    cache.set("key", "value", expires_at=100)
+
+    assert cache.get("key", now=0) is None
+
+
+def test_ttl_cache_pop_and_clear() -> None:
+    cache: TTLCache[str, str] = TTLCache(maxsize=10)
+    cache.set("a", "1", expires_at=100)
+    cache.set("b", "2", expires_at=100)
+
+    cache.pop("a")
+    cache.pop("missing")
+    assert cache.get("a", now=0) is None
+    assert len(cache) == 1
+
+    cache.clear()
+    assert len(cache) == 0
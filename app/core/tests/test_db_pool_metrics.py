@@ -0,0 +1,181 @@
+from collections.abc import AsyncGenerator
+
+import prometheus_client
+import pytest
+import pytest_asyncio
+import sqlalchemy
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import NullPool
+
+from app.core import database_session, metrics
+from app.core.config import get_settings
+from app.tests.metrics import metric
+
+
+@pytest_asyncio.fixture(name="engine", loop_scope="session", scope="function")
+async def fixture_engine(
+    monkeypatch: pytest.MonkeyPatch,
+) -> AsyncGenerator[AsyncEngine]:
+    monkeypatch.setattr(get_settings().database, "pool_size", 1)
+    monkeypatch.setattr(get_settings().database, "pool_max_overflow", 1)
+    monkeypatch.setattr(get_settings().database, "pool_timeout_secs", 0.1)
+    engine = database_session.new_async_engine(
+        get_settings().sqlalchemy_database_uri, name="test"
+    )
+    yield engine
+    await engine.dispose()
+
+
+async def test_engine_pool_uses_database_settings(engine: AsyncEngine) -> None:
+    pool_size = 1
+
+    async with engine.connect() as connection:
+        await connection.execute(sqlalchemy.text("SELECT 1"))
+
+    assert engine.pool.status().startswith(f"Pool size: {pool_size} ")
+
+
+async def test_engine_pool_metrics_show_checked_out_and_overflow_connections(
+    engine: AsyncEngine,
+) -> None:
+    connects_before = metric("org_app_db_connect_seconds_count", engine="test")
+    checkouts_before = metric(
+        "org_app_db_pool_checkout_wait_seconds_count", engine="test"
+    )
+    connections = 2
+
+    async with engine.connect() as first, engine.connect() as second:
+        await first.execute(sqlalchemy.text("SELECT 1"))
+        await second.execute(sqlalchemy.text("SELECT 1"))
+
+        assert (
+            metric("org_app_db_pool_checked_out_connections", engine="test")
+            == connections
+        )
+        assert metric("org_app_db_pool_overflow_connections", engine="test") == 1
+
+    assert metric("org_app_db_pool_checked_out_connections", engine="test") == 0
+    assert (
+        metric("org_app_db_connect_seconds_count", engine="test")
+        == connects_before + connections
+    )
+    assert (
+        metric("org_app_db_pool_checkout_wait_seconds_count", engine="test")
+        == checkouts_before + connections
+    )
+
+
+async def test_engine_pool_metrics_count_checkout_timeouts(
+    engine: AsyncEngine,
+) -> None:
+    timeouts_before = metric("org_app_db_pool_checkout_timeouts_total", engine="test")
+
+    async with engine.connect() as first, engine.connect() as second:
+        await first.execute(sqlalchemy.text("SELECT 1"))
+        await second.execute(sqlalchemy.text("SELECT 1"))
+
+        with pytest.raises(sqlalchemy.exc.TimeoutError):
+            async with engine.connect():
+                pass
+
+    assert (
+        metric("org_app_db_pool_checkout_timeouts_total", engine="test")
+        == timeouts_before + 1
+    )
+
+
+@pytest_asyncio.fixture(name="pgbouncer_engine", loop_scope="session", scope="function")
+async def fixture_pgbouncer_engine(
+    monkeypatch: pytest.MonkeyPatch,
+) -> AsyncGenerator[AsyncEngine]:
+    monkeypatch.setattr(get_settings().database, "pgbouncer", True)
+    engine = database_session.new_async_engine(
+        get_settings().sqlalchemy_database_uri, name="test_pgbouncer"
+    )
+    yield engine
+    await engine.dispose()
+
+
+async def test_engine_statement_cache_metrics_count_hits_and_misses(
+    engine: AsyncEngine,
+) -> None:
+    hits_before = metric(
+        "org_app_db_statement_cache_total", engine="test", result="hit"
+    )
+    misses_before = metric(
+        "org_app_db_statement_cache_total", engine="test", result="miss"
+    )
+
+    async with engine.connect() as connection:
+        for _ in range(3):
+            await connection.execute(sqlalchemy.text("SELECT 1"))
+        # executemany is not counted
+        await connection.execute(sqlalchemy.text("CREATE TEMP TABLE t (x int)"))
+        await connection.execute(
+            sqlalchemy.text("INSERT INTO t VALUES (:x)"), [{"x": 1}, {"x": 2}]
+        )
+
+    assert (
+        metric("org_app_db_statement_cache_total", engine="test", result="miss")
+        == misses_before + 2
+    )
+    assert (
+        metric("org_app_db_statement_cache_total", engine="test", result="hit")
+        == hits_before + 2
+    )
+
+
+async def test_pgbouncer_engine_has_no_pool_and_no_statement_cache(
+    pgbouncer_engine: AsyncEngine,
+) -> None:
+    misses_before = metric(
+        "org_app_db_statement_cache_total", engine="test_pgbouncer", result="miss"
+    )
+    statements = 3
+
+    async with pgbouncer_engine.connect() as connection:
+        for _ in range(statements):
+            await connection.execute(sqlalchemy.text("SELECT 1"))
+        prepared = await connection.scalars(
+            sqlalchemy.text("SELECT name FROM pg_prepared_statements")
+        )
+        names = prepared.all()
+
+    assert isinstance(pgbouncer_engine.pool, NullPool)
+    assert (
+        prometheus_client.REGISTRY.get_sample_value(
+            "org_app_db_pool_checked_out_connections", {"engine": "test_pgbouncer"}
+        )
+        is None
+    )
+    assert (
+        metric(
+            "org_app_db_statement_cache_total", engine="test_pgbouncer", result="miss"
+        )
+        == misses_before + statements + 1
+    )
+    assert (
+        metric(
+            "org_app_db_statement_cache_total", engine="test_pgbouncer", result="hit"
+        )
+        == 0
+    )
+    assert all(name.startswith("__asyncpg_") for name in names)
+    assert len(set(names)) == len(names)
+
+
+def test_pgbouncer_statement_cache_and_pool_can_be_enabled(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    cache_size = 50
+    monkeypatch.setattr(get_settings().database, "pgbouncer", True)
+    monkeypatch.setattr(get_settings().database, "pool_class", "queue")
+    monkeypatch.setattr(
+        get_settings().database, "prepared_statement_cache_size", cache_size
+    )
+
+    options = database_session.engine_options()
+
+    assert options["poolclass"] is metrics.InstrumentedAsyncAdaptedQueuePool
+    assert options["connect_args"]["prepared_statement_cache_size"] == cache_size
+    assert options["connect_args"]["statement_cache_size"] == 0
@@ -0,0 +1,149 @@
+import asyncio
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.auth import dependencies
+from app.auth.models import User
+from app.core import database_session, deadlines
+from app.core.config import get_settings
+from app.main import app
+from app.tests.metrics import metric
+
+DEADLINE_EXCEEDED = "org_app_http_request_deadline_exceeded_total"
+
+
+@pytest.fixture(name="short_deadline")
+def fixture_short_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings().database, "request_deadline_secs", 0.05)
+
+
+async def test_request_exceeding_deadline_returns_504(
+    client: AsyncClient,
+    override: Callable[[Any, Any], None],
+    short_deadline: None,
+) -> None:
+    async def slow_principal() -> None:
+        await asyncio.sleep(1)
+
+    override(dependencies.get_current_principal, slow_principal)
+    labels = {"route": "/auth/me", "operation": "request"}
+    exceeded_before = metric(DEADLINE_EXCEEDED, **labels)
+
+    response = await client.delete(app.url_path_for("delete_current_user"))
+
+    assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+    assert response.json() == {"detail": deadlines.DEADLINE_EXCEEDED}
+    assert metric(DEADLINE_EXCEEDED, **labels) == exceeded_before + 1
+
+
+async def test_query_running_at_deadline_is_cancelled(
+    client: AsyncClient,
+    override: Callable[[Any, Any], None],
+    short_deadline: None,
+) -> None:
+    async def slow_query_principal() -> None:
+        async with database_session._ASYNC_ENGINE.connect() as connection:
+            await connection.execute(text("SELECT pg_sleep(5)"))
+
+    override(dependencies.get_current_principal, slow_query_principal)
+    labels = {"route": "/auth/me", "operation": "query"}
+    exceeded_before = metric(DEADLINE_EXCEEDED, **labels)
+
+    async with asyncio.timeout(2):
+        response = await client.delete(app.url_path_for("delete_current_user"))
+
+    assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+    assert metric(DEADLINE_EXCEEDED, **labels) == exceeded_before + 1
+
+
+async def test_query_stopped_by_statement_timeout_returns_504(
+    client: AsyncClient, override: Callable[[Any, Any], None]
+) -> None:
+    async def statement_timeout_principal() -> None:
+        async with database_session._ASYNC_ENGINE.connect() as connection:
+            await connection.execute(text("SET LOCAL statement_timeout = 10"))
+            await connection.execute(text("SELECT pg_sleep(5)"))
+
+    override(dependencies.get_current_principal, statement_timeout_principal)
+    labels = {"route": "/auth/me", "operation": "statement_timeout"}
+    exceeded_before = metric(DEADLINE_EXCEEDED, **labels)
+
+    response = await client.delete(app.url_path_for("delete_current_user"))
+
+    assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+    assert metric(DEADLINE_EXCEEDED, **labels) == exceeded_before + 1
+
+
+async def test_other_errors_are_not_turned_into_504(
+    client: AsyncClient, override: Callable[[Any, Any], None]
+) -> None:
+    async def failing_query_principal() -> None:
+        async with database_session._ASYNC_ENGINE.connect() as connection:
+            await connection.execute(text("SELECT 1 / 0"))
+
+    async def timeout_principal() -> None:
+        raise TimeoutError
+
+    override(dependencies.get_current_principal, failing_query_principal)
+    with pytest.raises(DBAPIError):
+        await client.delete(app.url_path_for("delete_current_user"))
+
+    override(dependencies.get_current_principal, timeout_principal)
+    with pytest.raises(TimeoutError):
+        await client.delete(app.url_path_for("delete_current_user"))
+
+
+async def test_route_deadline_overrides_default(
+    client: AsyncClient,
+    override: Callable[[Any, Any], None],
+    default_user: User,
+    short_deadline: None,
+) -> None:
+    # /auth/me has its own deadline of few seconds, see @deadline in app.auth.views
+    async def slow_user() -> User:
+        await asyncio.sleep(0.2)
+        return default_user
+
+    override(dependencies.get_current_user, slow_user)
+
+    response = await client.get(app.url_path_for("read_current_user"))
+
+    assert response.status_code == status.HTTP_200_OK
+
+
+async def test_connections_get_timeouts_of_request_deadline(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().database, "request_deadline_secs", 3.0)
+    monkeypatch.setattr(get_settings().database, "lock_timeout_secs", 1.0)
+    engine = database_session.new_async_engine(
+        get_settings().sqlalchemy_database_uri, "deadlines"
+    )
+
+    async def timeouts() -> list[str | None]:
+        async with engine.connect() as connection:
+            return [
+                await connection.scalar(text("SHOW statement_timeout")),
+                await connection.scalar(text("SHOW lock_timeout")),
+            ]
+
+    request_deadline = deadlines.RequestDeadline()
+    token = deadlines._REQUEST_DEADLINE.set(request_deadline)
+    try:
+        assert await timeouts() == ["3s", "1s"]
+        monkeypatch.setattr(get_settings().database, "pgbouncer", True)
+        request_deadline.secs = 0.5
+        assert await timeouts() == ["3s", "1s"]
+        monkeypatch.setattr(get_settings().database, "pgbouncer", False)
+        assert await timeouts() == ["500ms", "500ms"]
+    finally:
+        deadlines._REQUEST_DEADLINE.reset(token)
+
+    assert await timeouts() == ["0", "0"]
+    await engine.dispose()
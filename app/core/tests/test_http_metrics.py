@@ -0,0 +1,115 @@
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from pydantic import ValidationError
+
+from app.auth import dependencies
+from app.auth.models import User
+from app.core import http_metrics, query_stats
+from app.core.config import Prometheus
+from app.main import app
+from app.tests.metrics import metric
+
+
+async def test_request_is_recorded_by_route_template(
+    client: AsyncClient,
+    default_user_headers: dict[str, str],
+    default_user: User,
+) -> None:
+    labels = {"route": "/auth/me", "method": "GET"}
+    requests_before = metric("org_app_http_requests_total", **labels, status="200")
+    durations_before = metric("org_app_http_request_duration_seconds_count", **labels)
+    sizes_before = metric("org_app_http_response_size_bytes_sum", route="/auth/me")
+
+    response = await client.get(
+        app.url_path_for("read_current_user"), headers=default_user_headers
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert metric("org_app_http_requests_total", **labels, status="200") == (
+        requests_before + 1
+    )
+    assert metric("org_app_http_request_duration_seconds_count", **labels) == (
+        durations_before + 1
+    )
+    assert metric("org_app_http_response_size_bytes_sum", route="/auth/me") == (
+        sizes_before + len(response.content)
+    )
+
+
+async def test_request_body_size_is_recorded(client: AsyncClient) -> None:
+    body = b'{"refresh_token": "not-existing-token"}'
+    sizes_before = metric(
+        "org_app_http_request_size_bytes_sum", route="/auth/refresh-token"
+    )
+
+    response = await client.post(
+        app.url_path_for("refresh_token"),
+        content=body,
+        headers={"Content-Type": "application/json"},
+    )
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert metric(
+        "org_app_http_request_size_bytes_sum", route="/auth/refresh-token"
+    ) == (sizes_before + len(body))
+
+
+async def test_unmatched_path_and_unknown_method_have_bounded_labels(
+    client: AsyncClient,
+) -> None:
+    not_found_labels = {"route": query_stats.NO_ROUTE, "method": "GET"}
+    other_method_labels = {
+        "route": "/auth/me",
+        "method": http_metrics.OTHER_METHOD,
+        "status": "405",
+    }
+    not_found_before = metric(
+        "org_app_http_requests_total", **not_found_labels, status="404"
+    )
+    other_method_before = metric("org_app_http_requests_total", **other_method_labels)
+
+    await client.get("/auth/not-existing-path")
+    await client.request("PURGE", app.url_path_for("read_current_user"))
+
+    assert metric("org_app_http_requests_total", **not_found_labels, status="404") == (
+        not_found_before + 1
+    )
+    assert metric("org_app_http_requests_total", **other_method_labels) == (
+        other_method_before + 1
+    )
+
+
+async def test_failed_request_is_counted_as_500_and_in_progress_gauge(
+    client: AsyncClient, override: Callable[[Any, Any], None]
+) -> None:
+    in_progress: list[float] = []
+
+    async def failing_principal() -> None:
+        in_progress.append(metric("org_app_http_requests_in_progress", method="DELETE"))
+        raise RuntimeError
+
+    override(dependencies.get_current_principal, failing_principal)
+    labels = {"route": "/auth/me", "method": "DELETE", "status": "500"}
+    failed_before = metric("org_app_http_requests_total", **labels)
+    in_progress_before = metric("org_app_http_requests_in_progress", method="DELETE")
+
+    with pytest.raises(RuntimeError):
+        await client.delete(app.url_path_for("delete_current_user"))
+
+    assert in_progress == [in_progress_before + 1]
+    assert (
+        metric("org_app_http_requests_in_progress", method="DELETE")
+        == in_progress_before
+    )
+    assert metric("org_app_http_requests_total", **labels) == failed_before + 1
+
+
+def test_prometheus_buckets_must_increase() -> None:
+    with pytest.raises(ValidationError):
+        Prometheus(http_request_duration_buckets=[0.1, 0.01])
+    with pytest.raises(ValidationError):
+        Prometheus(http_body_size_buckets=[])
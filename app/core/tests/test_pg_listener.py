@@ -0,0 +1,175 @@
+import asyncio
+from typing import Any
+
+import asyncpg  # type: ignore[import-untyped]
+import pytest
+
+from app.core.config import get_settings
+from app.core.pg_listener import PgListener, asyncpg_dsn
+
+CHANNEL = "test_pg_listener"
+# tests patch pg_listener.asyncpg.connect, helpers must use the original one
+CONNECT = asyncpg.connect
+
+
+def new_listener() -> PgListener:
+    return PgListener(
+        asyncpg_dsn(get_settings().sqlalchemy_database_uri),
+        health_check_interval_secs=0.05,
+        reconnect_delay_secs=0.01,
+    )
+
+
+async def notify(payload: str) -> None:
+    connection = await CONNECT(asyncpg_dsn(get_settings().sqlalchemy_database_uri))
+    try:
+        await connection.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+    finally:
+        await connection.close()
+
+
+async def notify_terminate(pid: int) -> None:
+    connection = await CONNECT(asyncpg_dsn(get_settings().sqlalchemy_database_uri))
+    try:
+        await connection.execute("SELECT pg_terminate_backend($1)", pid)
+    finally:
+        await connection.close()
+
+
+async def wait_for(condition: Any) -> None:
+    async with asyncio.timeout(5):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+class Subscriber:
+    def __init__(self) -> None:
+        self.payloads: list[str] = []
+        self.connects = 0
+
+    def on_notify(self, payload: str) -> None:
+        self.payloads.append(payload)
+
+    async def on_connect(self) -> None:
+        self.connects += 1
+
+
+async def test_pg_listener_receives_committed_notifications() -> None:
+    subscriber = Subscriber()
+    listener = new_listener()
+    listener.subscribe(CHANNEL, subscriber.on_notify, subscriber.on_connect)
+    await listener.start()
+
+    try:
+        assert subscriber.connects == 1
+        await notify("payload")
+        await wait_for(lambda: subscriber.payloads == ["payload"])
+    finally:
+        await listener.stop()
+
+    assert listener.connection is None
+    assert listener.task is None
+
+
+async def test_pg_listener_reconnects_after_connection_is_terminated() -> None:
+    subscriber = Subscriber()
+    listener = new_listener()
+    listener.subscribe(CHANNEL, subscriber.on_notify, subscriber.on_connect)
+    await listener.start()
+
+    try:
+        assert listener.connection is not None
+        await notify_terminate(listener.connection.get_server_pid())
+        await wait_for(lambda: subscriber.connects == len(["start", "reconnect"]))
+
+        await notify("after reconnect")
+        await wait_for(lambda: subscriber.payloads == ["after reconnect"])
+    finally:
+        await listener.stop()
+
+
+async def test_pg_listener_reconnects_after_failed_health_check(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    subscriber = Subscriber()
+    listener = new_listener()
+    listener.subscribe(CHANNEL, subscriber.on_notify, subscriber.on_connect)
+    await listener.start()
+
+    class BrokenConnection:
+        def __init__(self, connection: Any) -> None:
+            self.connection = connection
+
+        async def execute(self, *args: Any, **kwargs: Any) -> None:
+            raise OSError("connection reset")
+
+        def terminate(self) -> None:
+            self.connection.terminate()
+
+    try:
+        listener.connection = BrokenConnection(listener.connection)
+        await wait_for(lambda: subscriber.connects == len(["start", "reconnect"]))
+        assert isinstance(listener.connection, asyncpg.Connection)
+    finally:
+        await listener.stop()
+
+
+async def test_pg_listener_retries_failed_reconnect(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    subscriber = Subscriber()
+    listener = new_listener()
+    listener.subscribe(CHANNEL, subscriber.on_notify, subscriber.on_connect)
+    await listener.start()
+
+    attempts: list[str] = []
+
+    async def fail_first_connect(dsn: str) -> Any:
+        attempts.append(dsn)
+        if len(attempts) == 1:
+            raise OSError("connection refused")
+        return await CONNECT(dsn)
+
+    monkeypatch.setattr(asyncpg, "connect", fail_first_connect)
+
+    try:
+        assert listener.connection is not None
+        await notify_terminate(listener.connection.get_server_pid())
+        await wait_for(lambda: subscriber.connects == len(["start", "reconnect"]))
+        assert len(attempts) == len(["failed", "successful"])
+    finally:
+        await listener.stop()
+
+
+async def test_pg_listener_start_fails_when_on_connect_fails() -> None:
+    async def on_connect() -> None:
+        raise RuntimeError("cannot load state")
+
+    listener = new_listener()
+    listener.subscribe(CHANNEL, lambda _: None, on_connect)
+
+    with pytest.raises(RuntimeError, match="cannot load state"):
+        await listener.start()
+
+    assert listener.connection is None
+    await listener.stop()
+
+
+async def test_pg_listener_keeps_listening_after_on_notify_error() -> None:
+    subscriber = Subscriber()
+
+    def on_notify(payload: str) -> None:
+        if payload == "bad":
+            raise ValueError(payload)
+        subscriber.on_notify(payload)
+
+    listener = new_listener()
+    listener.subscribe(CHANNEL, on_notify)
+    await listener.start()
+
+    try:
+        await notify("bad")
+        await notify("good")
+        await wait_for(lambda: subscriber.payloads == ["good"])
+    finally:
+        await listener.stop()
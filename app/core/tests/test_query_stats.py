@@ -0,0 +1,109 @@
+import logging
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.models import User
+from app.core import query_stats
+from app.core.config import get_settings
+from app.main import app
+from app.tests.metrics import metric
+
+
+def test_normalize_statement_replaces_parameters_and_literals() -> None:
+    statement = """
+        SELECT auth_user.user_id FROM auth_user
+        WHERE auth_user.email = $1 AND auth_user.user_id IN ($2, $3, $4)
+        LIMIT 10 OFFSET 'x'
+    """
+
+    assert query_stats.normalize_statement(statement) == (
+        "SELECT auth_user.user_id FROM auth_user "
+        "WHERE auth_user.email = ? AND auth_user.user_id IN (?) LIMIT ? OFFSET ?"
+    )
+    assert (
+        query_stats.normalize_statement(
+            "INSERT INTO t (a, b) VALUES ($1, $2), ($3, $4)"
+        )
+        == "INSERT INTO t (a, b) VALUES (?), ..."
+    )
+
+
+def test_normalize_statement_replaces_numbers_in_identifiers() -> None:
+    for start in (1704067200, 1704672000):
+        assert query_stats.normalize_statement(
+            f"CREATE TABLE auth_refresh_token_p{start} "
+            f"PARTITION OF auth_refresh_token FOR VALUES FROM ({start}) TO ($1)"
+        ) == (
+            "CREATE TABLE auth_refresh_token_p? "
+            "PARTITION OF auth_refresh_token FOR VALUES FROM (?) TO (?)"
+        )
+        assert query_stats.normalize_statement(
+            f"INSERT INTO pg_temp_{start}.moved_{start} "
+            f"SELECT * FROM auth_refresh_token_p{start} WHERE exp < $1"
+        ) == (
+            "INSERT INTO pg_temp_?.moved_? "
+            "SELECT * FROM auth_refresh_token_p? WHERE exp < ?"
+        )
+
+
+async def test_queries_are_counted_per_request_route(
+    client: AsyncClient,
+    default_user_headers: dict[str, str],
+    default_user: User,
+) -> None:
+    route = "/auth/me"
+    requests_before = metric("org_app_http_request_db_queries_count", route=route)
+    queries_before = metric("org_app_http_request_db_queries_sum", route=route)
+
+    await client.get(
+        app.url_path_for("read_current_user"), headers=default_user_headers
+    )
+
+    assert (
+        metric("org_app_http_request_db_queries_count", route=route)
+        == requests_before + 1
+    )
+    assert (
+        metric("org_app_http_request_db_queries_sum", route=route) == queries_before + 1
+    )
+
+
+async def test_unmatched_requests_are_counted_without_route(
+    client: AsyncClient,
+) -> None:
+    requests_before = metric(
+        "org_app_http_request_db_queries_count", route=query_stats.NO_ROUTE
+    )
+
+    await client.get("/not-found")
+
+    assert (
+        metric("org_app_http_request_db_queries_count", route=query_stats.NO_ROUTE)
+        == requests_before + 1
+    )
+
+
+async def test_slow_queries_are_logged_with_route(
+    client: AsyncClient,
+    default_user_headers: dict[str, str],
+    session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(get_settings().database, "slow_query_secs", 1e-9)
+    # alembic fileConfig in test database setup disables existing loggers
+    monkeypatch.setattr(query_stats.logger, "disabled", False)
+
+    with caplog.at_level(logging.WARNING, logger=query_stats.__name__):
+        await client.get(
+            app.url_path_for("read_current_user"), headers=default_user_headers
+        )
+        await session.execute(text("SELECT 1"))
+
+    assert [record.getMessage().split(" took ")[0] for record in caplog.records] == [
+        "slow query on route /auth/me",
+        f"slow query on route {query_stats.NO_ROUTE}",
+    ]
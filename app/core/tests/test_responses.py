@@ -0,0 +1,24 @@
+from fastapi.responses import JSONResponse
+
+from app.auth.schemas import AccessTokenResponse
+from app.core.responses import ModelResponse
+
+TOKEN = AccessTokenResponse(
+    access_token="access-token",
+    expires_at=1,
+    refresh_token="refresh-token-ąę",
+    refresh_token_expires_at=2,
+)
+
+
+def test_model_response_renders_model_like_fastapi() -> None:
+    response = ModelResponse(TOKEN)
+
+    assert response.body == TOKEN.model_dump_json().encode()
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_model_response_renders_other_content_like_json_response() -> None:
+    content = TOKEN.model_dump()
+
+    assert ModelResponse(content).body == JSONResponse(content).body
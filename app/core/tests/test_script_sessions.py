@@ -0,0 +1,34 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool
+
+from app.core import database_session
+
+SESSIONS = 3
+
+
+async def script() -> tuple[set[int], AsyncEngine]:
+    backend_pids: set[int] = set()
+    for _ in range(SESSIONS):
+        async with database_session.new_script_async_session() as session:
+            backend_pids.add(await session.scalar(text("SELECT pg_backend_pid()")))
+    sessionmaker = await database_session._SCRIPT_ENGINES.sessionmaker()
+    assert isinstance(sessionmaker.kw["bind"], AsyncEngine)
+    return backend_pids, sessionmaker.kw["bind"]
+
+
+def test_script_sessions_share_engine_per_event_loop() -> None:
+    # sync test, every asyncio.run() has its own event loop
+    first_pids, first_engine = asyncio.run(script())
+    second_pids, second_engine = asyncio.run(script())
+
+    assert len(first_pids) == len(second_pids) == 1
+    assert first_pids != second_pids
+    assert first_engine is not second_engine
+    # disposed at loop shutdown, pool of disposed engine is new and empty
+    for engine in (first_engine, second_engine):
+        assert isinstance(engine.pool, QueuePool)
+        assert engine.pool.checkedin() == 0
+    assert len(database_session._SCRIPT_ENGINES.sessionmakers) == 0
@@ -1,12 +1,14 @@
 import logging
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from app.auth.views import router as auth_router
-from app.core import lifespan
+from app.core import deadlines, lifespan
 from app.core.config import get_settings
+from app.core.http_metrics import HttpMetricsMiddleware
+from app.core.query_stats import QueryStatsMiddleware
 from app.probe.views import router as probe_router
 
 logger = logging.getLogger(__name__)
@@ -19,11 +21,15 @@ app = FastAPI(
     openapi_url="/openapi.json",
     docs_url="/",
     lifespan=lifespan.lifespan,
+    dependencies=[Depends(deadlines.apply_route_deadline)],
 )
 
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(probe_router, prefix="/probe", tags=["probe"])
 
+# Cancels requests after their deadline with 504, see app/core/deadlines.py
+app.add_middleware(deadlines.DeadlineMiddleware)
+
 # Sets all CORS enabled origins
 app.add_middleware(
     CORSMiddleware,
@@ -41,3 +47,10 @@ app.add_middleware(
     TrustedHostMiddleware,
     allowed_hosts=get_settings().security.allowed_hosts,
 )
+
+# Counts SQL statements of every request, see app/core/query_stats.py
+app.add_middleware(QueryStatsMiddleware)
+
+# Request rate, status codes, latency and body sizes by route, outermost so it
+# measures other middlewares and their responses too, see app/core/http_metrics.py
+app.add_middleware(HttpMetricsMiddleware)
@@ -0,0 +1,115 @@
+# Database health for /probe/health, checked in background (see lifespan).
+#
+# Probes come every few seconds from every kubelet, checking database on each
+# of them would take connections from the pool used by requests. Instead the
+# database is pinged every Database.health_check_interval_secs on dedicated
+# asyncpg connection, outside of the pool, and probe answers from last result.
+# Result older than health_check_max_age_secs means the checker is stuck or not
+# running, probe then fails the same way as when database is down.
+
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+import asyncpg  # type: ignore[import-untyped]
+from sqlalchemy.pool import QueuePool
+
+from app.core import database_session, metrics
+from app.core.config import get_settings
+from app.core.pg_listener import asyncpg_dsn
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class PoolState:
+    size: int
+    checked_out: int
+    overflow: int
+
+
+@dataclass(frozen=True, slots=True)
+class DatabaseHealth:
+    ok: bool
+    checked_at: float
+    latency_secs: float | None = None
+    error: str | None = None
+    pool: PoolState | None = None
+
+    def is_stale(self, now: float) -> bool:
+        return now - self.checked_at > get_settings().database.health_check_max_age_secs
+
+
+def pool_state() -> PoolState | None:
+    # None for NullPool, see Database.pool_class
+    pool = database_session._ASYNC_ENGINE.pool
+    if not isinstance(pool, QueuePool):
+        return None
+    return PoolState(
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        overflow=max(pool.overflow(), 0),
+    )
+
+
+async def connect() -> asyncpg.Connection:
+    # statement cache disabled behind PgBouncer as for engine, see
+    # database_session.engine_options
+    return await asyncpg.connect(
+        asyncpg_dsn(get_settings().sqlalchemy_database_uri),
+        statement_cache_size=0 if get_settings().database.pgbouncer else 100,
+    )
+
+
+class DatabaseHealthChecker:
+    def __init__(self) -> None:
+        self.connection: asyncpg.Connection | None = None
+        # None until first check
+        self.health: DatabaseHealth | None = None
+
+    async def check(self) -> DatabaseHealth:
+        try:
+            async with asyncio.timeout(
+                get_settings().database.health_check_timeout_secs
+            ):
+                if self.connection is None or self.connection.is_closed():
+                    self.connection = await connect()
+                start = time.perf_counter()
+                # simple query protocol, no prepared statement to break PgBouncer
+                await self.connection.execute("SELECT 1")
+                latency_secs = time.perf_counter() - start
+        except Exception as error:
+            logger.warning("database health check failed", exc_info=True)
+            metrics.DB_HEALTH_CHECK_FAILURES.inc()
+            self.close()
+            self.health = DatabaseHealth(
+                ok=False,
+                checked_at=time.time(),
+                error=type(error).__name__,
+                pool=pool_state(),
+            )
+        else:
+            metrics.DB_HEALTH_CHECK_SECONDS.observe(latency_secs)
+            self.health = DatabaseHealth(
+                ok=True,
+                checked_at=time.time(),
+                latency_secs=latency_secs,
+                pool=pool_state(),
+            )
+        return self.health
+
+    async def run_periodically(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(get_settings().database.health_check_interval_secs)
+
+    def close(self) -> None:
+        # terminate does not wait for server, it may be the one not responding
+        if self.connection is not None:
+            self.connection.terminate()
+            self.connection = None
+
+
+_DATABASE_HEALTH_CHECKER = DatabaseHealthChecker()
@@ -0,0 +1,18 @@
+import typing
+
+from pydantic import BaseModel
+
+
+class PoolStateResponse(BaseModel):
+    size: int
+    checked_out: int
+    overflow: int
+
+
+class HealthResponse(BaseModel):
+    status: typing.Literal["ok", "unavailable"]
+    database_ok: bool
+    checked_secs_ago: float | None = None
+    latency_ms: float | None = None
+    error: str | None = None
+    pool: PoolStateResponse | None = None
@@ -1,17 +1,140 @@
+import asyncio
+import time
+
+import pytest
 from httpx import AsyncClient, codes
 
+from app.core import database_session
+from app.core.config import get_settings
 from app.main import app
+from app.probe import health, views
+from app.probe.health import DatabaseHealth, DatabaseHealthChecker
+from app.tests.metrics import metric
+from app.tests.queries import assert_max_queries
+
+
+@pytest.fixture(name="health_checker")
+def fixture_health_checker(monkeypatch: pytest.MonkeyPatch) -> DatabaseHealthChecker:
+    health_checker = DatabaseHealthChecker()
+    monkeypatch.setattr(health, "_DATABASE_HEALTH_CHECKER", health_checker)
+    return health_checker
 
 
 async def test_live_probe(client: AsyncClient) -> None:
-    response = await client.get(app.url_path_for("live_probe"))
+    with assert_max_queries(0):
+        response = await client.get(app.url_path_for("live_probe"))
 
     assert response.status_code == codes.OK
     assert response.text == '"ok"'
 
 
-async def test_health_probe(client: AsyncClient) -> None:
-    response = await client.get(app.url_path_for("health_probe"))
+async def test_health_probe(
+    client: AsyncClient, health_checker: DatabaseHealthChecker
+) -> None:
+    checks_before = metric("org_app_db_health_check_seconds_count")
+
+    await health_checker.check()
+    await health_checker.check()
+    health_checker.close()
+    with assert_max_queries(0):
+        response = await client.get(app.url_path_for("health_probe"))
 
     assert response.status_code == codes.OK
-    assert response.text == '"app and database ok"'
+    assert response.json()["status"] == "ok"
+    assert response.json()["database_ok"]
+    assert response.json()["latency_ms"] > 0
+    assert response.json()["error"] is None
+    assert response.json()["pool"]["size"] == get_settings().database.pool_size
+    assert metric("org_app_db_health_check_seconds_count") == checks_before + 2
+
+
+async def test_health_checker_does_not_prepare_statements_behind_pgbouncer(
+    health_checker: DatabaseHealthChecker, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_settings().database, "pgbouncer", True)
+
+    health = await health_checker.check()
+    assert health_checker.connection is not None
+    prepared = await health_checker.connection.fetchval(
+        "SELECT count(*) FROM pg_prepared_statements"
+    )
+    health_checker.close()
+
+    assert health.ok
+    assert prepared == 0
+
+
+async def test_health_probe_is_unavailable_before_first_check(
+    client: AsyncClient, health_checker: DatabaseHealthChecker
+) -> None:
+    response = await client.get(app.url_path_for("health_probe"))
+
+    assert response.status_code == codes.SERVICE_UNAVAILABLE
+    assert response.json()["status"] == "unavailable"
+    assert response.json()["error"] == views.HEALTH_NOT_CHECKED
+
+
+async def test_health_probe_is_unavailable_when_database_is_down(
+    client: AsyncClient,
+    health_checker: DatabaseHealthChecker,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    failures_before = metric("org_app_db_health_check_failures_total")
+    monkeypatch.setattr(get_settings().database, "port", 1)
+
+    await health_checker.check()
+    response = await client.get(app.url_path_for("health_probe"))
+
+    assert response.status_code == codes.SERVICE_UNAVAILABLE
+    assert not response.json()["database_ok"]
+    assert response.json()["latency_ms"] is None
+    assert response.json()["error"] is not None
+    assert health_checker.connection is None
+    assert metric("org_app_db_health_check_failures_total") == failures_before + 1
+
+
+async def test_health_probe_is_unavailable_when_result_is_stale(
+    client: AsyncClient, health_checker: DatabaseHealthChecker
+) -> None:
+    max_age_secs = get_settings().database.health_check_max_age_secs
+    health_checker.health = DatabaseHealth(
+        ok=True, checked_at=time.time() - max_age_secs - 1, latency_secs=0.001
+    )
+
+    response = await client.get(app.url_path_for("health_probe"))
+
+    assert response.status_code == codes.SERVICE_UNAVAILABLE
+    assert response.json()["database_ok"]
+    assert response.json()["error"] == views.HEALTH_STALE
+    assert response.json()["pool"] is None
+
+
+async def test_health_checker_runs_periodically(
+    health_checker: DatabaseHealthChecker, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_settings().database, "health_check_interval_secs", 0.01)
+
+    task = asyncio.create_task(health_checker.run_periodically())
+    try:
+        async with asyncio.timeout(5):
+            while health_checker.health is None:
+                await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        health_checker.close()
+
+    assert health_checker.health.ok
+
+
+async def test_health_pool_state_is_none_without_queue_pool(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().database, "pool_class", "null")
+    engine = database_session.new_async_engine(
+        get_settings().sqlalchemy_database_uri, name="test_null"
+    )
+    monkeypatch.setattr(database_session, "_ASYNC_ENGINE", engine)
+
+    assert health.pool_state() is None
+    await engine.dispose()
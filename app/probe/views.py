@@ -1,23 +1,65 @@
 import logging
+import time
 import typing
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Response, status
 
-from app.core.database_session import new_async_session
+from app.probe import health
+from app.probe.responses import HealthResponse, PoolStateResponse
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+HEALTH_NOT_CHECKED = "Database health was not checked yet"
+HEALTH_STALE = "Database health check result is stale"
+
 
 @router.get("/live", response_model=str)
 async def live_probe() -> typing.Literal["ok"]:
     return "ok"
 
 
-@router.get("/health", response_model=str)
-async def health_probe(
-    _: AsyncSession = Depends(new_async_session),
-) -> typing.Literal["app and database ok"]:
-    return "app and database ok"
+@router.get(
+    "/health",
+    response_model=HealthResponse,
+    responses={
+        503: {
+            "model": HealthResponse,
+            "description": "Database is down or health check result is stale",
+        }
+    },
+)
+async def health_probe(response: Response) -> HealthResponse:
+    # answers from result of background check, see app.probe.health
+    database_health = health._DATABASE_HEALTH_CHECKER.health
+    if database_health is None:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return HealthResponse(
+            status="unavailable", database_ok=False, error=HEALTH_NOT_CHECKED
+        )
+
+    now = time.time()
+    error = database_health.error
+    if database_health.is_stale(now):
+        error = HEALTH_STALE
+    if error is not None:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    pool = database_health.pool
+    return HealthResponse(
+        status="ok" if error is None else "unavailable",
+        database_ok=database_health.ok,
+        checked_secs_ago=round(now - database_health.checked_at, 3),
+        latency_ms=(
+            None
+            if database_health.latency_secs is None
+            else round(database_health.latency_secs * 1000, 3)
+        ),
+        error=error,
+        pool=(
+            None
+            if pool is None
+            else PoolStateResponse.model_validate(pool, from_attributes=True)
+        ),
+    )
@@ -1,4 +1,5 @@
 import logging
+import uuid
 from typing import TypeVar
 
 from faker import Faker
@@ -19,5 +20,7 @@ logger = logging.getLogger(__name__)
 
 
 class UserFactory(SQLAlchemyFactory[User]):
+    user_id = Use(lambda: str(uuid.uuid4()))
     email = Use(Faker().email)
     hashed_password = Use(lambda: get_password_hash(TESTS_USER_PASSWORD))
+    deleted_at = None
@@ -0,0 +1,42 @@
+from app.auth.partitions import TABLE, planned_partitions
+
+
+def partition_table_sql(now: int) -> list[str]:
+    # the layout refresh_token_partitioning migration creates, with partitions
+    # planned by maintenance, tokens expired before first partition are not copied
+    partitions = planned_partitions(now, last_end=None)
+    return [
+        f"ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned",
+        f"CREATE TABLE {TABLE} (LIKE {TABLE}_unpartitioned INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (exp)",
+        *(
+            f"CREATE TABLE {partition.name} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ({partition.start}) TO ({partition.end})"
+            for partition in partitions
+        ),
+        f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_unpartitioned "
+        f"WHERE exp >= {partitions[0].start}",
+        f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id",
+        f"DROP TABLE {TABLE}_unpartitioned",
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, exp)",
+        f"CREATE UNIQUE INDEX ix_{TABLE}_refresh_token_digest "
+        f"ON {TABLE} (refresh_token_digest, exp)",
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_uuid_fkey "
+        "FOREIGN KEY (user_uuid) REFERENCES auth_user (user_uuid) ON DELETE CASCADE",
+    ]
+
+
+def unpartition_table_sql() -> list[str]:
+    # the layout of RefreshToken model, like migration downgrade
+    return [
+        f"ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned",
+        f"CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned INCLUDING DEFAULTS)",
+        f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_partitioned",
+        f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id",
+        f"DROP TABLE {TABLE}_partitioned",
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)",
+        f"CREATE UNIQUE INDEX ix_{TABLE}_refresh_token_digest "
+        f"ON {TABLE} (refresh_token_digest)",
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_uuid_fkey "
+        "FOREIGN KEY (user_uuid) REFERENCES auth_user (user_uuid) ON DELETE CASCADE",
+    ]
@@ -0,0 +1,29 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from sqlalchemy import event
+
+from app.core import database_session
+
+
+@contextmanager
+def assert_max_queries(max_queries: int) -> Iterator[list[str]]:
+    # counts statements executed on the app engine inside the block, including
+    # ones of the test itself, so wrap only the request
+    statements: list[str] = []
+
+    def count_query(_: Any, __: Any, statement: str, *___: Any) -> None:
+        statements.append(statement)
+
+    engine = database_session._ASYNC_ENGINE.sync_engine
+    event.listen(engine, "before_cursor_execute", count_query)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count_query)
+
+    assert len(statements) <= max_queries, (
+        f"expected at most {max_queries} queries, executed {len(statements)}:\n"
+        + "\n".join(statements)
+    )
@@ -0,0 +1,99 @@
+# Measures /auth/me latency while password logins run at the same time.
+#
+# Run app first (single uvicorn worker, so all requests share one event loop):
+#
+#   uvicorn app.main:app --port 8000 --workers 1
+#
+# Then in other terminal:
+#
+#   python benchmarks/auth_me_latency_under_logins.py --base-url http://localhost:8000
+#
+# With bcrypt on the event loop every login blocks all other requests for ~200ms
+# (12 rounds), so /auth/me p99 grows to roughly login time times concurrency.
+# With bcrypt in process pool /auth/me p99 should stay close to idle value.
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+async def login_worker(
+    client: httpx.AsyncClient, email: str, password: str, stop: asyncio.Event
+) -> int:
+    logins = 0
+    while not stop.is_set():
+        response = await client.post(
+            "/auth/access-token",
+            data={"username": email, "password": password},
+        )
+        response.raise_for_status()
+        logins += 1
+    return logins
+
+
+async def me_worker(
+    client: httpx.AsyncClient, access_token: str, stop: asyncio.Event
+) -> list[float]:
+    latencies: list[float] = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get(
+            "/auth/me", headers={"Authorization": f"Bearer {access_token}"}
+        )
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return latencies
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+
+async def main(base_url: str, logins: int, duration: float) -> None:
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    password = "benchmark-password"
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        response = await client.post(
+            "/auth/register", json={"email": email, "password": password}
+        )
+        response.raise_for_status()
+        response = await client.post(
+            "/auth/access-token", data={"username": email, "password": password}
+        )
+        response.raise_for_status()
+        access_token = response.json()["access_token"]
+
+        stop = asyncio.Event()
+        login_tasks = [
+            asyncio.create_task(login_worker(client, email, password, stop))
+            for _ in range(logins)
+        ]
+        me_task = asyncio.create_task(me_worker(client, access_token, stop))
+
+        await asyncio.sleep(duration)
+        stop.set()
+
+        latencies = await me_task
+        total_logins = sum(await asyncio.gather(*login_tasks))
+
+    print(f"concurrent logins:   {logins}")
+    print(f"logins/s:            {total_logins / duration:.1f}")
+    print(f"/auth/me requests:   {len(latencies)}")
+    print(f"/auth/me p50 [ms]:   {percentile(latencies, 50):.1f}")
+    print(f"/auth/me p90 [ms]:   {percentile(latencies, 90):.1f}")
+    print(f"/auth/me p99 [ms]:   {percentile(latencies, 99):.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=4, help="concurrent logins")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.base_url, args.logins, args.duration))
@@ -0,0 +1,116 @@
+# Measures /auth/me throughput of the app (all middlewares included) in process,
+# requests are ASGI calls on one event loop, without HTTP server and client.
+#
+# get_current_user is overridden to return the same User, as when it is found in
+# user cache (SECURITY__USER_CACHE_SIZE), so database is not needed. Compares
+# response of /auth/me built:
+#
+# - by FastAPI from returned ORM User, validated against response_model
+# - as ModelResponse of UserResponse.model_validate(user)
+# - as ModelResponse of UserResponse.from_user(user), trusted output without
+#   validation (current /auth/me)
+#
+# Both validating variants run email-validator on every response. Variants run
+# in turns, best of ROUNDS is reported.
+#
+#   python benchmarks/auth_me_throughput.py
+
+import asyncio
+import time
+import uuid
+from collections.abc import Callable
+
+from starlette.types import Message
+
+from app.auth import dependencies
+from app.auth.models import User
+from app.auth.schemas import UserResponse
+from app.core.responses import ModelResponse
+from app.main import app
+
+NUMBER = 5_000
+ROUNDS = 5
+
+USER = User(
+    user_id=str(uuid.uuid4()), email="user.name@example.com", hashed_password="hash"
+)
+
+
+async def call(path: str) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"authorization", b"Bearer token")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+    status = 0
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    assert status == 200, status  # noqa: PLR2004
+
+
+async def requests_per_sec(path: str) -> float:
+    for _ in range(100):
+        await call(path)
+    start = time.perf_counter()
+    for _ in range(NUMBER):
+        await call(path)
+    return NUMBER / (time.perf_counter() - start)
+
+
+def add_route(path: str, endpoint: Callable[..., object], **kwargs: object) -> None:
+    app.add_api_route(path, endpoint, methods=["GET"], **kwargs)  # type: ignore[arg-type]
+
+
+async def main() -> None:
+    async def get_user() -> User:
+        return USER
+
+    async def orm_user() -> User:
+        return USER
+
+    async def model_validate() -> ModelResponse:
+        return ModelResponse(UserResponse.model_validate(USER))
+
+    app.dependency_overrides[dependencies.get_current_user] = get_user
+    add_route("/bench/orm-user", orm_user, response_model=UserResponse)
+    add_route(
+        "/bench/model-validate",
+        model_validate,
+        response_model=UserResponse,
+        response_class=ModelResponse,
+    )
+
+    variants = {
+        "ORM User + response_model": "/bench/orm-user",
+        "ModelResponse, model_validate": "/bench/model-validate",
+        "ModelResponse, from_user (/auth/me)": "/auth/me",
+    }
+    best = dict.fromkeys(variants, 0.0)
+    for _ in range(ROUNDS):
+        for name, path in variants.items():
+            best[name] = max(best[name], await requests_per_sec(path))
+
+    baseline = best["ORM User + response_model"]
+    for name, result in best.items():
+        print(f"{name:<38} {result:8.0f} requests/s   x{result / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+# Micro benchmark of response encoding of /auth/me and /auth/refresh-token.
+#
+# Compares, per request, from value returned by endpoint to rendered response:
+# jsonable_encoder and JSONResponse (FastAPI path for routes without
+# response_model), FastAPI default for routes with response_model (validation
+# against it, serialization to Python objects and JSONResponse) and ModelResponse
+# built by endpoint from response model (app/core/responses.py).
+#
+#   python benchmarks/json_responses.py
+
+import asyncio
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from app.auth.models import User
+from app.auth.schemas import AccessTokenResponse, UserResponse
+from app.auth.views import router
+from app.core.responses import ModelResponse
+
+NUMBER = 50_000
+
+
+def get_route(name: str) -> APIRoute:
+    return next(
+        route
+        for route in router.routes
+        if isinstance(route, APIRoute) and route.name == name
+    )
+
+
+async def measure(encode: Callable[[], Awaitable[None]]) -> float:
+    start = time.perf_counter()
+    for _ in range(NUMBER):
+        await encode()
+    return time.perf_counter() - start
+
+
+def report(name: str, baseline: float, elapsed: float) -> None:
+    print(
+        f"{name:<40} {elapsed / NUMBER * 1e6:8.2f} us/op"
+        f"   speedup x{baseline / elapsed:.2f}"
+    )
+
+
+async def compare(
+    name: str, content: object, model: type[UserResponse | AccessTokenResponse]
+) -> None:
+    field = get_route(name).response_field
+
+    async def jsonable() -> None:
+        JSONResponse(jsonable_encoder(model.model_validate(content)))
+
+    async def fastapi_default() -> None:
+        JSONResponse(await serialize_response(field=field, response_content=content))
+
+    async def model_response() -> None:
+        ModelResponse(model.model_validate(content))
+
+    baseline = await measure(jsonable)
+    print(name)
+    report("jsonable_encoder + JSONResponse", baseline, baseline)
+    report("response_model (default)", baseline, await measure(fastapi_default))
+    report("ModelResponse", baseline, await measure(model_response))
+
+
+async def main() -> None:
+    user = User(
+        user_id=str(uuid.uuid4()), email="user@example.com", hashed_password="hash"
+    )
+    token = AccessTokenResponse(
+        access_token="a" * 180,
+        expires_at=int(time.time()) + 300,
+        refresh_token="r" * 43,
+        refresh_token_expires_at=int(time.time()) + 86400,
+    )
+    await compare("read_current_user", user, UserResponse)
+    await compare("refresh_token", token, AccessTokenResponse)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
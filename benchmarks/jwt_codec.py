@@ -0,0 +1,88 @@
+# Micro benchmark of access token encode / decode.
+#
+# Compares previous implementation (settings looked up on every call, pydantic
+# payload and model_dump() round trip, module level jwt.encode / jwt.decode)
+# with JWTCodec built once from settings. Decode is measured with verified
+# tokens cache disabled and enabled.
+#
+#   python benchmarks/jwt_codec.py
+
+import time
+import timeit
+
+import jwt
+from pydantic import BaseModel
+
+from app.auth.jwt import JWTCodec
+from app.core.config import get_settings
+
+NUMBER = 20_000
+
+
+class PydanticJWTTokenPayload(BaseModel):
+    iss: str
+    sub: str
+    exp: int
+    iat: int
+
+
+def settings_encode(user_id: str) -> str:
+    iat = int(time.time())
+    exp = iat + get_settings().security.jwt_access_token_expire_secs
+
+    token_payload = PydanticJWTTokenPayload(
+        iss=get_settings().security.jwt_issuer,
+        sub=user_id,
+        exp=exp,
+        iat=iat,
+    )
+
+    return jwt.encode(
+        token_payload.model_dump(),
+        key=get_settings().security.jwt_secret_key.get_secret_value(),
+        algorithm=get_settings().security.jwt_algorithm,
+    )
+
+
+def settings_decode(token: str) -> PydanticJWTTokenPayload:
+    raw_payload = jwt.decode(
+        token,
+        get_settings().security.jwt_secret_key.get_secret_value(),
+        algorithms=[get_settings().security.jwt_algorithm],
+        options={"verify_signature": True},
+        issuer=get_settings().security.jwt_issuer,
+    )
+    return PydanticJWTTokenPayload(**raw_payload)
+
+
+def report(name: str, baseline: float, elapsed: float) -> None:
+    print(
+        f"{name:<28} {elapsed / NUMBER * 1e6:8.2f} us/op"
+        f"   speedup x{baseline / elapsed:.2f}"
+    )
+
+
+def main() -> None:
+    security = get_settings().security.model_copy()
+    codec = JWTCodec(security)
+    security_no_cache = security.model_copy(update={"jwt_verify_cache_size": 0})
+    codec_no_cache = JWTCodec(security_no_cache)
+
+    user_id = "6d1a2c4e-7b7f-4c3e-9d0a-7f3e2b1c9a55"
+    token = codec.encode(user_id).access_token
+
+    encode_baseline = timeit.timeit(lambda: settings_encode(user_id), number=NUMBER)
+    encode_codec = timeit.timeit(lambda: codec.encode(user_id), number=NUMBER)
+    decode_baseline = timeit.timeit(lambda: settings_decode(token), number=NUMBER)
+    decode_codec = timeit.timeit(lambda: codec_no_cache.decode(token), number=NUMBER)
+    decode_cached = timeit.timeit(lambda: codec.decode(token), number=NUMBER)
+
+    report("encode (settings lookups)", encode_baseline, encode_baseline)
+    report("encode (JWTCodec)", encode_baseline, encode_codec)
+    report("decode (settings lookups)", decode_baseline, decode_baseline)
+    report("decode (JWTCodec, no cache)", decode_baseline, decode_codec)
+    report("decode (JWTCodec, cached)", decode_baseline, decode_cached)
+
+
+if __name__ == "__main__":
+    main()
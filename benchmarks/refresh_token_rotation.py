@@ -0,0 +1,133 @@
+# Fires parallel refreshes of refresh tokens.
+#
+# Run app first:
+#
+#   uvicorn app.main:app --port 8000 --workers 4
+#
+# Then in other terminal:
+#
+#   python benchmarks/refresh_token_rotation.py --base-url http://localhost:8000
+#
+# Two parts:
+#
+# - chains: every worker rotates its own token chain in a loop, measures
+#   refreshes/s and latency of single statement rotation
+# - duplicates: the same refresh token is sent by many requests at once, exactly
+#   one must succeed and all others must get "Refresh token already used", never
+#   404 or second new token
+
+import argparse
+import asyncio
+import collections
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await client.post(
+        "/auth/access-token", data={"username": email, "password": password}
+    )
+    response.raise_for_status()
+    return str(response.json()["refresh_token"])
+
+
+async def chain_worker(
+    client: httpx.AsyncClient, refresh_token: str, stop: asyncio.Event
+) -> list[float]:
+    latencies: list[float] = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.post(
+            "/auth/refresh-token", json={"refresh_token": refresh_token}
+        )
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        refresh_token = response.json()["refresh_token"]
+    return latencies
+
+
+async def duplicate_round(
+    client: httpx.AsyncClient, refresh_token: str, duplicates: int
+) -> collections.Counter[str]:
+    responses = await asyncio.gather(
+        *(
+            client.post("/auth/refresh-token", json={"refresh_token": refresh_token})
+            for _ in range(duplicates)
+        )
+    )
+    return collections.Counter(
+        f"{response.status_code} {response.json().get('detail', 'ok')}"
+        for response in responses
+    )
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+
+async def main(
+    base_url: str, chains: int, duration: float, duplicates: int, rounds: int
+) -> None:
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    password = "benchmark-password"
+
+    limits = httpx.Limits(max_connections=max(chains, duplicates))
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=120, limits=limits
+    ) as client:
+        response = await client.post(
+            "/auth/register", json={"email": email, "password": password}
+        )
+        response.raise_for_status()
+
+        refresh_tokens = [await login(client, email, password) for _ in range(chains)]
+        stop = asyncio.Event()
+        chain_tasks = [
+            asyncio.create_task(chain_worker(client, refresh_token, stop))
+            for refresh_token in refresh_tokens
+        ]
+        await asyncio.sleep(duration)
+        stop.set()
+        latencies = [
+            latency
+            for result in await asyncio.gather(*chain_tasks)
+            for latency in result
+        ]
+
+        outcomes: collections.Counter[str] = collections.Counter()
+        failed_rounds = 0
+        for _ in range(rounds):
+            refresh_token = await login(client, email, password)
+            round_outcomes = await duplicate_round(client, refresh_token, duplicates)
+            if round_outcomes["200 ok"] != 1:
+                failed_rounds += 1
+            outcomes.update(round_outcomes)
+
+    print(f"concurrent chains:        {chains}")
+    print(f"refreshes/s:              {len(latencies) / duration:.1f}")
+    print(f"refresh p50 [ms]:         {percentile(latencies, 50):.1f}")
+    print(f"refresh p90 [ms]:         {percentile(latencies, 90):.1f}")
+    print(f"refresh p99 [ms]:         {percentile(latencies, 99):.1f}")
+    print(f"duplicate rounds:         {rounds} x {duplicates} requests")
+    for outcome, count in sorted(outcomes.items()):
+        print(f"  {outcome}: {count}")
+    print(f"rounds without exactly one success: {failed_rounds}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--chains", type=int, default=16, help="concurrent chains")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds")
+    parser.add_argument(
+        "--duplicates", type=int, default=16, help="requests with the same token"
+    )
+    parser.add_argument("--rounds", type=int, default=20, help="duplicate rounds")
+    args = parser.parse_args()
+
+    asyncio.run(
+        main(args.base_url, args.chains, args.duration, args.duplicates, args.rounds)
+    )
@@ -0,0 +1,63 @@
+# Sequential script sessions, like cron job opening many short sessions.
+#
+# Compares previous new_script_async_session (new engine created and disposed
+# for every session, so every session opens new database connection) with
+# engine shared by all sessions of the event loop.
+#
+#   python benchmarks/script_sessions.py --sessions 1000
+
+import argparse
+import asyncio
+import time
+from collections.abc import AsyncGenerator, Callable
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import get_settings
+from app.core.database_session import new_script_async_session
+
+
+@asynccontextmanager
+async def engine_per_session() -> AsyncGenerator[AsyncSession]:
+    engine = create_async_engine(
+        get_settings().sqlalchemy_database_uri, pool_pre_ping=True
+    )
+    session = async_sessionmaker(engine, expire_on_commit=False)()
+    try:
+        yield session
+    finally:
+        await session.close()
+        await engine.dispose()
+
+
+async def run(
+    new_session: Callable[[], AbstractAsyncContextManager[AsyncSession]],
+    sessions: int,
+) -> float:
+    start = time.perf_counter()
+    for _ in range(sessions):
+        async with new_session() as session:
+            await session.execute(text("SELECT 1"))
+    return time.perf_counter() - start
+
+
+def main(sessions: int) -> None:
+    for name, new_session in (
+        ("engine per session", engine_per_session),
+        ("engine per event loop", new_script_async_session),
+    ):
+        total = asyncio.run(run(new_session, sessions))
+        print(
+            f"{name:<24} {sessions} sessions: {total:.2f}s, "
+            f"{total / sessions * 1000:.2f}ms per session"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1000)
+    args = parser.parse_args()
+
+    main(args.sessions)